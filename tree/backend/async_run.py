@@ -0,0 +1,33 @@
+import sys
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+from tree.backend.metrics import metrics
+from tree.backend.storage.pickle_storage import pickle_storage
+from tree.backend.work_queue import WorkQueue
+
+
+def main():
+    # Load the record of seen faces and messages
+    f = pickle_storage.load()
+
+    # Crop new faces and write backups in the background, so visitors are greeted as soon as they're recognized
+    f.work_queue = WorkQueue()
+
+    # Imported only now, so loading the record doesn't wait on the demo's audio dependencies
+    import tree.backend.demos.async_sound_demo as async_sound_demo
+
+    # Run the demo, recognizing the next visitor while the current one is greeted
+    try:
+        async_sound_demo.run(f)
+    finally:
+        # Finish any queued work and flush storage before exiting
+        f.close()
+
+        if metrics.enabled:
+            metrics.dump(constants.metrics_filepath)
+
+
+if __name__ == '__main__':
+    main()
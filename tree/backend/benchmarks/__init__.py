@@ -0,0 +1,27 @@
+import time
+
+import numpy as np
+
+
+def synthetic_encodings(count: int, random: np.random.Generator, dimensions: int = 128) -> np.ndarray:
+    """
+    Generates encodings that are spread out like real face encodings, with distinct identities lying
+    roughly 1.0 apart, comfortably beyond the 0.6 match tolerance
+    """
+    return random.normal(scale=0.0625, size=(count, dimensions))
+
+
+def perturbed(encodings: np.ndarray, random: np.random.Generator, scale: float = 0.02) -> np.ndarray:
+    """Returns new sightings of the given identities, about 0.3 away from their stored encodings"""
+    return encodings + random.normal(scale=scale, size=encodings.shape)
+
+
+def percentiles(samples, *qs) -> list:
+    return [float(np.percentile(samples, q)) for q in qs]
+
+
+def timed(function, *args, **kwargs) -> (object, float):
+    """Calls `function`, returning its result and the elapsed wall-clock seconds"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
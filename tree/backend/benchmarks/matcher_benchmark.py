@@ -0,0 +1,72 @@
+"""
+Compares the approximate IVF matcher and the exact quantized matcher against the exact brute force matcher on
+synthetic encodings.
+
+Run from the repository root with `python -m tree.backend.benchmarks.matcher_benchmark`.
+"""
+import argparse
+import sys
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.benchmarks as benchmarks
+import tree.backend.encoding_index as encoding_index
+import tree.backend.quantization as quantization
+from tree.backend.matchers.brute_force import BruteForceMatcher
+from tree.backend.matchers.ivf import IVFMatcher
+from tree.backend.matchers.quantized import QuantizedMatcher
+
+
+def benchmark(matcher, queries) -> (list, list):
+    rows, latencies = [], []
+    for query in queries:
+        (row, _), elapsed = benchmarks.timed(matcher.nearest, query)
+        rows.append(row)
+        latencies.append(elapsed * 1000)
+    return rows, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--probes', type=int, nargs='+', default=[4, 8, 16])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random = np.random.default_rng(args.seed)
+
+    print("{:>8} {:>12} {:>9} {:>9} {:>9}".format("size", "matcher", "recall@1", "p50 ms", "p99 ms"))
+    for size in args.sizes:
+        encodings = benchmarks.synthetic_encodings(size, random)
+        index = encoding_index.EncodingIndex.from_encodings(map(str, range(size)), encodings)
+        queries = benchmarks.perturbed(encodings[random.choice(size, args.queries)], random)
+
+        brute_force = BruteForceMatcher()
+        brute_force.build(index)
+        expected_rows, latencies = benchmark(brute_force, queries)
+        p50, p99 = benchmarks.percentiles(latencies, 50, 99)
+        print("{:>8} {:>12} {:>9.3f} {:>9.3f} {:>9.3f}".format(size, "brute force", 1.0, p50, p99))
+
+        for probes in args.probes:
+            ivf = IVFMatcher(probes=probes, seed=args.seed)
+            ivf.build(index)
+            rows, latencies = benchmark(ivf, queries)
+            recall = np.mean(np.array(rows) == np.array(expected_rows))
+            p50, p99 = benchmarks.percentiles(latencies, 50, 99)
+            print("{:>8} {:>12} {:>9.3f} {:>9.3f} {:>9.3f}".format(
+                size, "ivf/{}".format(probes), recall, p50, p99))
+
+        for kind in quantization.KINDS:
+            quantized = QuantizedMatcher(kind)
+            quantized.build(index)
+            rows, latencies = benchmark(quantized, queries)
+            recall = np.mean(np.array(rows) == np.array(expected_rows))
+            p50, p99 = benchmarks.percentiles(latencies, 50, 99)
+            print("{:>8} {:>12} {:>9.3f} {:>9.3f} {:>9.3f}".format(size, kind, recall, p50, p99))
+
+
+if __name__ == '__main__':
+    main()
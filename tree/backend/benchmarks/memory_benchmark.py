@@ -0,0 +1,96 @@
+"""
+Measures the memory held per recorded face, comparing the original dict-based `Face` records against the slotted
+records that share one encoding matrix. Every gallery holds 1024 bytes of float64 encoding per face, so anything
+above that is per-record overhead.
+
+Run from the repository root with `python -m tree.backend.benchmarks.memory_benchmark`.
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.benchmarks as benchmarks
+import tree.backend.encoding_index as encoding_index
+import tree.backend.faces as faces
+
+
+class LegacyFace(object):
+    """The record `Face` used before it had slots, with its own encoding array and messages list"""
+
+    def __init__(self, _id: str, encoding):
+        self._id = _id
+        self.encoding = encoding
+        self.messages = []
+        self._full_image = None
+        self._cropped_image = None
+
+
+def legacy_gallery(ids, encodings) -> list:
+    return [LegacyFace(_id, encoding.copy()) for _id, encoding in zip(ids, encodings)]
+
+
+def slotted_gallery(ids, encodings) -> "faces.Faces":
+    return faces.Faces([faces.Face(_id, encoding.copy()) for _id, encoding in zip(ids, encodings)])
+
+
+def load_no_messages(_id: str) -> list:
+    return []
+
+
+def lazy_messages_gallery(ids, encodings) -> "faces.Faces":
+    return faces.Faces([
+        faces.Face(_id, encoding.copy(), message_loader=load_no_messages)
+        for _id, encoding in zip(ids, encodings)
+    ])
+
+
+def lazy_faces_gallery(ids, encodings) -> "faces.Faces":
+    """A gallery as loaded by the SQLite and memmap storages, where faces are only created once accessed"""
+    matrix = encodings.copy()
+    return faces.Faces(
+        faces.LazyFaceList(len(ids), lambda row: faces.Face(ids[row], matrix[row], load_no_messages)),
+        encoding_index=encoding_index.EncodingIndex.from_matrix(ids, matrix))
+
+
+def measure(build, ids, encodings) -> int:
+    """Returns the bytes still allocated by `build(ids, encodings)` once it returns"""
+    gc.collect()
+    tracemalloc.start()
+    gallery = build(ids, encodings)
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del gallery
+    return allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random = np.random.default_rng(args.seed)
+    galleries = [
+        ("before: dict records", legacy_gallery),
+        ("after: slotted, shared matrix", slotted_gallery),
+        ("after: + unloaded messages", lazy_messages_gallery),
+        ("after: lazy faces, as loaded", lazy_faces_gallery),
+    ]
+
+    print("{:>8} {:>32} {:>14}".format("size", "records", "bytes/face"))
+    for size in args.sizes:
+        encodings = benchmarks.synthetic_encodings(size, random)
+        ids = [str(i) for i in range(size)]
+
+        for name, build in galleries:
+            print("{:>8} {:>32} {:>14.0f}".format(size, name, measure(build, ids, encodings) / size))
+
+
+if __name__ == '__main__':
+    main()
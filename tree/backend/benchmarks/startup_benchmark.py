@@ -0,0 +1,87 @@
+"""
+Measures the time from starting the backend to its first match, with and without warming up the face models in
+the background while the microphone is calibrated.
+
+Each run is a fresh interpreter that imports the backend, builds a gallery of synthetic encodings, waits
+`--calibrate-seconds` as `vm.calibrate` would, and then matches a test image. Without warm-up the first match
+pays for importing `face_recognition` and loading dlib's models; with it that cost overlaps calibration.
+
+Run from the repository root with `python -m tree.backend.benchmarks.startup_benchmark`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.append('.')
+
+
+def child(args):
+    """Runs one startup in this interpreter, printing its timings as JSON"""
+    start = time.perf_counter()
+
+    import numpy as np
+    import tree.backend.benchmarks as benchmarks
+    import tree.backend.constants as constants
+    import tree.backend.faces as faces
+    from tree.backend.storage.pickle_storage import PickleStorage  # Every entry point loads storage first
+    imported = time.perf_counter()
+
+    f = faces.Faces(
+        [faces.Face(str(row), encoding)
+         for row, encoding in enumerate(benchmarks.synthetic_encodings(args.gallery_size, np.random.default_rng(0)))],
+        storage=PickleStorage(constants.benchmark_pickle_storage_filename))
+    loaded = time.perf_counter()
+
+    if args.warm_up:
+        faces.start_warm_up()
+    time.sleep(args.calibrate_seconds)
+    calibrated = time.perf_counter()
+
+    face = faces.create_face_from_image(
+        os.path.join(constants.test_images_filepath, args.image), faces=f, save_backup=False)
+    matched = time.perf_counter()
+    faces.remove_face_files(face._id)
+
+    print(json.dumps({
+        'import_seconds': imported - start,
+        'load_seconds': loaded - imported,
+        'first_match_seconds': matched - calibrated,
+        'time_to_first_match_seconds': matched - start,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gallery-size', type=int, default=1000)
+    parser.add_argument('--calibrate-seconds', type=float, default=3.0)
+    parser.add_argument('--image', default='yash1.jpg', help="test image to match first")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--warm-up', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    print("{:>8} {:>10} {:>10} {:>16} {:>20}".format(
+        "warm-up", "import s", "load s", "first match s", "time to match s"))
+    for warm_up in (False, True):
+        for _ in range(args.repeat):
+            command = [
+                sys.executable, '-m', 'tree.backend.benchmarks.startup_benchmark', '--child',
+                '--gallery-size', str(args.gallery_size), '--calibrate-seconds', str(args.calibrate_seconds),
+                '--image', args.image,
+            ] + (['--warm-up'] if warm_up else [])
+            timings = json.loads(subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout.splitlines()[-1])
+
+            print("{:>8} {:>10.3f} {:>10.3f} {:>16.3f} {:>20.3f}".format(
+                "yes" if warm_up else "no", timings['import_seconds'], timings['load_seconds'],
+                timings['first_match_seconds'], timings['time_to_first_match_seconds']))
+
+
+if __name__ == '__main__':
+    main()
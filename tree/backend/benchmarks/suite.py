@@ -0,0 +1,183 @@
+"""
+Reproducible benchmarks of the recognition and storage hot paths, run offline from the test images and synthetic
+encodings:
+
+* `create_face_from_image` end to end on each test image
+* `Faces.get_face_from_encoding` against galleries of increasing size
+* `PickleStorage.save` and `PickleStorage.load` against gallery size and the number of messages per face
+
+Run from the repository root with `python -m tree.backend.benchmarks.suite`. Save the results as JSON with
+`--output`, and compare a later run against them with `--baseline`. The exit status is 1 if any case's median got
+slower than the baseline by more than `--threshold`.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import uuid
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.benchmarks as benchmarks
+import tree.backend.constants as constants
+import tree.backend.encoding_index as encoding_index
+import tree.backend.faces as faces
+from tree.backend.storage.pickle_storage import PickleStorage
+
+CASES = ('images', 'matching', 'storage')
+
+
+def summarize(latencies, **extra) -> dict:
+    """Summarizes a list of latencies in seconds as milliseconds"""
+    latencies_ms = np.array(latencies) * 1000
+    p50, p99 = benchmarks.percentiles(latencies_ms, 50, 99)
+    return dict(samples=len(latencies_ms), mean_ms=float(latencies_ms.mean()), p50_ms=p50, p99_ms=p99, **extra)
+
+
+def benchmark_images(repeat: int) -> dict:
+    """Times decoding, detecting, encoding, matching and cropping each test image into an empty gallery"""
+    results = {}
+    for filename in sorted(os.listdir(constants.test_images_filepath)):
+        filepath = os.path.join(constants.test_images_filepath, filename)
+
+        latencies = []
+        for _ in range(repeat):
+            f = faces.Faces(storage=PickleStorage(constants.benchmark_pickle_storage_filename))
+            face, elapsed = benchmarks.timed(faces.create_face_from_image, filepath, faces=f, save_backup=False)
+            faces.remove_face_files(face._id)
+            latencies.append(elapsed)
+
+        results['create_face_from_image[image={}]'.format(filename)] = summarize(latencies)
+    return results
+
+
+def benchmark_matching(sizes: list, queries: int, random: np.random.Generator) -> dict:
+    """
+    Times matching sightings of recorded faces against galleries of each size. Every gallery is a prefix of one
+    synthetic matrix, and faces are only created for the matches returned.
+    """
+    encodings = benchmarks.synthetic_encodings(max(sizes), random)
+    ids = [str(row) for row in range(len(encodings))]
+
+    results = {}
+    for size in sorted(sizes):
+        f = faces.Faces(
+            faces.LazyFaceList(size, lambda row: faces.Face(ids[row], encodings[row])),
+            encoding_index=encoding_index.EncodingIndex.from_matrix(ids[:size], encodings[:size]))
+        sightings = benchmarks.perturbed(encodings[random.choice(size, queries)], random)
+
+        latencies = [benchmarks.timed(f.get_face_from_encoding, sighting)[1] for sighting in sightings]
+        results['get_face_from_encoding[gallery_size={}]'.format(size)] = summarize(latencies)
+    return results
+
+
+def benchmark_storage(sizes: list, message_counts: list, repeat: int, random: np.random.Generator) -> dict:
+    """Times saving and loading galleries of each size, with each number of messages per face"""
+    storage = PickleStorage(constants.benchmark_pickle_storage_filename)
+    results = {}
+
+    try:
+        for size in sorted(sizes):
+            encodings = benchmarks.synthetic_encodings(size, random)
+            for message_count in sorted(message_counts):
+                gallery = []
+                for encoding in encodings:
+                    face = faces.Face(str(uuid.uuid4()), encoding)
+                    face.messages = [
+                        str(uuid.uuid4()) + constants.saved_audio_recording_extension for _ in range(message_count)]
+                    gallery.append(face)
+                f = faces.Faces(gallery, storage=storage)
+
+                save_latencies = [benchmarks.timed(storage.save, f)[1] for _ in range(repeat)]
+                load_latencies = [benchmarks.timed(storage.load)[1] for _ in range(repeat)]
+
+                params = 'gallery_size={},messages_per_face={}'.format(size, message_count)
+                file_bytes = os.path.getsize(storage.backup_filepath)
+                results['pickle_save[{}]'.format(params)] = summarize(save_latencies, bytes=file_bytes)
+                results['pickle_load[{}]'.format(params)] = summarize(load_latencies, bytes=file_bytes)
+    finally:
+        if os.path.exists(storage.backup_filepath):
+            os.remove(storage.backup_filepath)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Prints how each case's median changed against the baseline
+
+    :return: the names of the cases whose median grew by more than `threshold`, as a fraction of the baseline
+    """
+    regressions = []
+    print("\n{:<60} {:>11} {:>11} {:>8}".format("case", "baseline ms", "current ms", "ratio"))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        before, after = baseline[name]['p50_ms'], result['p50_ms']
+        ratio = after / before if before else float('inf')
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        print("{:<60} {:>11.3f} {:>11.3f} {:>7.2f}x{}".format(
+            name, before, after, ratio, "  REGRESSION" if regressed else ""))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=list(CASES))
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000, 1000000],
+                        help="gallery sizes to match against")
+    parser.add_argument('--queries', type=int, default=200, help="sightings matched against each gallery")
+    parser.add_argument('--storage-sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--messages', type=int, nargs='+', default=[0, 1, 10], help="messages per face")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="file to save the results to as JSON")
+    parser.add_argument('--baseline', help="results saved by an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="fraction a median may grow by before it's reported as a regression")
+    args = parser.parse_args()
+
+    random = np.random.default_rng(args.seed)
+
+    results = {}
+    if 'images' in args.cases:
+        results.update(benchmark_images(args.repeat))
+    if 'matching' in args.cases:
+        results.update(benchmark_matching(args.sizes, args.queries, random))
+    if 'storage' in args.cases:
+        results.update(benchmark_storage(args.storage_sizes, args.messages, args.repeat, random))
+
+    print("{:<60} {:>9} {:>9} {:>9}".format("case", "mean ms", "p50 ms", "p99 ms"))
+    for name, result in results.items():
+        print("{:<60} {:>9.3f} {:>9.3f} {:>9.3f}".format(name, result['mean_ms'], result['p50_ms'], result['p99_ms']))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({
+                'environment': {
+                    'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'machine': platform.machine(),
+                    'processor': platform.processor(),
+                    'seed': args.seed,
+                },
+                'results': results,
+            }, output_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
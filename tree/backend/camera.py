@@ -0,0 +1,215 @@
+import sys
+import threading
+import time
+from typing import Iterator, Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.lazy_import as lazy_import
+import tree.backend.metrics as metrics
+
+cv2 = lazy_import.lazy_import('cv2')
+
+
+class CameraException(Exception):
+    """Raised if the camera couldn't be opened or didn't return a frame"""
+    pass
+
+
+class Camera(object):
+    """
+    Long-lived handle on a connected webcam.
+
+    The device is opened and warmed up once, then kept open across reads. Frames are grabbed into a reused BGR
+    buffer and converted into a reused RGB buffer, so the array returned by `read` is only valid until the next
+    read. Copy it if it needs to outlive that.
+
+    Use as a context manager to make sure the device is released:
+
+        with Camera() as camera:
+            faces.snap_face(cam=camera)
+    """
+
+    def __init__(
+            self,
+            device: int = constants.camera_device,
+            warm_up_seconds: float = constants.camera_warm_up_seconds
+        ):
+        self.device = device
+        self.warm_up_seconds = warm_up_seconds
+        self._capture = None
+        self._bgr_frame = None
+        self._rgb_frame = None
+
+    def __enter__(self) -> "Camera":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def is_open(self) -> bool:
+        return self._capture is not None
+
+    def open(self):
+        if self.is_open:
+            return
+
+        capture = cv2.VideoCapture(self.device)
+        if not capture.isOpened():
+            raise CameraException("Couldn't open camera device `{}`".format(self.device))
+
+        time.sleep(self.warm_up_seconds)  # Wait for camera to warm up
+        self._capture = capture
+
+    def close(self):
+        if self.is_open:
+            self._capture.release()
+            self._capture = None
+
+    def read(self) -> np.ndarray:
+        """
+        Grabs the next frame from the camera, opening it first if needed
+
+        :raises CameraException: if the camera didn't return a frame
+        :return: the frame as an RGB image array. The array is reused by the next call to `read`
+        """
+        self.open()
+
+        with metrics.metrics.time('camera_read'):
+            success, frame = self._capture.read(self._bgr_frame)
+        if not success:
+            raise CameraException("Couldn't read a frame from camera device `{}`".format(self.device))
+
+        self._bgr_frame = frame
+        self._rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_frame)
+        return self._rgb_frame
+
+    def frames(self, count: Union[int, None] = None) -> Iterator[np.ndarray]:
+        """Yields `count` consecutive frames, or frames forever if `count` is None"""
+        read = 0
+        while count is None or read < count:
+            yield self.read()
+            read += 1
+
+
+class FrameGrabber(object):
+    """
+    Continuously reads frames from a camera on a background thread into a small ring buffer of preallocated frames.
+
+    Consumers never touch the device. `latest_frame` returns the freshest frame immediately, and `next_frames`
+    waits for frames captured after the call. Frames handed out are copies, so they stay valid after the ring
+    buffer wraps around. `frames` has the same signature as `Camera.frames`, so a grabber can be passed anywhere
+    a camera is expected:
+
+        with FrameGrabber() as grabber:
+            faces.snap_face(cam=grabber)
+    """
+
+    def __init__(
+            self,
+            cam: Union[Camera, None] = None,
+            buffer_size: int = constants.frame_buffer_size,
+            timeout: float = constants.frame_wait_timeout_seconds
+        ):
+        self.camera = cam or Camera()
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+
+        self._buffer = None  # Allocated once the first frame's shape is known
+        self._frames_written = 0
+        self._error = None
+        self._running = False
+        self._thread = None
+        self._condition = threading.Condition()
+
+    def __enter__(self) -> "FrameGrabber":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self):
+        if self._running:
+            return
+
+        self.camera.open()
+        self._error = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="FrameGrabber", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.camera.close()
+
+    def _run(self):
+        while self._running:
+            try:
+                frame = self.camera.read()
+            except CameraException as e:
+                with self._condition:
+                    self._error = e
+                    self._running = False
+                    self._condition.notify_all()
+                return
+
+            with self._condition:
+                if self._buffer is None or self._buffer.shape[1:] != frame.shape:
+                    self._buffer = np.empty((self.buffer_size,) + frame.shape, dtype=frame.dtype)
+
+                np.copyto(self._buffer[self._frames_written % self.buffer_size], frame)
+                self._frames_written += 1
+                self._condition.notify_all()
+
+    def _wait_for_frame(self, after: int) -> (np.ndarray, int):
+        """Waits for a frame newer than the `after`th frame written and returns a copy of the newest one"""
+        if not self._running and self._error is None:
+            self.start()
+
+        with self._condition, metrics.metrics.time('frame_wait'):
+            if not self._condition.wait_for(
+                    lambda: self._frames_written > after or self._error is not None, self.timeout):
+                raise CameraException("Timed out waiting for a frame from camera device `{}`".format(
+                    self.camera.device))
+
+            if self._frames_written <= after:
+                raise CameraException(str(self._error))
+
+            newest = self._frames_written
+            return self._buffer[(newest - 1) % self.buffer_size].copy(), newest
+
+    def latest_frame(self) -> np.ndarray:
+        """Returns the most recently captured frame, waiting for the first one if nothing was captured yet"""
+        frame, _ = self._wait_for_frame(0)
+        return frame
+
+    def next_frames(self, count: int) -> Iterator[np.ndarray]:
+        """Yields `count` distinct frames, each captured after the previous one was yielded"""
+        with self._condition:
+            seen = self._frames_written
+
+        for _ in range(count):
+            frame, seen = self._wait_for_frame(seen)
+            yield frame
+
+    def frames(self, count: Union[int, None] = None) -> Iterator[np.ndarray]:
+        """Yields the latest frame followed by newer ones, `count` frames in total or forever if `count` is None"""
+        seen = 0
+        yielded = 0
+        while count is None or yielded < count:
+            frame, seen = self._wait_for_frame(seen)
+            yield frame
+            yielded += 1
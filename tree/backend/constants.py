@@ -7,11 +7,110 @@ backup_filepath = os.path.join(static_filepath, "backups")
 cropped_faces_filepath = os.path.join(static_filepath, "cropped_faces")
 fresh_photos_filepath = os.path.join(static_filepath, "fresh_photos")
 audio_recordings_filepath = os.path.join(static_filepath, "audio_recordings")
+renditions_filepath = os.path.join(static_filepath, "renditions")
 test_images_filepath = os.path.join(tests_filepath, "images")
 
 pickle_storage_filename = "backup"
 test_pickle_storage_filename = "unit_test_backup"
+benchmark_pickle_storage_filename = "benchmark_backup"
 
 cropped_face_extension = ".jpg"
 fresh_photos_extension = ".jpg"
 saved_audio_recording_extension = ".wav"
+ascii_art_extension = ".txt"
+thumbnail_suffix = "_thumbnail"
+thumbnail_extension = ".jpg"
+
+face_encoding_dimensions = 128
+face_match_tolerance = 0.6  # Same default tolerance as `face_recognition.compare_faces`
+encoding_index_initial_capacity = 64
+# Scratch memory for a chunk of distances between many encodings and a whole gallery, e.g. finding duplicates
+pairwise_distances_max_bytes = 256 * 1024 * 1024
+
+ivf_probes = 8  # Number of inverted lists searched per query. Raise for recall, lower for latency
+ivf_min_train_size = 1024  # Galleries smaller than this are searched exhaustively
+ivf_retrain_growth_factor = 4  # Retrain the k-means buckets once the gallery grows by this factor
+ivf_kmeans_iterations = 10
+ivf_kmeans_max_sample_size = 50000
+
+# Quantized matching scans compact codes, then re-ranks the few candidates that could be nearest by exact distance.
+# It only saves memory over a memory mapped gallery, so it's only enabled through `memmap_quantization_kind` below.
+# Over a gallery held in memory the codes add to the full precision encodings rather than replace them
+quantization_kind = "int8"  # 1 byte per dimension, the only kind
+quantization_chunk_size = 16384  # Code rows cast to float32 at a time during a scan, bounding its scratch memory
+quantization_refit_error_factor = 4.0  # Refit the quantizer once an added encoding's error grows by this factor
+
+# Factor to downscale captured photos by before running the face detector, e.g. 0.5 for half resolution.
+# Detected boxes are mapped back to full resolution for encoding and cropping.
+face_detection_scale = 1.0
+warm_up_image_size = 128  # Side of the blank image the models are warmed up on at startup
+
+camera_device = 0
+camera_warm_up_seconds = 0.3
+frame_buffer_size = 4  # Number of preallocated frames in the background frame grabber's ring buffer
+frame_wait_timeout_seconds = 5.0
+
+# Cheap checks run on a small grayscale copy of each frame before the face detector
+prefilter_width = 160
+prefilter_min_brightness = 20
+prefilter_max_brightness = 235
+prefilter_min_sharpness = 20.0  # Variance of the Laplacian. Lower means blurrier
+prefilter_min_motion = 2.0  # Mean absolute pixel difference from the last frame the detector found empty
+
+journal_storage_filename = "journal"
+journal_snapshot_extension = ".snapshot"
+journal_extension = ".journal"
+journal_sync_every = 16  # fsync the journal after this many records...
+journal_sync_interval_seconds = 1.0  # ...or at most this many seconds after a record was appended
+journal_compact_every = 1000  # Rewrite the snapshot and truncate the journal after this many records
+
+sqlite_storage_filename = "backup.sqlite3"
+test_sqlite_storage_filename = "unit_test_backup.sqlite3"
+# WAL with synchronous=NORMAL never corrupts the database, but a power loss can drop the last few commits.
+# Use "FULL" to fsync every commit.
+sqlite_synchronous = "NORMAL"
+
+memmap_storage_filename = "gallery"
+memmap_encodings_extension = ".encodings"
+memmap_ids_extension = ".ids"
+memmap_messages_extension = ".messages"
+memmap_codes_extension = ".codes"
+memmap_quantizer_extension = ".quantizer"
+memmap_quantization_kind = None  # "int8" to match with persisted quantized codes, None for full precision
+
+image_cache_max_bytes = 64 * 1024 * 1024  # Decoded face images kept in memory, shared by every Face
+
+ascii_art_width = 100  # Characters per line, the same as `pyASCIIgenerator.asciify`
+thumbnail_size = (64, 64)
+ascii_art_cache_size = 1024  # Number of faces' ASCII art kept in memory
+
+# Pipeline instrumentation. Disabled metrics cost next to nothing, so enable them on kiosk hardware to find regressions
+metrics_enabled = False
+metrics_max_samples = 10000  # Most recent observations kept per histogram for percentiles
+metrics_prefix = "tree"  # Prefix of every exported Prometheus metric name
+metrics_filepath = os.path.join(backup_filepath, "metrics.json")  # Written on exit when enabled. Use .prom for text
+
+work_queue_workers = 2  # Threads finishing enrollments (cropping, renditions, storage writes) off the interactive path
+
+# Face tracking between consecutive frames
+tracker_min_iou = 0.3  # Minimum overlap between a face box and a track's last box to continue the track
+tracker_max_missed_frames = 5  # Drop a track after this many frames in a row without its face
+tracker_timeout_seconds = 2.0  # Drop a track that hasn't been seen for this long
+tracker_refresh_seconds = 5.0  # Re-encode and re-match a tracked face at least this often
+
+# Asyncio kiosk, which looks for the next visitor while the current one is being greeted
+kiosk_revisit_seconds = 30.0  # Don't greet a visitor again for this long after their interaction, unless they're new
+kiosk_retry_seconds = 0.2  # Pause between detection attempts that found nobody new
+
+# Voice messages are compressed after they're recorded, and decoded into memory as soon as their face is matched
+compressed_message_extension = ".xz"
+message_compression_preset = 6  # `lzma` preset, from 0 (fastest) to 9 (smallest)
+message_prefetch_max_bytes = 64 * 1024 * 1024  # Decoded messages kept in memory, least recently used dropped first
+message_store_workers = 2  # Threads compressing and prefetching messages
+
+# Recognition server shared by several kiosks
+server_host = "127.0.0.1"
+server_port = 5117
+server_unix_socket_filepath = os.path.join(backup_filepath, "recognition.sock")
+server_pool_size = 4  # Connections each client keeps open to the server
+server_timeout_seconds = 30.0
@@ -0,0 +1,89 @@
+import asyncio
+import uuid
+
+import voicemsg
+
+import tree.backend.camera as camera
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+import tree.backend.kiosk as kiosk
+import tree.backend.message_store as message_store
+
+
+async def interact(k: "kiosk.AsyncKiosk", visitor: "kiosk.Visitor"):
+    """The same interaction as `sound_demo`, awaiting prompts and audio so recognition carries on meanwhile"""
+    f = k.faces
+    face = visitor.face
+
+    if visitor.is_new:
+        print("\n Welcome new face! We will remember you! ")
+        # Show your face as ASCII, once it's been cropped in the background
+        await k.wait_for(face)
+        print(face.ascii_art)
+    else:
+        print("\n We recognize your face! Welcome back! ")
+
+    if face.messages:
+        print(" Would you like to hear your `{}` messages? Y/N".format(len(face.messages)))
+        i = (await k.input(" > ")).lower()
+
+        if i == 'y':
+            print("\nHere are your messages:")
+            for _ in range(len(face.messages)):
+                message = f.consume_message(face)
+                print(" * \"{}\"".format(message))
+                await k.play(message)
+                k.message_store.release(message)
+    else:
+        print(" You have `0` new messages.")
+
+    while True:
+        print("\nWould you like to send a new message? Y/N")
+        i = (await k.input(" > ")).lower()
+
+        if i == 'y':
+            for other_face in f:
+
+                # Show an ASCII image of the person's cropped photo
+                print(other_face.ascii_art)
+
+                print("\nWould you like to message this person? Y/N")
+                i = (await k.input(" > ")).lower()
+                if i == 'y':
+                    print("\nSpeak your message to this person now.")
+                    await asyncio.sleep(0.3)  # Shortest of sleeps
+                    message_id: str = str(uuid.uuid4())
+                    message_filename = "{}.wav".format(message_id)
+                    await k.record(message_filename)
+                    k.message_store.compress(message_filename)
+                    f.add_message(other_face, message_filename)
+                    print("\nMessage successfully added!")
+        else:
+            break
+
+    print("\n\n\nThank you for talking to A Tree")
+    print("===============================\n")
+
+
+def run(f: "faces.Faces", interaction=interact):
+    # Load the face models in the background while the microphone is calibrated
+    faces.start_warm_up()
+
+    vm = voicemsg.VoiceMsg(
+        filepath=constants.audio_recordings_filepath,
+        debug=True)
+    vm.calibrate(show_demo_text=True)  # Calibrates the silence threshold
+
+    # Compress recorded messages, and start decoding a visitor's messages as soon as they're recognized
+    store = message_store.MessageStore()
+    store.watch(f)
+
+    with camera.FrameGrabber() as grabber:
+        k = kiosk.AsyncKiosk(f, grabber, interaction, vm=vm, message_store=store)
+
+        print("Tree initialized")
+        try:
+            asyncio.run(k.run())
+        finally:
+            k.close()
+            store.close()
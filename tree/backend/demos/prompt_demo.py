@@ -1,18 +1,21 @@
-import os
-
-import pyASCIIgenerator
-
-import tree.backend.constants as constants
+import tree.backend.camera as camera
 import tree.backend.faces as faces
 
 
 def run(f: "faces.Faces"):
+    # Load the face models in the background while the camera starts
+    faces.start_warm_up()
+
+    # Keep capturing frames in the background, even while visitors are answering prompts
+    grabber = camera.FrameGrabber()
+    grabber.start()
+
     print("Tree initialized")
 
     while True:
         print("Now detecting faces...")
         try:
-            face = f.snap_face()
+            face = f.snap_face(cam=grabber)
         except faces.FaceNotFoundException:
             print("Error: No face found")
             continue
@@ -22,10 +25,9 @@ def run(f: "faces.Faces"):
             face = exc.preexisting_face
         else:
             print("\n Welcome new face! We will remember you! ")
-            # Show your face as ASCII
-            pyASCIIgenerator.asciify(os.path.join(
-                constants.cropped_faces_filepath,
-                face.cropped_image_filename))
+            # Show your face as ASCII, once it's been cropped in the background
+            f.wait_for(face)
+            print(face.ascii_art)
 
         if face.messages:
             print(" Would you like to read your `{}` messages? Y/N".format(len(face.messages)))
@@ -34,7 +36,7 @@ def run(f: "faces.Faces"):
             if i == 'y':
                 print("\nHere are your messages:")
                 for i in range(len(face.messages)):
-                    print(" * \"{}\"".format(face.consume_message()))
+                    print(" * \"{}\"".format(f.consume_message(face)))
         else:
             print(" You have `0` new messages.")
 
@@ -49,9 +51,7 @@ def run(f: "faces.Faces"):
                     # other_face.show_full_image()
 
                     # Show an ASCII image of the person's cropped photo
-                    pyASCIIgenerator.asciify(os.path.join(
-                        constants.cropped_faces_filepath,
-                        other_face.cropped_image_filename))
+                    print(other_face.ascii_art)
 
                     print("\nWould you like to message this person? Y/N")
                     i = input(" > ").lower()
@@ -1,26 +1,37 @@
-import os
 import time
 import uuid
 
 import voicemsg
-import pyASCIIgenerator
 
+import tree.backend.camera as camera
 import tree.backend.constants as constants
 import tree.backend.faces as faces
+import tree.backend.message_store as message_store
 
 
 def run(f: "faces.Faces"):
+    # Load the face models in the background while the microphone is calibrated
+    faces.start_warm_up()
+
     vm = voicemsg.VoiceMsg(
         filepath=constants.audio_recordings_filepath,
         debug=True)
     vm.calibrate(show_demo_text=True)  # Calibrates the silence threshold
 
+    # Compress recorded messages, and start decoding a visitor's messages as soon as they're recognized
+    store = message_store.MessageStore()
+    store.watch(f)
+
+    # Keep capturing frames in the background, even while visitors are answering prompts
+    grabber = camera.FrameGrabber()
+    grabber.start()
+
     print("Tree initialized")
 
     while True:
         print("Now detecting faces...")
         try:
-            face = f.snap_face()
+            face = f.snap_face(cam=grabber)
         except faces.FaceNotFoundException:
             print("Error: No face found")
             continue
@@ -30,10 +41,9 @@ def run(f: "faces.Faces"):
             face = exc.preexisting_face
         else:
             print("\n Welcome new face! We will remember you! ")
-            # Show your face as ASCII
-            pyASCIIgenerator.asciify(os.path.join(
-                constants.cropped_faces_filepath,
-                face.cropped_image_filename))
+            # Show your face as ASCII, once it's been cropped in the background
+            f.wait_for(face)
+            print(face.ascii_art)
 
         if face.messages:
             print(" Would you like to hear your `{}` messages? Y/N".format(len(face.messages)))
@@ -42,9 +52,10 @@ def run(f: "faces.Faces"):
             if i == 'y':
                 print("\nHere are your messages:")
                 for _ in range(len(face.messages)):
-                    message = face.consume_message()
+                    message = f.consume_message(face)
                     print(" * \"{}\"".format(message))
-                    vm.play(message)
+                    store.play(message)
+                    store.release(message)
         else:
             print(" You have `0` new messages.")
 
@@ -56,9 +67,7 @@ def run(f: "faces.Faces"):
                 for other_face in f:
 
                     # Show an ASCII image of the person's cropped photo
-                    pyASCIIgenerator.asciify(os.path.join(
-                        constants.cropped_faces_filepath,
-                        other_face.cropped_image_filename))
+                    print(other_face.ascii_art)
 
                     print("\nWould you like to message this person? Y/N")
                     i = input(" > ").lower()
@@ -68,6 +77,7 @@ def run(f: "faces.Faces"):
                         message_id: str = str(uuid.uuid4())
                         message_filename = "{}.wav".format(message_id)
                         vm.record(message_filename)
+                        store.compress(message_filename)
                         f.add_message(other_face, message_filename)
                         print("\nMessage successfully added!")
             else:
@@ -0,0 +1,270 @@
+from typing import Iterable, Union
+
+import numpy as np
+
+import tree.backend.constants as constants
+
+
+def pairwise_distances(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Returns the (len(a) x len(b)) matrix of euclidean distances between the rows of `a` and `b`"""
+    squared_distances = (
+        np.einsum('ij,ij->i', a, a)[:, None] - 2 * (a @ b.T) + np.einsum('ij,ij->i', b, b)[None, :])
+    return np.sqrt(np.maximum(squared_distances, 0, out=squared_distances))
+
+
+def chunk_rows(columns: int, max_bytes: int = constants.pairwise_distances_max_bytes) -> int:
+    """Returns how many encodings can be compared against `columns` others at a time within `max_bytes`"""
+    # Computing a (rows x columns) block of distances holds up to three float64 temporaries of that shape at once
+    return max(1, max_bytes // (3 * np.dtype(np.float64).itemsize * max(columns, 1)))
+
+
+def first_occurrences(
+        encodings: np.ndarray,
+        tolerance: float = constants.face_match_tolerance,
+        chunk_size: Union[int, None] = None
+    ) -> np.ndarray:
+    """
+    Finds the encodings that don't match any encoding before them
+
+    :param encodings: (N x dimensions) matrix of encodings
+    :param tolerance: Maximum distance between encodings to consider them the same face
+    :param chunk_size: number of encodings compared at a time, bounding memory to (chunk_size x N). Defaults to
+        as many as fit in `constants.pairwise_distances_max_bytes`
+    :return: a boolean mask of the encodings to keep, where only the first of each set of matching encodings is kept
+    """
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, constants.face_encoding_dimensions)
+    keep = np.zeros(len(encodings), dtype=bool)
+    chunk_size = chunk_size or chunk_rows(len(encodings))
+
+    for start in range(0, len(encodings), chunk_size):
+        chunk = encodings[start:start + chunk_size]
+
+        # Drop anything matching an encoding already kept from an earlier chunk
+        kept = encodings[:start][keep[:start]]
+        candidates = np.ones(len(chunk), dtype=bool)
+        if len(kept):
+            candidates &= ~(pairwise_distances(chunk, kept) <= tolerance).any(axis=1)
+
+        # Then keep each remaining encoding unless it matches an earlier one kept from this chunk
+        matches = pairwise_distances(chunk, chunk) <= tolerance
+        for i in np.flatnonzero(candidates):
+            if candidates[i]:
+                keep[start + i] = True
+                candidates[i + 1:] &= ~matches[i, i + 1:]
+
+    return keep
+
+
+class EncodingIndex(object):
+    """
+    Contiguous, preallocated matrix of face encodings with a parallel array of face ids.
+
+    Rows are appended in insertion order and the backing matrix grows geometrically, so adding an encoding is
+    amortized O(1) and a lookup is a single matrix-vector product over the whole gallery. Squared row norms are
+    cached alongside the matrix so no (N x dimensions) temporary is allocated per lookup.
+
+    An index built with `from_matrix` adopts an existing matrix, such as a `np.memmap`, as a read-only base, and
+    rows added afterwards go to the growable matrix after it. The base is never copied, so a memory mapped gallery
+    stays paged in on demand, and its squared norms are only computed by the first scan that needs them.
+    """
+
+    def __init__(
+            self,
+            dimensions: int = constants.face_encoding_dimensions,
+            capacity: int = constants.encoding_index_initial_capacity,
+            dtype=np.float64
+        ):
+        self.dimensions = dimensions
+        self.dtype = np.dtype(dtype)
+        self._base = np.empty((0, dimensions), dtype=self.dtype)
+        self._base_squared_norms = np.empty(0, dtype=self.dtype)
+        self._matrix = np.empty((max(capacity, 1), dimensions), dtype=self.dtype)
+        self._squared_norms = np.empty(max(capacity, 1), dtype=self.dtype)
+        self._ids = np.empty(max(capacity, 1), dtype=object)
+        self._size = 0
+        self.reallocations = 0  # Incremented whenever the growable matrix moves, invalidating views into it
+
+    @classmethod
+    def from_encodings(cls, ids: Iterable[str], encodings: Iterable, **kwargs) -> "EncodingIndex":
+        """Builds an index from parallel iterables of face ids and encodings"""
+        ids = list(ids)
+        index = cls(capacity=len(ids), **kwargs)
+        for _id, encoding in zip(ids, encodings):
+            index.add(_id, encoding)
+        return index
+
+    @classmethod
+    def from_matrix(cls, ids, matrix: np.ndarray) -> "EncodingIndex":
+        """
+        Builds an index that adopts an existing (N x dimensions) matrix, such as a `np.memmap`, without copying or
+        reading it. Encodings added later are kept after it in a separate growable matrix.
+        """
+        index = cls(matrix.shape[1], dtype=matrix.dtype)
+        index._base = matrix
+        index._base_squared_norms = None
+        index._ids = np.empty(max(len(matrix), 1), dtype=object)
+        index._ids[:len(matrix)] = list(ids)
+        index._size = len(matrix)
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(self._base) + self._matrix.shape[0]
+
+    @property
+    def _added(self) -> np.ndarray:
+        """A view of the filled rows of the growable matrix"""
+        return self._matrix[:self._size - len(self._base)]
+
+    @property
+    def encodings(self) -> np.ndarray:
+        """
+        The filled rows of the encoding matrix. This is a view, unless encodings were added to an adopted matrix, in
+        which case both are copied into one. Use `rows` or `encoding` to read part of a large index.
+        """
+        if not len(self._base):
+            return self._added
+        if len(self._base) == self._size:
+            return self._base
+        return np.concatenate([self._base, self._added])
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """Returns rows `start` up to `stop` of the encoding matrix, as a view unless they span an adopted matrix"""
+        base_size = len(self._base)
+        stop = min(stop, self._size)
+        if stop <= base_size:
+            return self._base[start:stop]
+        if start >= base_size:
+            return self._matrix[start - base_size:stop - base_size]
+        return np.concatenate([self._base[start:], self._matrix[:stop - base_size]])
+
+    def encoding(self, row: int) -> np.ndarray:
+        """Returns a view of a single row"""
+        base_size = len(self._base)
+        return self._base[row] if row < base_size else self._matrix[row - base_size]
+
+    @property
+    def ids(self) -> np.ndarray:
+        """A view of the face ids, parallel to `encodings`"""
+        return self._ids[:self._size]
+
+    def add(self, _id: str, encoding) -> int:
+        """
+        Appends an encoding to the index, growing the backing arrays if they're full
+
+        :param _id: id of the face the encoding belongs to
+        :param encoding: a face encoding of length `dimensions`
+        :return: the row the encoding was stored at
+        """
+        added = self._size - len(self._base)
+        if added == self._matrix.shape[0]:
+            self._grow(self._matrix.shape[0] * 2)
+        if self._size == len(self._ids):
+            ids = np.empty(2 * len(self._ids), dtype=object)
+            ids[:self._size] = self._ids[:self._size]
+            self._ids = ids
+
+        row = self._size
+        self._matrix[added] = encoding
+        self._squared_norms[added] = self._matrix[added] @ self._matrix[added]
+        self._ids[row] = _id
+        self._size += 1
+        return row
+
+    def _grow(self, capacity: int):
+        capacity = max(capacity, 1)
+        added = self._size - len(self._base)
+        matrix = np.empty((capacity, self.dimensions), dtype=self.dtype)
+        matrix[:added] = self._matrix[:added]
+        squared_norms = np.empty(capacity, dtype=self.dtype)
+        squared_norms[:added] = self._squared_norms[:added]
+        self._matrix, self._squared_norms = matrix, squared_norms
+        self.reallocations += 1
+
+    def _take(self, rows: np.ndarray) -> np.ndarray:
+        """Gathers the given rows into a new matrix"""
+        rows = np.asarray(rows, dtype=np.intp)
+        base_size = len(self._base)
+        if not base_size:
+            return self._matrix[rows]
+
+        in_base = rows < base_size
+        taken = np.empty((len(rows), self.dimensions), dtype=self.dtype)
+        taken[in_base] = self._base[rows[in_base]]
+        taken[~in_base] = self._matrix[rows[~in_base] - base_size]
+        return taken
+
+    def _squared_norms_of_base(self) -> np.ndarray:
+        if self._base_squared_norms is None:
+            self._base_squared_norms = np.einsum('ij,ij->i', self._base, self._base)
+        return self._base_squared_norms
+
+    def _partial_squared_distances(self, queries: np.ndarray) -> np.ndarray:
+        """Returns `|row|^2 - 2 * query . row` for each query and row, which orders rows by distance"""
+        base_size = len(self._base)
+        added = self._added
+        partial = np.empty((len(queries), self._size), dtype=self.dtype)
+        if base_size:
+            partial[:, :base_size] = self._squared_norms_of_base()[None, :] - 2 * (queries @ self._base.T)
+        partial[:, base_size:] = self._squared_norms[:len(added)][None, :] - 2 * (queries @ added.T)
+        return partial
+
+    def distances(self, face_encoding) -> np.ndarray:
+        """Returns the euclidean distance from `face_encoding` to every encoding in the index"""
+        return np.sqrt(self._squared_distances(face_encoding))
+
+    def distance(self, row: int, face_encoding) -> float:
+        """Returns the exact euclidean distance from `face_encoding` to a single row"""
+        return float(self.row_distances(np.array([row]), face_encoding)[0])
+
+    def row_distances(self, rows: np.ndarray, face_encoding) -> np.ndarray:
+        """Returns the exact euclidean distance from `face_encoding` to each of the given rows"""
+        # Computed the same way as `face_recognition.face_distance`, so match decisions agree with it exactly
+        return np.linalg.norm(self._take(rows) - np.asarray(face_encoding, dtype=self.dtype), axis=1)
+
+    def _squared_distances(self, face_encoding) -> np.ndarray:
+        query = np.asarray(face_encoding, dtype=self.dtype)
+        squared_distances = self._partial_squared_distances(query[None, :])[0] + query @ query
+        return np.maximum(squared_distances, 0, out=squared_distances)
+
+    def nearest_many(self, face_encodings, chunk_size: Union[int, None] = None) -> (np.ndarray, np.ndarray):
+        """
+        Finds the nearest encoding to each of a batch of encodings with one matrix product per chunk
+
+        :param face_encodings: (K x dimensions) matrix of encodings to match
+        :param chunk_size: number of encodings matched at a time, bounding memory to (chunk_size x N). Defaults to
+            as many as fit in `constants.pairwise_distances_max_bytes`
+        :return: the row of the nearest encoding to each, and its distance. Rows are -1 if the index is empty
+        """
+        queries = np.asarray(face_encodings, dtype=self.dtype).reshape(-1, self.dimensions)
+        chunk_size = chunk_size or chunk_rows(self._size)
+        rows = np.full(len(queries), -1, dtype=np.intp)
+        distances = np.full(len(queries), np.inf)
+        if not self._size:
+            return rows, distances
+
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start:start + chunk_size]
+            rows[start:start + chunk_size] = np.argmin(self._partial_squared_distances(chunk), axis=1)
+
+        # Recompute each winner's distance directly, the same way as `row_distances`
+        distances[:] = np.linalg.norm(self._take(rows) - queries, axis=1)
+        return rows, distances
+
+    def nearest(self, face_encoding) -> (Union[int, None], float):
+        """
+        Finds the encoding closest to `face_encoding`
+
+        :param face_encoding: A face encoding to match against
+        :return: the row of the nearest encoding and its distance, or `(None, inf)` if the index is empty
+        """
+        if not self._size:
+            return None, float('inf')
+
+        row = int(np.argmin(self._squared_distances(face_encoding)))
+
+        # Recompute the winner's distance directly so it matches `face_recognition.face_distance` exactly
+        return row, self.distance(row, face_encoding)
@@ -0,0 +1,49 @@
+import argparse
+import os
+import sys
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+from tree.backend.storage.pickle_storage import pickle_storage
+
+image_extensions = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def find_images(paths) -> list:
+    """Expands directories into the image files inside them, keeping files as they are"""
+    filepaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in sorted(os.walk(path)):
+                filepaths.extend(
+                    os.path.join(directory, filename) for filename in sorted(filenames)
+                    if filename.lower().endswith(image_extensions))
+        else:
+            filepaths.append(path)
+    return filepaths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk enroll faces from existing photos")
+    parser.add_argument('paths', nargs='+', help="image files, or directories to search for images")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes. Defaults to the CPU count")
+    parser.add_argument('--detection-scale', type=float, default=constants.face_detection_scale)
+    parser.add_argument('--tolerance', type=float, default=constants.face_match_tolerance)
+    args = parser.parse_args()
+
+    filepaths = find_images(args.paths)
+    print("Enrolling {} images...".format(len(filepaths)))
+
+    # Load the record of seen faces and messages
+    f = pickle_storage.load()
+
+    new_faces = f.add_faces_from_images(
+        filepaths, max_workers=args.workers, detection_scale=args.detection_scale, tolerance=args.tolerance)
+
+    print("Enrolled {} new faces. Skipped {} images without a face or of an already known face.".format(
+        len(new_faces), len(filepaths) - len(new_faces)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,38 @@
 import os
 import sys
+import threading
 import uuid
-from typing import Union
+from collections import namedtuple
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterable, Union
 
-import face_recognition
-from PIL import Image
-import cv2
+import numpy as np
 
 sys.path.append('.')
 
+import tree.backend.camera as camera
 import tree.backend.constants as constants
+import tree.backend.encoding_index as encoding_index
+import tree.backend.image_cache as image_cache
+import tree.backend.lazy_import as lazy_import
+import tree.backend.matchers as matchers
+import tree.backend.matchers.brute_force as brute_force
+import tree.backend.metrics as metrics
+import tree.backend.prefilter as prefilter
+import tree.backend.renditions as renditions
+import tree.backend.work_queue as work_queue
 import tree.backend.storage.pickle_storage as pickle_storage
 
+if TYPE_CHECKING:
+    # Only for annotations, since tracking imports this module
+    import tree.backend.tracking as tracking
+
+# Imported on first use, so loading storage or the gallery doesn't wait on dlib's models
+face_recognition = lazy_import.lazy_import('face_recognition')
+Image = lazy_import.lazy_import('PIL.Image')
+cv2 = lazy_import.lazy_import('cv2')
+
 
 class FaceNotFoundException(Exception):
     """Raised if we couldn't detect a face in the provided image"""
@@ -30,29 +51,90 @@ class PreExistingFaceFoundException(Exception):
         super().__init__(message)
 
 
-def cam_capture() -> (str, str):
+# A face found in a frame: the new or recorded `Face`, whether it was just enrolled, and its
+# (top, right, bottom, left) box in the frame
+FrameFace = namedtuple('FrameFace', ['face', 'is_new', 'location'])
+
+
+def cam_capture(cam: Union["camera.Camera", None] = None) -> (str, str):
     """
     Captures an image from a connected webcam and saves the file to the fresh_photos folder.
+    :param cam: optional open camera to capture from. A camera is opened just for this capture if not given.
     :return: Returns an id used to create the file and the filepath to the saved image.
     """
-    vidcap = cv2.VideoCapture(0)
-    import time; time.sleep(0.3)  # Wait for camera to warm up
-    success, image = vidcap.read()
+    if cam is None:
+        with camera.Camera() as cam:
+            return cam_capture(cam)
 
     _id = str(uuid.uuid4())
-    filename = _id + constants.fresh_photos_extension
-    filepath = os.path.join(constants.fresh_photos_filepath, filename)
-
-    cv2.imwrite(filepath, image)
+    filepath = save_full_image(cam.read(), _id)
 
     return _id, filepath
 
 
+def save_full_image(image, _id: str) -> str:
+    """
+    Saves an RGB image array to the fresh_photos folder as the full image of the face with the given id
+    :return: the filepath to the saved image
+    """
+    filepath = os.path.join(constants.fresh_photos_filepath, Face.full_image_filename_from_id(_id))
+    with metrics.metrics.time('save_full_image'):
+        Image.fromarray(image).save(filepath)
+    image_cache.image_cache.invalidate(_id, image_cache.FULL_IMAGE)
+    return filepath
+
+
+def warm_up(size: int = constants.warm_up_image_size):
+    """
+    Imports the face recognition, OpenCV and PIL modules and runs detection and encoding once on a blank image, so
+    the first visitor doesn't wait for dlib's models to load
+    """
+    image = np.zeros((size, size, 3), dtype=np.uint8)
+    face_recognition.face_locations(cv2.resize(image, (0, 0), fx=0.5, fy=0.5))
+    face_recognition.face_encodings(image, known_face_locations=[(0, size, size, 0)])
+    Image.fromarray(image)
+
+
+def start_warm_up() -> threading.Thread:
+    """Runs `warm_up` on a background thread. Anything that needs the models meanwhile waits for them to load"""
+    thread = threading.Thread(target=warm_up, name="WarmUp", daemon=True)
+    thread.start()
+    return thread
+
+
+def detect_face_locations(image, scale: float = constants.face_detection_scale) -> list:
+    """
+    Runs the face detector once over an image, optionally on a downscaled copy of it
+
+    :param image: RGB image array to search for faces within
+    :param scale: factor to shrink the image by before detection. Boxes are mapped back to full resolution
+    :return: a list of (top, right, bottom, left) face boxes in the coordinates of `image`
+    """
+    with metrics.metrics.time('face_locations'):
+        if scale == 1:
+            return face_recognition.face_locations(image)
+
+        small_image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        small_face_locations = face_recognition.face_locations(small_image)
+
+    height, width = image.shape[:2]
+    return [
+        (
+            max(int(round(top / scale)), 0),
+            min(int(round(right / scale)), width),
+            min(int(round(bottom / scale)), height),
+            max(int(round(left / scale)), 0),
+        )
+        for top, right, bottom, left in small_face_locations
+    ]
+
+
 def create_face_from_image(
         filepath: str,
         _id: Union[str, None] = None,
         faces: Union["Faces", None] = None,
-        save_backup: bool = True
+        save_backup: bool = True,
+        detection_scale: float = constants.face_detection_scale
     ) -> "Face":
     """
     Creates a Face object from an image filepath, optionally adding it to a collection of Faces
@@ -61,14 +143,41 @@ def create_face_from_image(
     :param _id: optional id to use for the new Face object
     :param faces: optional Faces object to add the newly created Face to
     :param save_backup: Saves a backup to disk if `faces` is given and this is set to True
+    :param detection_scale: factor to downscale the image by for face detection. Encoding and cropping always use
+        the full resolution image
     :return: the newly created Face object
     """
 
     # Load the image into facial recognition
-    image = face_recognition.load_image_file(filepath)
+    with metrics.metrics.time('load_image_file'):
+        image = face_recognition.load_image_file(filepath)
+
+    return create_face_from_array(image, _id, faces, save_backup, detection_scale)
 
-    # Find the location of the face(s) in the image
-    face_locations = face_recognition.face_locations(image)
+
+def create_face_from_array(
+        image,
+        _id: Union[str, None] = None,
+        faces: Union["Faces", None] = None,
+        save_backup: bool = True,
+        detection_scale: float = constants.face_detection_scale,
+        save_image: bool = False
+    ) -> "Face":
+    """
+    Creates a Face object from an already decoded RGB image array, optionally adding it to a collection of Faces
+
+    :param image: RGB image array to search for faces within
+    :param _id: optional id to use for the new Face object
+    :param faces: optional Faces object to add the newly created Face to
+    :param save_backup: Saves a backup to disk if `faces` is given and this is set to True
+    :param detection_scale: factor to downscale the image by for face detection
+    :param save_image: Saves `image` to the fresh_photos folder as the new face's full image. Nothing is written
+        if no face is found or the face was seen before.
+    :return: the newly created Face object
+    """
+
+    # Find the location of the face(s) in the image. This is the only time the detector runs
+    face_locations = detect_face_locations(image, detection_scale)
 
     # Check if we could detect a face or not. If not, try again.
     try:
@@ -79,56 +188,203 @@ def create_face_from_image(
     # Create an id for the new face
     _id = _id or str(uuid.uuid4())
 
-    # Build an encoding for the face
-    encoding = face_recognition.face_encodings(image)[0]
+    # Build an encoding for the face, reusing the detected box rather than detecting again
+    with metrics.metrics.time('face_encodings'):
+        encoding = face_recognition.face_encodings(image, known_face_locations=[face_location])[0]
 
     # Create a new face object using the new image's id and the face's encoding
     face = Face(_id, encoding)
 
-    # If faces was provided, we want to check if we've seen this face before
+    # If faces was provided, we want to check if we've seen this face before, and record it if we haven't
     if faces is not None:
-        try:
-            # Search the record of existing faces for this new face
-            preexisting_face = faces.get_face_from_encoding(encoding)
-        except NoMatchingFaceFoundException:
-            # We don't have a record of this new face, so we should continue on to crop and record it
-            faces.add_face(face, save_backup=save_backup)
-            pass
-        else:
+        face, is_new = faces.enroll([encoding], [_id], save_backup=save_backup)[0]
+        if not is_new:
             # We've already seen this face before, so we don't want to record it
-            raise PreExistingFaceFoundException(preexisting_face)
+            raise PreExistingFaceFoundException(face)
 
     # Crop the face in PIL
     top, right, bottom, left = face_location
-    crop_face(image, _id, (left, top, right, bottom), flip_horizontally=True)
+    if faces is not None and faces.work_queue is not None:
+        # Finish enrolling in the background so the visitor can be greeted now. Frames can be reused buffers, so
+        # hand the worker its own copy
+        faces.work_queue.submit(_id, finish_enrollment, image.copy(), _id, (left, top, right, bottom), save_image)
+    else:
+        finish_enrollment(image, _id, (left, top, right, bottom), save_image)
 
     return face
 
 
-def crop_face(image, filename, box, flip_horizontally=False):
-    # Load the image into PIL for cropping
-    pil_image = Image.fromarray(image)
+def create_faces_from_array(
+        image,
+        faces: "Faces",
+        save_backup: bool = True,
+        detection_scale: float = constants.face_detection_scale,
+        save_image: bool = False,
+        face_locations: Union[list, None] = None
+    ) -> list:
+    """
+    Finds every face in an RGB image array, enrolling the ones that haven't been seen before.
+    All faces are encoded in one batched call and matched against `faces` with one matrix operation.
+
+    :param image: RGB image array to search for faces within
+    :param faces: Faces object to match against and add new faces to
+    :param save_backup: Saves a backup to disk after adding each new face
+    :param detection_scale: factor to downscale the image by for face detection
+    :param save_image: Saves `image` to the fresh_photos folder as the full image of each new face
+    :param face_locations: optional (top, right, bottom, left) boxes of faces already detected in `image`
+    :raises FaceNotFoundException: if there are no faces in the image
+    :return: a `FrameFace` for each face found, in detection order
+    """
+    if face_locations is None:
+        face_locations = detect_face_locations(image, detection_scale)
 
-    # Crop the face in PIL
-    cropped_pil_image = pil_image.crop(box)
+    if not face_locations:
+        raise FaceNotFoundException
 
-    if flip_horizontally:
-        cropped_pil_image = cropped_pil_image.transpose(Image.FLIP_LEFT_RIGHT)
+    with metrics.metrics.time('face_encodings'):
+        encodings = np.array(face_recognition.face_encodings(image, known_face_locations=face_locations))
 
-    # Save the cropped face
-    cropped_image_filename = Face.cropped_image_filename_from_id(filename)
-    cropped_image_filepath = os.path.join(constants.cropped_faces_filepath, cropped_image_filename)
-    cropped_pil_image.save(cropped_image_filepath)
+    frame_faces = []
+    for face_location, (face, is_new) in zip(face_locations, faces.enroll(encodings, save_backup=save_backup)):
+        if not is_new:
+            frame_faces.append(FrameFace(face, False, face_location))
+            continue
+
+        top, right, bottom, left = face_location
+        if faces.work_queue is not None:
+            faces.work_queue.submit(
+                face._id, finish_enrollment, image.copy(), face._id, (left, top, right, bottom), save_image)
+        else:
+            finish_enrollment(image, face._id, (left, top, right, bottom), save_image)
+
+        frame_faces.append(FrameFace(face, True, face_location))
+
+    return frame_faces
+
+
+def finish_enrollment(image, _id: str, box, save_image: bool = False):
+    """
+    Saves the images of a newly enrolled face: its cropped face and renditions, and optionally the full image
+
+    :param image: RGB image array the face was found in
+    :param _id: id of the new face
+    :param box: (left, top, right, bottom) box of the face in `image`
+    :param save_image: also save `image` to the fresh_photos folder
+    """
+    crop_face(image, _id, box, flip_horizontally=True)
+
+    if save_image:
+        save_full_image(image, _id)
+
+
+def enroll_image_file(
+        filepath: str,
+        _id: str,
+        detection_scale: float = constants.face_detection_scale
+    ) -> Union["np.ndarray", None]:
+    """
+    Decodes, detects and encodes the first face in an image file, then saves its full image, cropped face and
+    renditions under `_id`. Runs in a worker process during batch enrollment, so it only takes and returns
+    picklable values.
+
+    :return: the face's encoding, or None if the image couldn't be read or no face was found
+    """
+    try:
+        image = face_recognition.load_image_file(filepath)
+    except OSError:
+        return None
+
+    face_locations = detect_face_locations(image, detection_scale)
+    if not face_locations:
+        return None
+
+    face_location = face_locations[0]
+    encoding = face_recognition.face_encodings(image, known_face_locations=[face_location])[0]
+
+    top, right, bottom, left = face_location
+    finish_enrollment(image, _id, (left, top, right, bottom), save_image=True)
+
+    return encoding
+
+
+def remove_face_files(_id: str):
+    """Deletes every file saved for a face: its full image, cropped face and renditions"""
+    for filepath in (
+            os.path.join(constants.fresh_photos_filepath, Face.full_image_filename_from_id(_id)),
+            os.path.join(constants.cropped_faces_filepath, Face.cropped_image_filename_from_id(_id)),
+            renditions.ascii_art_filepath(_id),
+            renditions.thumbnail_filepath(_id)):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+
+    image_cache.image_cache.invalidate(_id)
+    renditions.invalidate(_id)
+
+
+def crop_face(image, filename, box, flip_horizontally=False, generate_renditions=True):
+    with metrics.metrics.time('crop_face'):
+        # Load the image into PIL for cropping
+        pil_image = Image.fromarray(image)
+
+        # Crop the face in PIL
+        cropped_pil_image = pil_image.crop(box)
+
+        if flip_horizontally:
+            cropped_pil_image = cropped_pil_image.transpose(Image.FLIP_LEFT_RIGHT)
+
+        # Save the cropped face
+        cropped_image_filename = Face.cropped_image_filename_from_id(filename)
+        cropped_image_filepath = os.path.join(constants.cropped_faces_filepath, cropped_image_filename)
+        cropped_pil_image.save(cropped_image_filepath)
+        image_cache.image_cache.invalidate(filename, image_cache.CROPPED_IMAGE)
+
+        # Derive the ASCII art and thumbnail now, so showing the face later is just a lookup
+        if generate_renditions:
+            renditions.generate_renditions(filename, cropped_pil_image)
 
 
 class Face(object):
-    def __init__(self, _id: str, encoding):
+    """
+    Compact record of a recorded face.
+
+    Faces held by a `Faces` object have their encoding rebound to a row view into its shared encoding matrix.
+    If a `message_loader` is given, messages are only read by calling it with the face's id the first time they're
+    accessed.
+    """
+
+    __slots__ = ('_id', 'encoding', '_messages', '_message_loader')
+
+    def __init__(self, _id: str, encoding, message_loader: Union[Callable[[str], list], None] = None):
 
         self._id: str = _id
         self.encoding = encoding
-        self.messages = []
-        self._full_image = None  # Use self.full_image to get this
-        self._cropped_image = None  # Use self.cropped_image to get this
+        self._messages = None if message_loader else []
+        self._message_loader = message_loader
+
+    def __getstate__(self):
+        return {'_id': self._id, 'encoding': self.encoding, 'messages': self.messages}
+
+    def __setstate__(self, state):
+        # Also restores faces pickled with a `__dict__` before this class had slots
+        self._id = state['_id']
+        self.encoding = state['encoding']
+        self._messages = state['messages']
+        self._message_loader = None
+
+    @property
+    def messages(self) -> list:
+        if self._messages is None:
+            self._messages = self._message_loader(self._id)
+            self._message_loader = None
+
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages: list):
+        self._messages = messages
+        self._message_loader = None
 
     @property
     def full_image_filename(self):
@@ -142,21 +398,27 @@ class Face(object):
 
     @property
     def full_image(self):
-        if self._full_image:
-            return self._full_image
-
+        """The full original image, decoded once and kept in the shared image cache. Treat it as read-only."""
         filepath = os.path.join(constants.fresh_photos_filepath, self.full_image_filename)
-        image = Image.open(filepath)
-        return image
+        return image_cache.image_cache.get((self._id, image_cache.FULL_IMAGE), lambda: Image.open(filepath))
 
     @property
     def cropped_image(self):
-        if self._cropped_image:
-            return self._cropped_image
-
+        """The cropped face, decoded once and kept in the shared image cache. Treat it as read-only."""
         filepath = os.path.join(constants.cropped_faces_filepath, self.cropped_image_filename)
-        image = Image.open(filepath)
-        return image
+        return image_cache.image_cache.get((self._id, image_cache.CROPPED_IMAGE), lambda: Image.open(filepath))
+
+    @property
+    def ascii_art(self) -> str:
+        """ASCII art of the cropped face, generated once at enrollment"""
+        return renditions.load_ascii_art(
+            self._id, os.path.join(constants.cropped_faces_filepath, self.cropped_image_filename))
+
+    @property
+    def thumbnail(self):
+        """Small thumbnail of the cropped face, generated once at enrollment. Treat it as read-only."""
+        return renditions.load_thumbnail(
+            self._id, os.path.join(constants.cropped_faces_filepath, self.cropped_image_filename))
 
     @staticmethod
     def full_image_filename_from_id(_id: str):
@@ -166,6 +428,12 @@ class Face(object):
     def cropped_image_filename_from_id(_id: str):
         return _id + constants.cropped_face_extension
 
+    def copy(self) -> "Face":
+        """Returns a face with the same id and encoding, and a copy of the current messages"""
+        face = Face(self._id, self.encoding)
+        face.messages = list(self.messages)
+        return face
+
     def add_message(self, message):
         self.messages.append(message)
 
@@ -179,10 +447,76 @@ class Face(object):
         self.cropped_image.show()
 
 
+class LazyFaceList(Sequence):
+    """
+    List of faces that only creates each `Face` the first time it's accessed.
+
+    Used by storage backends that can hand `Faces` a ready-made encoding index, so a gallery can start matching
+    without materializing a Python object per face. Pickles as a plain list.
+    """
+
+    def __init__(self, length: int, face_factory: Callable[[int], "Face"]):
+        self._length = length
+        self._face_factory = face_factory
+        self._faces = {}  # Row to already created face
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(self._length))]
+
+        if row < 0:
+            row += self._length
+        if not 0 <= row < self._length:
+            raise IndexError(row)
+
+        try:
+            return self._faces[row]
+        except KeyError:
+            face = self._faces[row] = self._face_factory(row)
+            return face
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+    @property
+    def materialized(self) -> dict:
+        """The faces created so far, keyed by row"""
+        return self._faces
+
+    def append(self, face: "Face"):
+        self._faces[self._length] = face
+        self._length += 1
+
+
 class Faces(object):
-    def __init__(self, faces=None, storage=None):
-        self.faces = faces or []
+    def __init__(
+            self,
+            faces=None,
+            storage=None,
+            matcher: Union["matchers.Matcher", None] = None,
+            encoding_index: Union["encoding_index.EncodingIndex", None] = None
+        ):
+        """
+        :param faces: the recorded faces
+        :param storage: storage backend to record changes with
+        :param matcher: strategy used to search the recorded faces
+        :param encoding_index: optional prebuilt index of the encodings of `faces`, in the same order. Saves reading
+            the encoding of every face, which lets `faces` be a `LazyFaceList`.
+        """
+        self.faces = faces if faces is not None else []
         self.storage = storage or pickle_storage.pickle_storage
+        self.work_queue = None  # Set to a `work_queue.WorkQueue` to move enrollment work off the interactive path
+        self.lock = threading.RLock()  # Held while mutating, and while storage writes read this object
+        self.match_callbacks = []  # Called with each face matched, e.g. to prefetch its messages
+        self._storage_generation = 0  # Bumped by each full save, which already holds every change queued before it
+        self._matcher_training_queued = False
+        self.encoding_index = encoding_index or self._build_encoding_index()
+        self.matcher = matcher or brute_force.BruteForceMatcher()
+        self.matcher.build(self.encoding_index)
+        self._share_encodings()
 
     def __iter__(self):
         return self.faces.__iter__()
@@ -190,81 +524,466 @@ class Faces(object):
     def __next__(self):
         return self.faces.__next__()
 
+    def __getstate__(self):
+        # Storage backends can hold open files, and are reattached by whichever storage loads this object
+        state = self.__dict__.copy()
+        for unpicklable in (
+                'storage', 'work_queue', 'lock', 'match_callbacks', '_storage_generation', '_matcher_training_queued'):
+            state.pop(unpicklable, None)
+
+        # Every face pickles its own encoding, so the index and the matcher built on it are rebuilt on load rather
+        # than written twice. Only the matcher's settings are kept, so it's rebuilt the same kind
+        state.pop('encoding_index', None)
+        if 'matcher' in state:
+            state['matcher'] = self.matcher.unbuilt_copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.storage = state.get('storage', pickle_storage.pickle_storage)
+        self.work_queue = None
+        self.lock = threading.RLock()
+        self.match_callbacks = []
+        self._storage_generation = 0
+        self._matcher_training_queued = False
+
+        # Rebuilt from the faces, including for backups that pickled an index and a built matcher of their own
+        self.encoding_index = self._build_encoding_index()
+        matcher = state.get('matcher')
+        self.matcher = matcher.unbuilt_copy() if matcher is not None else brute_force.BruteForceMatcher()
+        self.matcher.build(self.encoding_index)
+
+        self._share_encodings()
+
+    def _build_encoding_index(self) -> encoding_index.EncodingIndex:
+        return encoding_index.EncodingIndex.from_encodings(
+            (face._id for face in self.faces), (face.encoding for face in self.faces))
+
+    def _loaded_faces(self):
+        """Yields (row, face) for every face that exists as an object, without creating any lazy ones"""
+        if isinstance(self.faces, LazyFaceList):
+            return iter(list(self.faces.materialized.items()))
+        return enumerate(self.faces)
+
+    def _share_encodings(self):
+        """Rebinds the encoding of every face to a view of its row in the encoding index, so it isn't held twice"""
+        for row, face in self._loaded_faces():
+            face.encoding = self.encoding_index.encoding(row)
+
     @property
     def face_encodings(self):
-        return (face.encoding for face in self.faces)
+        """
+        A (N x 128) matrix of every recorded face's encoding, parallel to `faces`. Copied if faces were added to a
+        memory mapped gallery, so prefer `encoding_index.rows` for a part of a large gallery.
+        """
+        return self.encoding_index.encodings
 
-    def get_face_from_encoding(self, face_encoding):
+    def set_matcher(self, matcher: "matchers.Matcher"):
+        """Swaps the strategy used to search recorded faces, building it from the current encodings"""
+        matcher.build(self.encoding_index)
+        self.matcher = matcher
+
+    def get_nearest_face(self, face_encoding) -> (Union["Face", None], float):
         """
-        Loops through the list of recorded faces, comparing a given face encoding to each of them.
-        Returns the first face that matches it, or raises `NoMatchingFaceFoundException` if none do.
+        Finds the recorded face closest to a given face encoding using this object's matcher
 
         :param face_encoding: A face encoding to match against
+        :return: the nearest face and its distance, or `(None, inf)` if there are no recorded faces
+        """
+        with metrics.metrics.time('match'):
+            row, distance = self.matcher.nearest(face_encoding)
+        if row is None:
+            return None, distance
+
+        return self.faces[row], distance
+
+    def match_encodings(self, face_encodings, tolerance: float = constants.face_match_tolerance) -> list:
+        """
+        Matches a batch of face encodings against every recorded face at once
+
+        :param face_encodings: (K x 128) matrix of face encodings to match
+        :param tolerance: Maximum distance between faces to consider them a match
+        :return: the closest recorded face within `tolerance` for each encoding, or None where there's no match
+        """
+        with metrics.metrics.time('match'):
+            rows, distances = self.matcher.nearest_many(face_encodings)
+        matched_faces = [
+            self.faces[row] if row >= 0 and distance <= tolerance else None
+            for row, distance in zip(rows, distances)
+        ]
+
+        for face in matched_faces:
+            if face is not None:
+                self._matched(face)
+
+        return matched_faces
+
+    def enroll(
+            self,
+            face_encodings,
+            ids: Union[list, None] = None,
+            tolerance: float = constants.face_match_tolerance,
+            save_backup: bool = True
+        ) -> list:
+        """
+        Matches a batch of face encodings, recording a new face for each one that doesn't match. Matching and
+        recording happen together under the lock, so two threads seeing the same new visitor can't both enroll them.
+
+        :param face_encodings: (K x 128) matrix of face encodings to enroll
+        :param ids: optional ids for the new faces, parallel to `face_encodings`
+        :param tolerance: Maximum distance between faces to consider them a match
+        :param save_backup: Saves a backup to disk after adding each new face
+        :return: a (face, is_new) tuple for each encoding
+        """
+        encodings = np.asarray(face_encodings, dtype=np.float64).reshape(-1, constants.face_encoding_dimensions)
+        ids = ids or [None] * len(encodings)
+
+        with self.lock:
+            results = []
+            for _id, encoding, matched_face in zip(ids, encodings, self.match_encodings(encodings, tolerance)):
+                if matched_face is not None:
+                    results.append((matched_face, False))
+                    continue
+
+                face = Face(_id or str(uuid.uuid4()), encoding)
+                self.add_face(face, save_backup=save_backup)
+                results.append((face, True))
+
+        return results
+
+    def get_face_from_encoding(self, face_encoding, tolerance: float = constants.face_match_tolerance):
+        """
+        Compares a given face encoding to every recorded face.
+        Returns the closest face within `tolerance`, or raises `NoMatchingFaceFoundException` if none are.
+
+        :param face_encoding: A face encoding to match against
+        :param tolerance: Maximum distance between faces to consider them a match
         :return:
         """
-        # Loop through the results, returning the first matching result
-        results = face_recognition.compare_faces(list(self.face_encodings), face_encoding)
-        for result, face in zip(results, self.faces):
-            if result:
-                return face
+        face, distance = self.get_nearest_face(face_encoding)
+
+        if face is None or distance > tolerance:
+            # No match found
+            raise NoMatchingFaceFoundException
 
-        # No match found
-        raise NoMatchingFaceFoundException
+        self._matched(face)
+        return face
 
-    def add_face_from_image(self, filepath: str, _id: Union[str, None] = None, save_backup: bool = True) -> "Face":
+    def _matched(self, face: "Face"):
+        for callback in self.match_callbacks:
+            callback(face)
+
+    def add_face_from_image(
+            self,
+            filepath: str,
+            _id: Union[str, None] = None,
+            save_backup: bool = True,
+            detection_scale: float = constants.face_detection_scale
+        ) -> "Face":
         """
         Friendly helper that wraps the create_face_from_image to also add the face to this faces object
 
         :param filepath: filepath to the image of the face to add
         :param _id: optional id string of the face to add
         :param save_backup: save a backup to disk after adding the new face
+        :param detection_scale: factor to downscale the image by for face detection
         :return: The created Face
         """
-        created_face = create_face_from_image(filepath, _id, self, save_backup)
+        created_face = create_face_from_image(filepath, _id, self, save_backup, detection_scale)
         return created_face
 
+    def add_faces_from_images(
+            self,
+            filepaths: Iterable[str],
+            max_workers: Union[int, None] = None,
+            detection_scale: float = constants.face_detection_scale,
+            tolerance: float = constants.face_match_tolerance,
+            save_backup: bool = True
+        ) -> list:
+        """
+        Enrolls a batch of images in parallel. Images are decoded, detected, encoded and cropped across a process
+        pool, then deduplicated against the recorded faces and against each other, and every new face is recorded
+        in one storage write.
+
+        :param filepaths: filepaths of the images to enroll. The first face found in each is used
+        :param max_workers: number of worker processes. Defaults to the number of CPUs
+        :param detection_scale: factor to downscale images by for face detection
+        :param tolerance: Maximum distance between faces to consider them the same face
+        :param save_backup: save a backup to disk after adding the new faces
+        :return: the newly created Faces. Images without a face, or whose face was already known, are skipped
+        """
+        filepaths = list(filepaths)
+        ids = [str(uuid.uuid4()) for _ in filepaths]
+        max_workers = max_workers or os.cpu_count() or 1
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            encodings = list(executor.map(
+                enroll_image_file, filepaths, ids, [detection_scale] * len(filepaths),
+                chunksize=max(1, len(filepaths) // (4 * max_workers))))
+
+        found = [(_id, encoding) for _id, encoding in zip(ids, encodings) if encoding is not None]
+        if not found:
+            return []
+
+        found_ids = [_id for _id, _ in found]
+        found_encodings = np.stack([encoding for _, encoding in found])
+
+        # Keep faces that don't match a recorded face, nor an earlier face in this batch
+        _, distances = self.encoding_index.nearest_many(found_encodings)
+        keep = (distances > tolerance) & encoding_index.first_occurrences(found_encodings, tolerance)
+
+        new_faces = []
+        with self.lock:
+            for _id, encoding, kept in zip(found_ids, found_encodings, keep):
+                if not kept:
+                    remove_face_files(_id)
+                    continue
+
+                face = Face(_id, encoding)
+                self.add_face(face, save_backup=False)
+                new_faces.append(face)
+
+            if save_backup and new_faces:
+                # Appended like single enrollments, rather than rewriting the whole gallery
+                self._record(self.storage.faces_added,
+                             new_faces if self.work_queue is None else [face.copy() for face in new_faces])
+
+        return new_faces
+
     def add_face(self, face, save_backup: bool = True):
-        self.faces.append(face)
+        with self.lock:
+            self.faces.append(face)
+            reallocations = self.encoding_index.reallocations
+            row = self.encoding_index.add(face._id, face.encoding)
+            self.matcher.add(row)
+            self._train_matcher_if_due()
+
+            if self.encoding_index.reallocations != reallocations:
+                # The index reallocated its matrix, so move every face's view over to the new one
+                self._share_encodings()
+            else:
+                face.encoding = self.encoding_index.encoding(row)
+
+            # Saves a backup to disk on adding the new face
+            if save_backup:
+                # A queued write runs later, so give it the face as it is now
+                self._record(self.storage.face_added, face if self.work_queue is None else face.copy())
+
+    def remove_faces(self, faces_to_remove: Iterable["Face"], save_backup: bool = True):
+        """
+        Removes faces, rebuilding the encoding index and matcher without them. Storage has no record of a single
+        removal, so the whole object is saved afterwards.
+
+        :param faces_to_remove: faces to remove
+        :param save_backup: save a backup to disk after removing the faces
+        """
+        ids = {face._id for face in faces_to_remove}
 
-        # Saves a backup to disk on adding the new face
-        if save_backup:
-            self.save()
+        with self.lock:
+            self.faces = [face for face in self.faces if face._id not in ids]
+            self.encoding_index = self._build_encoding_index()
+            self.matcher.build(self.encoding_index)
+            self._share_encodings()
 
-    def snap_face(self, retries: int = 5) -> "Face":
+            if save_backup:
+                self.save()
+
+    def _train_matcher_if_due(self):
+        """Retrains the matcher if it's gone stale, in the background if there's a work queue"""
+        if not self.matcher.training_due:
+            return
+
+        if self.work_queue is None:
+            self.matcher.train()
+        elif not self._matcher_training_queued:
+            self._matcher_training_queued = True
+            self.work_queue.submit(work_queue.MATCHER, self._train_matcher, self.matcher)
+
+    def _train_matcher(self, matcher: "matchers.Matcher"):
+        with self.lock:
+            index, size = matcher.index, len(matcher.index)
+
+        try:
+            # Fit without the lock, so matching and enrollment carry on against the old training meanwhile
+            trained = matcher.fit(size)
+            with self.lock:
+                # Unless the matcher was rebuilt on a new index since, such as after removing faces
+                if matcher.index is index:
+                    matcher.install(trained)
+        finally:
+            with self.lock:
+                self._matcher_training_queued = False
+
+    def _record(self, hook, *args):
+        """Calls a storage hook now, or queues it behind earlier storage writes if there's a work queue"""
+        if self.work_queue is None:
+            self._record_timed(hook, *args)
+        else:
+            self.work_queue.submit(work_queue.STORAGE, self._record_locked, self._storage_generation, hook, *args)
+
+    def _record_locked(self, generation: int, hook, *args):
+        with self.lock:
+            # A full save since this write was queued already wrote its change, and replaying it on top would
+            # record the change twice
+            if generation == self._storage_generation:
+                self._record_timed(hook, *args)
+
+    def _record_timed(self, hook, *args):
+        with metrics.metrics.time('storage_' + hook.__name__):
+            hook(self, *args)
+
+    def wait_for(self, face: "Face"):
+        """Waits for any queued enrollment work for `face`, such as cropping it and generating its renditions"""
+        if self.work_queue is not None:
+            self.work_queue.wait(face._id)
+
+    def close(self):
+        """
+        Finishes any queued work, then stops the work queue and closes storage, flushing any buffered writes. If any
+        queued work failed, storage is still closed and the first failure is raised.
         """
-        Tries to find and snap a face from
+        try:
+            if self.work_queue is not None:
+                work_queue, self.work_queue = self.work_queue, None
+                work_queue.close()
+        finally:
+            self.storage.close()
+
+    def snap_face(
+            self,
+            retries: int = 5,
+            detection_scale: float = constants.face_detection_scale,
+            cam: Union["camera.Camera", "camera.FrameGrabber", None] = None,
+            frame_filter: Union["prefilter.PreFilter", None] = None,
+            tracker: Union["tracking.FaceTracker", None] = None
+        ) -> "Face":
+        """
+        Tries to find and snap a face from the camera. Frames are handed to the face pipeline in memory, and the
+        photo is only written to disk once a new face is accepted.
 
         :param retries: Number of times to retry taking photos to find a face before raising `FaceNotFoundException`
+        :param detection_scale: factor to downscale snapped photos by for face detection
+        :param cam: optional camera or frame grabber to reuse across calls. With a running `camera.FrameGrabber`
+            each retry is a buffer read of the freshest frame. A camera is opened just for this call if not given.
+        :param frame_filter: cheap gates that drop hopeless frames before detection. Frames it drops still count
+            as retries. Defaults to the shared `prefilter.prefilter`.
+        :param tracker: optional `tracking.FaceTracker` to reuse the match of a person who stayed in view instead of
+            encoding them again. With a tracker every face in the frame is handled, and the first one is returned.
         :raises FaceNotFoundException:
         :raises PreexistingFaceFoundException:
         :return:
         """
+        if cam is None:
+            with camera.Camera() as cam:
+                return self.snap_face(retries, detection_scale, cam, frame_filter, tracker)
+
+        if tracker is not None:
+            frame_face = self.snap_faces(retries, detection_scale, cam, frame_filter, tracker)[0]
+            if not frame_face.is_new:
+                raise PreExistingFaceFoundException(frame_face.face)
+            return frame_face.face
+
+        frame_filter = frame_filter or prefilter.prefilter
         face = None
 
-        for retry in range(retries):
-            _id, snapped_image_filepath = cam_capture()
+        for attempt, image in enumerate(cam.frames(retries)):
+            if attempt:
+                metrics.metrics.increment('snap_retries')
+
+            if not frame_filter.accepts(image):
+                # Frame is too dark, blurry or unchanged to bother the detector with
+                metrics.metrics.increment('frames_filtered')
+                continue
 
             try:
-                # Face found in snapped image. Continue and return the face
-                face = create_face_from_image(snapped_image_filepath, _id, self)
-                break
+                face = create_face_from_array(image, faces=self, detection_scale=detection_scale, save_image=True)
 
             except FaceNotFoundException:
-                # Face couldn't be found. Cleanup the snapped image and try again
-                os.remove(snapped_image_filepath)
+                # Face couldn't be found. Try again with the next frame
+                metrics.metrics.increment('faces_not_found')
+                frame_filter.record_detection(False)
                 continue
 
+            except PreExistingFaceFoundException:
+                frame_filter.record_detection(True)
+                raise
+
+            # Face found in snapped image. Continue and return the face
+            frame_filter.record_detection(True)
+            break
+
         if face is None:
             raise FaceNotFoundException
 
         return face
 
+    def snap_faces(
+            self,
+            retries: int = 5,
+            detection_scale: float = constants.face_detection_scale,
+            cam: Union["camera.Camera", "camera.FrameGrabber", None] = None,
+            frame_filter: Union["prefilter.PreFilter", None] = None,
+            tracker: Union["tracking.FaceTracker", None] = None
+        ) -> list:
+        """
+        Like `snap_face`, but finds every face in the first frame that has any, so a group is handled in one go.
+
+        :raises FaceNotFoundException:
+        :return: a `FrameFace` for each face found, telling new faces apart from recorded ones
+        """
+        if cam is None:
+            with camera.Camera() as cam:
+                return self.snap_faces(retries, detection_scale, cam, frame_filter, tracker)
+
+        frame_filter = frame_filter or prefilter.prefilter
+
+        for attempt, image in enumerate(cam.frames(retries)):
+            if attempt:
+                metrics.metrics.increment('snap_retries')
+
+            if not frame_filter.accepts(image):
+                metrics.metrics.increment('frames_filtered')
+                continue
+
+            try:
+                if tracker is not None:
+                    frame_faces = tracker.update(image, self, detection_scale=detection_scale, save_image=True)
+                else:
+                    frame_faces = create_faces_from_array(
+                        image, self, detection_scale=detection_scale, save_image=True)
+            except FaceNotFoundException:
+                metrics.metrics.increment('faces_not_found')
+                frame_filter.record_detection(False)
+                continue
+
+            frame_filter.record_detection(True)
+            return frame_faces
+
+        raise FaceNotFoundException
+
     def add_message(self, face: "Face", message: str, save_backup: bool = True):
         """Wrapper to also save when adding a message to a face"""
-        face.add_message(message)
+        with self.lock:
+            face.add_message(message)
 
-        if save_backup:
-            self.save()
+            if save_backup:
+                self._record(self.storage.message_added, face, message)
+
+    def consume_message(self, face: "Face", save_backup: bool = True) -> str:
+        """Wrapper to also save when consuming a message from a face"""
+        with self.lock:
+            message = face.consume_message()
+
+            if save_backup:
+                self._record(self.storage.message_consumed, face)
+
+        return message
 
     def save(self):
-        return self.storage.save(self)
+        """
+        Writes every face to storage. Storage writes still queued on the work queue are dropped, since the save
+        includes their changes.
+        """
+        with self.lock, metrics.metrics.time('save'):
+            self._storage_generation += 1
+            return self.storage.save(self)
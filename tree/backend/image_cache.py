@@ -0,0 +1,109 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Union
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.lazy_import as lazy_import
+
+Image = lazy_import.lazy_import('PIL.Image')
+
+FULL_IMAGE = "full"
+CROPPED_IMAGE = "cropped"
+
+
+def image_size(image: "Image.Image") -> int:
+    """Returns the number of bytes a decoded image occupies"""
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+class ImageCache(object):
+    """
+    Size-bounded LRU cache of decoded images, keyed by (face id, variant).
+
+    Images are evicted least recently used first once the decoded bytes held would exceed `max_bytes`. Images
+    handed out are shared between callers, so treat them as read-only. The cache lives outside of `Face`, so
+    cached images are never pickled into storage.
+    """
+
+    def __init__(self, max_bytes: int = constants.image_cache_max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._images
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "images": len(self._images),
+            "bytes": self.current_bytes,
+        }
+
+    def get(self, key: Hashable, load: Callable[[], "Image.Image"]) -> "Image.Image":
+        """
+        Returns the cached image for `key`, calling `load` to decode it on a miss
+
+        :param key: a (face id, variant) tuple
+        :param load: called with no arguments to load the image if it isn't cached
+        """
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        image = load()
+        image.load()  # `Image.open` is lazy. Decode now so what's cached is the pixels, not an open file
+        self.put(key, image)
+        return image
+
+    def put(self, key: Hashable, image: "Image.Image"):
+        size = image_size(image)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove(key)
+            self._images[key] = image
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self.current_bytes -= image_size(evicted)
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        image = self._images.pop(key, None)
+        if image is not None:
+            self.current_bytes -= image_size(image)
+
+    def invalidate(self, _id: str, variant: Union[str, None] = None):
+        """Drops the cached `variant` of a face's image, or every variant if `variant` is None"""
+        with self._lock:
+            for key in [key for key in self._images if key[0] == _id and (variant is None or key[1] == variant)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.current_bytes = 0
+
+
+image_cache = ImageCache()
@@ -0,0 +1,154 @@
+import asyncio
+import functools
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Awaitable, Callable, Union
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+
+if TYPE_CHECKING:
+    import tree.backend.message_store as message_store
+    import tree.backend.tracking as tracking
+
+# A visitor to greet: their new or recorded `faces.Face`, and whether they were just enrolled
+Visitor = namedtuple('Visitor', ['face', 'is_new'])
+
+
+class AsyncKiosk(object):
+    """
+    Runs the installation loop on asyncio, overlapping recognition with the interaction of the visitor before.
+
+    Blocking calls run in executors: detection, encoding and matching on a recognition thread, and prompts and
+    audio on an I/O thread, so the event loop stays responsive. As soon as a visitor is recognized, detection of
+    the next one starts while `interaction` greets the current one. The visitor being greeted stays in view, so
+    they're skipped by detection until `revisit_seconds` after their interaction finishes. When several visitors
+    are found in one frame, the rest wait their turn behind the first.
+
+    `interaction` is a coroutine function called with this kiosk and each `Visitor` in turn, and awaits the kiosk's
+    `input`, `play`, `record` and `wait_for` rather than calling them directly.
+    """
+
+    def __init__(
+            self,
+            f: "faces.Faces",
+            cam,
+            interaction: Callable[["AsyncKiosk", Visitor], Awaitable],
+            vm=None,
+            message_store: Union["message_store.MessageStore", None] = None,
+            detection_scale: float = constants.face_detection_scale,
+            tracker: Union["tracking.FaceTracker", None] = None,
+            revisit_seconds: float = constants.kiosk_revisit_seconds,
+            retry_seconds: float = constants.kiosk_retry_seconds,
+            clock: Callable[[], float] = time.monotonic
+        ):
+        """
+        :param f: Faces object to recognize visitors against
+        :param cam: open camera or running `camera.FrameGrabber` to snap visitors with
+        :param interaction: coroutine function greeting a visitor
+        :param vm: optional `voicemsg.VoiceMsg` used by `record`, and by `play` if there's no `message_store`
+        :param message_store: optional `message_store.MessageStore` to play prefetched messages from
+        """
+        self.faces = f
+        self.cam = cam
+        self.interaction = interaction
+        self.vm = vm
+        self.message_store = message_store
+        self.detection_scale = detection_scale
+        self.tracker = tracker
+        self.revisit_seconds = revisit_seconds
+        self.retry_seconds = retry_seconds
+        self.clock = clock
+
+        # The face detector and the audio device are each used by one thread at a time
+        self.recognition_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Recognition")
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="KioskIO")
+
+        self._greeted = {}  # Id of each visitor greeted recently, to when they can be greeted again
+        self._waiting = deque()  # Visitors found alongside an earlier one, still to be greeted
+
+    async def _run_in(self, executor, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(function, *args))
+
+    async def input(self, prompt: str = " > ") -> str:
+        return await self._run_in(self.io_executor, input, prompt)
+
+    async def play(self, filename: str):
+        play = self.message_store.play if self.message_store is not None else self.vm.play
+        return await self._run_in(self.io_executor, play, filename)
+
+    async def record(self, filename: str):
+        return await self._run_in(self.io_executor, self.vm.record, filename)
+
+    async def wait_for(self, face: "faces.Face"):
+        """Waits for a new face's queued enrollment work, such as generating its ASCII art"""
+        return await self._run_in(None, self.faces.wait_for, face)
+
+    def _is_greeted(self, face: "faces.Face") -> bool:
+        return self.clock() < self._greeted.get(face._id, float('-inf'))
+
+    def _set_greeted(self, _id: str, until: float):
+        # Swapped in as a new dict, dropping expired visitors, since detection reads it from the recognition thread
+        now = self.clock()
+        greeted = {greeted_id: expiry for greeted_id, expiry in self._greeted.items() if now < expiry}
+        greeted[_id] = until
+        self._greeted = greeted
+
+    def detect(self) -> list:
+        """
+        Snaps the camera once for faces, blocking until it's done
+
+        :return: a `Visitor` for every face found that hasn't just been greeted, in frame order. Empty if there's
+            nobody new
+        """
+        try:
+            frame_faces = self.faces.snap_faces(
+                detection_scale=self.detection_scale, cam=self.cam, tracker=self.tracker)
+        except faces.FaceNotFoundException:
+            return []
+
+        return [
+            Visitor(frame_face.face, frame_face.is_new) for frame_face in frame_faces
+            if frame_face.is_new or not self._is_greeted(frame_face.face)]
+
+    async def next_visitor(self) -> Visitor:
+        """Returns the next visitor waiting their turn, or detects on the recognition thread until one is found"""
+        while not self._waiting:
+            self._waiting.extend(await self._run_in(self.recognition_executor, self.detect))
+            if not self._waiting:
+                await asyncio.sleep(self.retry_seconds)
+
+        return self._waiting.popleft()
+
+    async def run(self, visitors: Union[int, None] = None):
+        """
+        Greets visitors one after another
+
+        :param visitors: number of visitors to greet before returning, or None to run forever
+        """
+        pending = asyncio.ensure_future(self.next_visitor())
+        greeted = 0
+
+        try:
+            while visitors is None or greeted < visitors:
+                visitor = await pending
+                self._set_greeted(visitor.face._id, float('inf'))
+
+                # Look for whoever comes next while this visitor is greeted
+                pending = asyncio.ensure_future(self.next_visitor())
+                try:
+                    await self.interaction(self, visitor)
+                finally:
+                    self._set_greeted(visitor.face._id, self.clock() + self.revisit_seconds)
+                greeted += 1
+        finally:
+            pending.cancel()
+
+    def close(self):
+        """Waits for any running recognition or I/O call, then stops the executors"""
+        self.recognition_executor.shutdown()
+        self.io_executor.shutdown()
@@ -0,0 +1,53 @@
+import importlib
+import sys
+import threading
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that's only imported the first time one of its attributes is used.
+
+    Once imported, the module's attributes are copied onto the stand-in, so later lookups cost the same as on the
+    module itself.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lock'] = threading.Lock()
+        self.__dict__['_module'] = None
+
+    def _load(self) -> types.ModuleType:
+        with self.__dict__['_lock']:
+            module = self.__dict__['_module']
+            if module is None:
+                module = importlib.import_module(self.__name__)
+                self.__dict__.update(module.__dict__)
+                self.__dict__['_module'] = module
+            return module
+
+    def __getattr__(self, attribute: str):
+        # Only called for attributes not found on the stand-in, so never again once the module is loaded
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        return "<lazy module '{}'{}>".format(self.__name__, " (loaded)" if self.__dict__['_module'] else "")
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Returns a stand-in for the module `name` that imports it on first use. Modules that were already imported
+    are returned as they are.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def is_loaded(module) -> bool:
+    """Whether a module returned by `lazy_import` has been imported yet"""
+    return not isinstance(module, LazyModule) or module.__dict__['_module'] is not None
@@ -0,0 +1,139 @@
+import argparse
+import os
+import sys
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.encoding_index as encoding_index
+import tree.backend.faces as faces
+from tree.backend.storage.pickle_storage import pickle_storage
+
+
+def find_duplicate_groups(
+        encodings: np.ndarray,
+        tolerance: float = constants.face_match_tolerance,
+        chunk_size: Union[int, None] = None
+    ) -> list:
+    """
+    Groups encodings with the oldest encoding they match. Going from oldest to newest, each encoding not yet grouped
+    claims every newer ungrouped encoding within `tolerance` of it. Every grouped encoding matches its group's
+    oldest directly, so chains of matches never join faces further apart than `tolerance`.
+
+    :param encodings: (N x 128) matrix of encodings
+    :param tolerance: Maximum distance between encodings to consider them the same face
+    :param chunk_size: number of encodings compared at a time, bounding memory to (chunk_size x N). Defaults to
+        as many as fit in `constants.pairwise_distances_max_bytes`
+    :return: an array of rows for each group of two or more matching encodings, each sorted from oldest to newest
+    """
+    chunk_size = chunk_size or encoding_index.chunk_rows(len(encodings))
+    grouped = np.zeros(len(encodings), dtype=bool)
+    groups = []
+
+    for start in range(0, len(encodings), chunk_size):
+        distances = encoding_index.pairwise_distances(encodings[start:start + chunk_size], encodings)
+        for row, row_distances in enumerate(distances, start):
+            if grouped[row]:
+                continue
+
+            # Older encodings are all grouped by now, so this only claims newer ones, along with the row itself
+            group = np.flatnonzero((row_distances <= tolerance) & ~grouped)
+            grouped[group] = True
+            grouped[row] = True
+            if len(group) > 1:
+                groups.append(group)
+
+    return groups
+
+
+def merge_duplicates(
+        f: "faces.Faces",
+        tolerance: float = constants.face_match_tolerance,
+        dry_run: bool = False
+    ) -> list:
+    """
+    Merges faces that match the oldest of them into it, which inherits the others' messages
+
+    :return: the faces that were merged away
+    """
+    groups = find_duplicate_groups(f.face_encodings, tolerance)
+    merged_faces = []
+
+    for group in groups:
+        keeper = f.faces[group[0]]
+        for row in group[1:]:
+            duplicate = f.faces[row]
+            if not dry_run:
+                for message in duplicate.messages:
+                    keeper.add_message(message)
+            merged_faces.append(duplicate)
+
+    if merged_faces and not dry_run:
+        f.remove_faces(merged_faces, save_backup=False)
+
+    return merged_faces
+
+
+def id_from_filename(filename: str) -> str:
+    """Returns the face id a saved image or rendition belongs to"""
+    stem = os.path.splitext(filename)[0]
+    if stem.endswith(constants.thumbnail_suffix):
+        stem = stem[:-len(constants.thumbnail_suffix)]
+    return stem
+
+
+def collect_garbage(f: "faces.Faces", dry_run: bool = False) -> list:
+    """
+    Deletes images and renditions that no recorded face refers to, such as those left behind by crashes
+
+    :return: the filepaths of the deleted files
+    """
+    referenced_ids = set(f.encoding_index.ids)
+    folders = [
+        (constants.fresh_photos_filepath, (constants.fresh_photos_extension,)),
+        (constants.cropped_faces_filepath, (constants.cropped_face_extension,)),
+        (constants.renditions_filepath, (constants.ascii_art_extension, constants.thumbnail_extension)),
+    ]
+
+    removed = []
+    for folder, extensions in folders:
+        for filename in sorted(os.listdir(folder)):
+            filepath = os.path.join(folder, filename)
+            if not os.path.isfile(filepath) or not filename.endswith(extensions):
+                continue
+
+            if id_from_filename(filename) not in referenced_ids:
+                if not dry_run:
+                    os.remove(filepath)
+                removed.append(filepath)
+
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge duplicate faces, delete unreferenced images, and rewrite storage compactly")
+    parser.add_argument('--tolerance', type=float, default=constants.face_match_tolerance)
+    parser.add_argument('--dry-run', action='store_true', help="report what would change without changing it")
+    args = parser.parse_args()
+
+    # Load the record of seen faces and messages
+    f = pickle_storage.load()
+    face_count = len(f.faces)
+
+    merged_faces = merge_duplicates(f, args.tolerance, args.dry_run)
+    print("Merged {} duplicate faces into {} remaining faces".format(len(merged_faces), face_count - len(merged_faces)))
+
+    removed = collect_garbage(f, args.dry_run)
+    print("Deleted {} unreferenced images".format(len(removed)))
+
+    if not args.dry_run:
+        f.save()
+        print("Rewrote storage")
+
+
+if __name__ == '__main__':
+    main()
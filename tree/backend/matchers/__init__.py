@@ -0,0 +1,73 @@
+import abc
+import sys
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.encoding_index as encoding_index
+
+
+class Matcher(abc.ABC):
+    """
+    Finds the nearest encoding to a query within an `EncodingIndex`.
+
+    Matchers don't own any encodings themselves. They're attached to the index owned by a `Faces` object with
+    `build`, told about every appended row with `add`, and answer `nearest` queries in terms of index rows.
+
+    Matchers with a trained structure that goes stale as rows are added report it with `training_due`. Training is
+    split into `fit`, which only reads the index and can run while rows are still being added, and `install`, so
+    the owner can fit in the background and only hold its lock to install the result.
+    """
+
+    def __init__(self):
+        self.index = None
+
+    def build(self, index: "encoding_index.EncodingIndex"):
+        """Attaches the matcher to an index, (re)building any internal structures from its current rows"""
+        self.index = index
+
+    def unbuilt_copy(self) -> "Matcher":
+        """Returns a matcher with the same settings that isn't attached to any index yet"""
+        return type(self)()
+
+    @abc.abstractmethod
+    def add(self, row: int):
+        """Incrementally includes a row that was just appended to the attached index"""
+        pass
+
+    @property
+    def training_due(self) -> bool:
+        """Whether the matcher should be retrained, such as once the index has grown enough to unbalance it"""
+        return False
+
+    def fit(self, size: int):
+        """Trains on the first `size` rows of the index without changing the matcher, returning what to `install`"""
+        return None
+
+    def install(self, trained):
+        """Switches the matcher over to the result of `fit`, including any rows added since"""
+        pass
+
+    def train(self):
+        """Retrains on every row of the index"""
+        self.install(self.fit(len(self.index)))
+
+    @abc.abstractmethod
+    def nearest(self, face_encoding) -> (Union[int, None], float):
+        """Returns the row of the nearest encoding and its exact distance, or `(None, inf)` if there is none"""
+        pass
+
+    def nearest_many(self, face_encodings) -> (np.ndarray, np.ndarray):
+        """
+        Matches a batch of encodings at once
+
+        :return: the row of the nearest encoding to each, or -1 if there is none, and its exact distance
+        """
+        rows, distances = np.full(len(face_encodings), -1, dtype=np.intp), np.full(len(face_encodings), np.inf)
+        for i, face_encoding in enumerate(face_encodings):
+            row, distance = self.nearest(face_encoding)
+            if row is not None:
+                rows[i], distances[i] = row, distance
+        return rows, distances
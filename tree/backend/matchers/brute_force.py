@@ -0,0 +1,22 @@
+import sys
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.matchers as matchers
+
+
+class BruteForceMatcher(matchers.Matcher):
+    """Exact matcher that scans every encoding in the index"""
+
+    def add(self, row: int):
+        # The index itself is the search structure, so there's nothing to update
+        pass
+
+    def nearest(self, face_encoding) -> (Union[int, None], float):
+        return self.index.nearest(face_encoding)
+
+    def nearest_many(self, face_encodings) -> (np.ndarray, np.ndarray):
+        return self.index.nearest_many(face_encodings)
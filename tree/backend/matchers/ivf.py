@@ -0,0 +1,169 @@
+import math
+import sys
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.encoding_index as encoding_index
+import tree.backend.matchers as matchers
+
+
+def nearest_centroids(data: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+    """Returns the index of the nearest centroid for each row of `data`, working in chunks to bound memory"""
+    centroid_squared_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty(len(data), dtype=np.intp)
+
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        # ||x||^2 is constant per row, so it doesn't affect which centroid is nearest
+        squared_distances = centroid_squared_norms - 2 * (chunk @ centroids.T)
+        assignments[start:start + chunk_size] = np.argmin(squared_distances, axis=1)
+
+    return assignments
+
+
+def kmeans(data: np.ndarray, k: int, iterations: int, random: np.random.Generator) -> np.ndarray:
+    """
+    Lloyd's k-means over the rows of `data`
+
+    :return: a (k x dimensions) matrix of centroids
+    """
+    centroids = data[random.choice(len(data), k, replace=False)].astype(np.float64)
+
+    for _ in range(iterations):
+        assignments = nearest_centroids(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=k)
+
+        # Empty clusters keep their previous centroid
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+
+    return centroids
+
+
+class IVFMatcher(matchers.Matcher):
+    """
+    Approximate matcher using an inverted file index over k-means buckets.
+
+    Encodings are partitioned into roughly sqrt(N) buckets around k-means centroids. A query only scans the
+    buckets of its `probes` nearest centroids, and the candidates found are re-ranked by their exact distance, so
+    a returned match is always exact even though a true nearest neighbour in an unprobed bucket can be missed.
+    Raising `probes` trades latency for recall. If every probed bucket is empty, the whole index is scanned instead.
+
+    Rows added after training are assigned to their nearest bucket, and once the index has grown by
+    `retrain_growth_factor` the buckets are reported as `training_due`, for the owner to retrain.
+    """
+
+    def __init__(
+            self,
+            probes: int = constants.ivf_probes,
+            lists: Union[int, None] = None,
+            min_train_size: int = constants.ivf_min_train_size,
+            retrain_growth_factor: float = constants.ivf_retrain_growth_factor,
+            seed: int = 0
+        ):
+        super().__init__()
+        self.probes = probes
+        self.lists = lists
+        self.min_train_size = min_train_size
+        self.retrain_growth_factor = retrain_growth_factor
+        self.seed = seed
+        self.random = np.random.default_rng(seed)
+
+        self.centroids = None
+        self._buckets = []
+        self._bucket_sizes = None
+        self._trained_size = 0
+
+    def unbuilt_copy(self) -> "IVFMatcher":
+        return IVFMatcher(self.probes, self.lists, self.min_train_size, self.retrain_growth_factor, self.seed)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, index: "encoding_index.EncodingIndex"):
+        super().build(index)
+        self.centroids = None
+
+        if len(index) >= self.min_train_size:
+            self.train()
+
+    @property
+    def training_due(self) -> bool:
+        if not self.trained:
+            return len(self.index) >= self.min_train_size
+
+        # Buckets drift out of balance as the gallery grows, so periodically re-cluster
+        return len(self.index) >= self._trained_size * self.retrain_growth_factor
+
+    def fit(self, size: int) -> (np.ndarray, np.ndarray):
+        """Clusters the first `size` rows of the index, returning the centroids and the bucket of each row"""
+        encodings = self.index.rows(0, size)
+        lists = self.lists or max(1, int(math.sqrt(len(encodings))))
+
+        sample = encodings
+        if len(encodings) > constants.ivf_kmeans_max_sample_size:
+            sample = encodings[self.random.choice(
+                len(encodings), constants.ivf_kmeans_max_sample_size, replace=False)]
+
+        centroids = kmeans(sample, lists, constants.ivf_kmeans_iterations, self.random)
+        return centroids, nearest_centroids(encodings, centroids)
+
+    def install(self, trained: (np.ndarray, np.ndarray)):
+        centroids, assignments = trained
+        self.centroids = centroids
+
+        # Sort rows by bucket so each bucket is one contiguous slice
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=len(centroids))
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        self._buckets = [order[bounds[i]:bounds[i + 1]].copy() for i in range(len(centroids))]
+        self._bucket_sizes = counts
+        self._trained_size = len(assignments)
+
+        for row in range(self._trained_size, len(self.index)):
+            self.add(row)
+
+    def add(self, row: int):
+        if not self.trained:
+            # Searched exhaustively until trained
+            return
+
+        bucket = int(nearest_centroids(self.index.rows(row, row + 1), self.centroids)[0])
+        size = self._bucket_sizes[bucket]
+        if size == len(self._buckets[bucket]):
+            grown = np.empty(max(2 * size, 1), dtype=np.intp)
+            grown[:size] = self._buckets[bucket][:size]
+            self._buckets[bucket] = grown
+
+        self._buckets[bucket][size] = row
+        self._bucket_sizes[bucket] += 1
+
+    def candidates(self, face_encoding) -> np.ndarray:
+        """Returns the rows stored in the `probes` buckets nearest to `face_encoding`"""
+        query = np.asarray(face_encoding, dtype=np.float64)
+        centroid_distances = np.einsum('ij,ij->i', self.centroids - query, self.centroids - query)
+
+        probes = min(self.probes, len(self.centroids))
+        probed = np.argpartition(centroid_distances, probes - 1)[:probes]
+        return np.concatenate([self._buckets[bucket][:self._bucket_sizes[bucket]] for bucket in probed])
+
+    def nearest(self, face_encoding) -> (Union[int, None], float):
+        if not self.trained:
+            return self.index.nearest(face_encoding)
+
+        candidates = self.candidates(face_encoding)
+        if not len(candidates):
+            # The probed buckets are empty, which doesn't mean there's no match elsewhere
+            return self.index.nearest(face_encoding)
+
+        # Exact re-rank of the candidates against their full encodings
+        distances = self.index.row_distances(candidates, face_encoding)
+        best = int(np.argmin(distances))
+        return int(candidates[best]), float(distances[best])
@@ -0,0 +1,201 @@
+import sys
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.encoding_index as encoding_index
+import tree.backend.matchers as matchers
+import tree.backend.quantization as quantization
+
+# Allowance for float64 rounding in the approximate squared distances, far below any difference between faces
+DISTANCE_SLACK = 1e-9
+
+
+class QuantizedMatcher(matchers.Matcher):
+    """
+    Exact matcher that scans a compact, quantized copy of the index's encodings.
+
+    A query's approximate distance to every row is computed from the codes, at 1 byte per dimension instead of 8.
+    No decoded encoding is further than `max_error` from its true encoding, so by the triangle inequality only
+    rows whose approximate distance is within `2 * max_error` of the smallest can be the nearest. Those few
+    candidates are re-ranked by their exact distance against the full precision rows of the index, so the returned
+    match and distance are the same as a brute force scan's.
+
+    The full precision rows are only read for candidates, so when the index wraps a `np.memmap`, as loaded by
+    `MemmapStorage` with quantization on, they're paged in from disk on demand and only the codes stay in memory.
+    That's the only case where this saves memory: over an index held in memory, the codes are kept on top of the
+    full precision matrix, and a scan is only slightly faster than a brute force one. So it's meant to be used
+    through `MemmapStorage`'s `quantization_kind` rather than set on an in-memory gallery.
+    """
+
+    def __init__(
+            self,
+            kind: str = constants.quantization_kind,
+            chunk_size: int = constants.quantization_chunk_size,
+            refit_error_factor: float = constants.quantization_refit_error_factor
+        ):
+        super().__init__()
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.refit_error_factor = refit_error_factor
+
+        self.quantizer = None
+        self.max_error = 0.0  # Largest distance between any row and its decoded code
+        self.fit_error = 0.0  # `max_error` when the quantizer was last fit
+        self._fitted_size = 0
+        self._codes = np.empty((0, constants.face_encoding_dimensions), dtype=np.int8)
+        self._norms = np.empty(0)  # Squared norm of each row's decoded code, parallel to `_codes`
+        self._max_abs_code = 0.0
+        self._size = 0
+        self._adopt_codes = False
+
+    @classmethod
+    def from_codes(
+            cls,
+            quantizer: "quantization.Quantizer",
+            codes: np.ndarray,
+            max_error: float,
+            **kwargs
+        ) -> "QuantizedMatcher":
+        """
+        Creates a matcher from previously saved codes of the first `len(codes)` rows of the index it's built with,
+        so they don't need to be recomputed from the full precision encodings
+        """
+        matcher = cls(quantizer.kind, **kwargs)
+        matcher.quantizer = quantizer
+        matcher.max_error = matcher.fit_error = max_error
+        matcher._codes = codes
+        matcher._norms = np.empty(len(codes))
+        matcher._size = matcher._fitted_size = len(codes)
+        for start in range(0, len(codes), matcher.chunk_size):
+            matcher._track(start, codes[start:start + matcher.chunk_size])
+        matcher._adopt_codes = True
+        return matcher
+
+    def unbuilt_copy(self) -> "QuantizedMatcher":
+        return QuantizedMatcher(self.kind, self.chunk_size, self.refit_error_factor)
+
+    @property
+    def codes(self) -> np.ndarray:
+        """A view of the codes of every row, parallel to the index's encodings"""
+        return self._codes[:self._size]
+
+    def build(self, index: "encoding_index.EncodingIndex"):
+        super().build(index)
+
+        if self._adopt_codes and self._size <= len(index):
+            # Codes saved for the start of the index are kept, and any rows saved after them are quantized now
+            self._adopt_codes = False
+            for row in range(self._size, len(index)):
+                self.add(row)
+            return
+
+        self._adopt_codes = False
+        self._fit()
+
+    def _fit(self):
+        size = len(self.index)
+        if size:
+            # The range is found a chunk at a time too, so a memory mapped index is never copied whole
+            low, high = np.full(self.index.dimensions, np.inf), np.full(self.index.dimensions, -np.inf)
+            for start in range(0, size, self.chunk_size):
+                chunk = self.index.rows(start, start + self.chunk_size)
+                low, high = np.minimum(low, chunk.min(axis=0)), np.maximum(high, chunk.max(axis=0))
+            self.quantizer = quantization.Quantizer.from_range(low, high, self.kind)
+        else:
+            self.quantizer = quantization.Quantizer.fit(self.index.encodings, self.kind)
+        self._codes = np.empty((max(size, 1), self.index.dimensions), dtype=self.quantizer.dtype)
+        self._norms = np.empty(len(self._codes))
+        self._max_abs_code = 0.0
+        self.max_error = 0.0
+
+        # Quantized in chunks, so a memory mapped index is read through once without a full precision copy
+        for start in range(0, size, self.chunk_size):
+            chunk = self.index.rows(start, start + self.chunk_size)
+            codes = self._codes[start:start + self.chunk_size] = self.quantizer.encode(chunk)
+            if len(chunk):
+                self.max_error = max(self.max_error, float(self.quantizer.errors(chunk, codes).max()))
+                self._track(start, codes)
+
+        self._size = self._fitted_size = size
+        self.fit_error = self.max_error
+
+    def add(self, row: int):
+        encoding = self.index.rows(row, row + 1)
+        code = self.quantizer.encode(encoding)
+        error = float(self.quantizer.errors(encoding, code)[0])
+
+        if (max(error, self.max_error) > self.refit_error_factor * self.fit_error
+                and row + 1 >= 2 * self._fitted_size):
+            # Encodings have been added well outside the range the quantizer was fit to. The looser bound makes
+            # every query re-rank more candidates, so refit to the whole index instead. Refits are at least a
+            # doubling of the index apart, so their cost stays amortized O(1) per row
+            self._fit()
+            return
+
+        if self._size == len(self._codes):
+            codes = np.empty((max(2 * len(self._codes), 1), self._codes.shape[1]), dtype=self._codes.dtype)
+            codes[:self._size] = self._codes[:self._size]
+            self._codes = codes
+            self._norms = np.resize(self._norms, len(codes))
+
+        self._codes[self._size] = code[0]
+        self._track(self._size, code)
+        self._size += 1
+        self.max_error = max(self.max_error, error)
+
+    def _track(self, start: int, codes: np.ndarray):
+        """Records the decoded norms and largest magnitude of codes written at row `start`"""
+        decoded = self.quantizer.decode(codes)
+        self._norms[start:start + len(codes)] = np.einsum('ij,ij->i', decoded, decoded)
+        self._max_abs_code = max(self._max_abs_code, float(np.abs(codes.astype(np.float64)).max()))
+
+    def approximate_squared_distances(self, face_encoding) -> (np.ndarray, float):
+        """
+        Returns the squared distance from `face_encoding` to the decoded code of every row, along with a bound on
+        the rounding error in each of them.
+
+        With decoded rows `code * scale + shift`, the squared distance to a query `q` expands to
+        `|row|^2 - 2 * (code . (scale * q) + shift . q) + q . q`. The row norms are kept up to date as rows are
+        added, so a query only needs a single float32 product with the codes, cast a chunk at a time.
+        """
+        query = np.asarray(face_encoding, dtype=np.float64)
+        scale, shift = self.quantizer.affine(len(query))
+        weights = scale * query
+        weights32 = weights.astype(np.float32)
+        products = np.empty(self._size, dtype=np.float32)
+        buffer = np.empty((min(self.chunk_size, self._size), len(query)), dtype=np.float32)
+
+        for start in range(0, self._size, self.chunk_size):
+            chunk = buffer[:min(self.chunk_size, self._size - start)]
+            chunk[:] = self._codes[start:start + len(chunk)]
+            np.dot(chunk, weights32, out=products[start:start + len(chunk)])
+
+        squared_distances = self._norms[:self._size] - 2 * (products + shift @ query) + query @ query
+
+        # A float32 dot product of n terms is off by at most about n * eps times the sum of the terms' magnitudes,
+        # plus the rounding of the weights to float32. The rest is computed in float64, so far more precisely
+        error = 2 * (len(query) + 2) * np.finfo(np.float32).eps * self._max_abs_code * np.abs(weights).sum()
+        return squared_distances, float(error) + DISTANCE_SLACK
+
+    def candidates(self, face_encoding) -> np.ndarray:
+        """Returns the rows that could be nearest to `face_encoding`, which always include the nearest"""
+        squared_distances, error = self.approximate_squared_distances(face_encoding)
+
+        # The nearest row's approximate distance is at most the smallest one plus `2 * max_error`, so compare the
+        # most each row's distance could be understated against the most the smallest could be overstated
+        lower = np.sqrt(np.maximum(squared_distances - error, 0))
+        upper = np.sqrt(squared_distances.min() + error)
+        return np.flatnonzero(lower <= upper + 2 * self.max_error)
+
+    def nearest(self, face_encoding) -> (Union[int, None], float):
+        if not self._size:
+            return None, float('inf')
+
+        rows = self.candidates(face_encoding)
+        distances = self.index.row_distances(rows, face_encoding)
+        best = int(np.argmin(distances))
+        return int(rows[best]), float(distances[best])
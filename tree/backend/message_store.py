@@ -0,0 +1,176 @@
+import io
+import lzma
+import os
+import sys
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.lazy_import as lazy_import
+
+pyaudio = lazy_import.lazy_import('pyaudio')
+
+
+class MessageStore(object):
+    """
+    Store of recorded voice messages that compresses them on disk and decodes them ahead of playback.
+
+    Messages keep the `.wav` filename they were recorded under, which is what `Face.messages` holds. `compress`
+    replaces the recording with an `lzma` compressed copy on a background thread. `lzma` isn't an audio codec, so it
+    mostly shrinks the silence around speech rather than the speech itself, and a recording it doesn't shrink at
+    all is left uncompressed, so playing it doesn't pay for decoding. `prefetch` decodes messages on a
+    background thread into a buffer of at most `prefetch_max_bytes`, dropping the least recently used first, so
+    `play` can start straight from memory. Hooked up with `watch`, a face's messages are prefetched as soon as the
+    face is matched.
+    """
+
+    def __init__(
+            self,
+            filepath: str = constants.audio_recordings_filepath,
+            prefetch_max_bytes: int = constants.message_prefetch_max_bytes,
+            preset: int = constants.message_compression_preset,
+            max_workers: int = constants.message_store_workers
+        ):
+        self.filepath = filepath
+        self.prefetch_max_bytes = prefetch_max_bytes
+        self.preset = preset
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._buffer = OrderedDict()  # Filename to decoded bytes, least recently used first
+        self._pending = {}  # Filename to the future of a prefetch in progress
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MessageStore")
+
+    def recording_filepath(self, filename: str) -> str:
+        return os.path.join(self.filepath, filename)
+
+    def compressed_filepath(self, filename: str) -> str:
+        return self.recording_filepath(filename) + constants.compressed_message_extension
+
+    def compress(self, filename: str) -> Future:
+        """Replaces a freshly recorded message with a compressed copy if that's any smaller, in the background"""
+        return self._executor.submit(self._compress, filename)
+
+    def _compress(self, filename: str):
+        recording_filepath = self.recording_filepath(filename)
+        with open(recording_filepath, 'rb') as recording_file:
+            data = recording_file.read()
+
+        compressed = lzma.compress(data, preset=self.preset)
+        if len(compressed) >= len(data):
+            return
+
+        compressed_filepath = self.compressed_filepath(filename)
+        temporary_filepath = compressed_filepath + ".tmp"
+        with open(temporary_filepath, 'wb') as compressed_file:
+            compressed_file.write(compressed)
+            compressed_file.flush()
+            os.fsync(compressed_file.fileno())
+        os.replace(temporary_filepath, compressed_filepath)
+        os.remove(recording_filepath)
+
+    def _decode(self, filename: str) -> bytes:
+        # Read the recording if it hasn't been compressed yet. Once the compressed copy is in place the recording
+        # is removed, so one of the two always exists
+        try:
+            with open(self.recording_filepath(filename), 'rb') as recording_file:
+                return recording_file.read()
+        except FileNotFoundError:
+            with open(self.compressed_filepath(filename), 'rb') as compressed_file:
+                return lzma.decompress(compressed_file.read())
+
+    def prefetch(self, filenames: Iterable[str]):
+        """Starts decoding messages into the buffer in the background, if they aren't there already"""
+        for filename in filenames:
+            with self._lock:
+                if filename in self._buffer or filename in self._pending:
+                    continue
+                self._pending[filename] = self._executor.submit(self._prefetch, filename)
+
+    def prefetch_face(self, face):
+        """Prefetches every message of a face. Pass to `faces.Faces.match_callbacks` to prefetch on every match"""
+        self.prefetch(list(face.messages))
+
+    def watch(self, f):
+        """Prefetches the messages of each face `f` matches from now on"""
+        f.match_callbacks.append(self.prefetch_face)
+
+    def _prefetch(self, filename: str) -> bytes:
+        try:
+            data = self._decode(filename)
+            self._put(filename, data)
+            return data
+        finally:
+            with self._lock:
+                self._pending.pop(filename, None)
+
+    def _put(self, filename: str, data: bytes):
+        if len(data) > self.prefetch_max_bytes:
+            return
+
+        with self._lock:
+            self._remove(filename)
+            self._buffer[filename] = data
+            self.current_bytes += len(data)
+
+            while self.current_bytes > self.prefetch_max_bytes:
+                _, evicted = self._buffer.popitem(last=False)
+                self.current_bytes -= len(evicted)
+                self.evictions += 1
+
+    def _remove(self, filename: str):
+        data = self._buffer.pop(filename, None)
+        if data is not None:
+            self.current_bytes -= len(data)
+
+    def load(self, filename: str) -> bytes:
+        """
+        Returns the decoded bytes of a message, from the prefetch buffer if it's there. A message still being
+        prefetched is waited for rather than decoded twice.
+        """
+        with self._lock:
+            data = self._buffer.get(filename)
+            if data is not None:
+                self._buffer.move_to_end(filename)
+                self.hits += 1
+                return data
+            pending = self._pending.get(filename)
+            self.misses += 1
+
+        if pending is not None:
+            return pending.result()
+        return self._decode(filename)
+
+    def release(self, filename: str):
+        """Drops a message from the prefetch buffer, such as once it's been played and consumed"""
+        with self._lock:
+            self._remove(filename)
+
+    def play(self, filename: str):
+        """Plays a message through the default audio output, decoding from memory"""
+        with wave.open(io.BytesIO(self.load(filename)), 'rb') as wave_file:
+            audio = pyaudio.PyAudio()
+            try:
+                stream = audio.open(
+                    format=audio.get_format_from_width(wave_file.getsampwidth()),
+                    channels=wave_file.getnchannels(),
+                    rate=wave_file.getframerate(),
+                    output=True)
+                try:
+                    stream.write(wave_file.readframes(wave_file.getnframes()))
+                finally:
+                    stream.stop_stream()
+                    stream.close()
+            finally:
+                audio.terminate()
+
+    def close(self):
+        """Finishes any compression or prefetching in progress"""
+        self._executor.shutdown()
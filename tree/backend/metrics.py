@@ -0,0 +1,174 @@
+import json
+import sys
+import threading
+import time
+from collections import deque
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram(object):
+    """
+    Distribution of observed values. The most recent `max_samples` observations are kept for percentiles, while
+    the count and sum cover every observation.
+    """
+
+    def __init__(self, max_samples: int = constants.metrics_max_samples):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def percentiles(self, quantiles=QUANTILES) -> dict:
+        """Returns the value at each quantile of the kept samples, or an empty dict if nothing was observed"""
+        if not self.samples:
+            return {}
+
+        values = np.percentile(np.fromiter(self.samples, dtype=np.float64), [q * 100 for q in quantiles])
+        return {quantile: float(value) for quantile, value in zip(quantiles, values)}
+
+
+class Timer(object):
+    """Context manager that observes the seconds spent inside it in a histogram"""
+
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry: "Metrics", name: str):
+        self.registry = registry
+        self.name = name
+        self.start = None
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+
+
+class NullTimer(object):
+    """Timer handed out while metrics are disabled, which does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "NullTimer":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics(object):
+    """
+    In-process registry of counters, and of histograms of per-stage timings.
+
+    While disabled, `time` returns a shared no-op context manager and `increment` and `observe` return straight
+    away, so instrumented code pays for little more than an attribute lookup.
+    """
+
+    def __init__(self, enabled: bool = constants.metrics_enabled, max_samples: int = constants.metrics_max_samples):
+        self.enabled = enabled
+        self.max_samples = max_samples
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def time(self, name: str) -> Union[Timer, NullTimer]:
+        """
+        Times the body of a `with` block into the histogram `name`
+
+        :param name: name of the pipeline stage, e.g. "face_locations"
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name)
+
+    def observe(self, name: str, value: float):
+        """Records a value, such as a duration in seconds, in the histogram `name`"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.max_samples)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1):
+        """Adds `amount` to the counter `name`"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        """Forgets every counter and histogram"""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def snapshot(self) -> dict:
+        """Returns the current counters, and the count, sum and percentiles of each histogram"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {
+                    name: {
+                        'count': histogram.count,
+                        'sum': histogram.sum,
+                        'percentiles': {
+                            'p{:g}'.format(quantile * 100): value
+                            for quantile, value in histogram.percentiles().items()
+                        },
+                    }
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.snapshot(), sort_keys=True, **kwargs)
+
+    def to_prometheus(self, prefix: str = constants.metrics_prefix) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format. Counters are exported with a `_total` suffix,
+        and histograms as summaries of seconds with a `quantile` label.
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = "{}_{}_total".format(prefix, name)
+                lines.append("# TYPE {} counter".format(metric))
+                lines.append("{} {}".format(metric, value))
+
+            for name, histogram in sorted(self.histograms.items()):
+                metric = "{}_{}_seconds".format(prefix, name)
+                lines.append("# TYPE {} summary".format(metric))
+                for quantile, value in histogram.percentiles().items():
+                    lines.append('{}{{quantile="{}"}} {}'.format(metric, quantile, value))
+                lines.append("{}_sum {}".format(metric, histogram.sum))
+                lines.append("{}_count {}".format(metric, histogram.count))
+
+        return "".join(line + "\n" for line in lines)
+
+    def dump(self, filepath: str):
+        """Writes the metrics to a file, as Prometheus text if it ends in `.prom` and as JSON otherwise"""
+        with open(filepath, 'w') as metrics_file:
+            metrics_file.write(self.to_prometheus() if filepath.endswith(".prom") else self.to_json(indent=2))
+
+
+metrics = Metrics()
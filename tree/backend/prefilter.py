@@ -0,0 +1,146 @@
+import abc
+import sys
+from typing import Iterable, Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.lazy_import as lazy_import
+
+cv2 = lazy_import.lazy_import('cv2')
+
+
+class Gate(abc.ABC):
+    """A cheap check that rejects frames which can't be worth running the face detector on"""
+
+    name = "gate"
+
+    @abc.abstractmethod
+    def accepts(self, gray) -> bool:
+        """
+        :param gray: a small grayscale copy of the frame
+        :return: False if the frame should be dropped before detection
+        """
+        pass
+
+    def detection_result(self, gray, face_found: bool):
+        """Called with the outcome of running the detector on a frame this gate accepted"""
+        pass
+
+
+class BrightnessGate(Gate):
+    """Drops frames that are too dark or too washed out to contain a detectable face"""
+
+    name = "brightness"
+
+    def __init__(
+            self,
+            min_brightness: float = constants.prefilter_min_brightness,
+            max_brightness: float = constants.prefilter_max_brightness
+        ):
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+
+    def accepts(self, gray) -> bool:
+        return self.min_brightness <= gray.mean() <= self.max_brightness
+
+
+class SharpnessGate(Gate):
+    """Drops motion-blurred or out of focus frames, scored by the variance of the Laplacian"""
+
+    name = "sharpness"
+
+    def __init__(self, min_sharpness: float = constants.prefilter_min_sharpness):
+        self.min_sharpness = min_sharpness
+
+    def accepts(self, gray) -> bool:
+        return cv2.Laplacian(gray, cv2.CV_64F).var() >= self.min_sharpness
+
+
+class MotionGate(Gate):
+    """
+    Drops frames where nothing has changed since the detector last found the scene empty.
+
+    Frames are only compared against an empty reference, so a visitor standing still in front of the camera is
+    never dropped for not moving.
+    """
+
+    name = "motion"
+
+    def __init__(self, min_motion: float = constants.prefilter_min_motion):
+        self.min_motion = min_motion
+        self.empty_reference = None
+
+    def accepts(self, gray) -> bool:
+        if self.empty_reference is None or self.empty_reference.shape != gray.shape:
+            return True
+
+        return cv2.absdiff(gray, self.empty_reference).mean() >= self.min_motion
+
+    def detection_result(self, gray, face_found: bool):
+        self.empty_reference = None if face_found else gray
+
+
+class PreFilter(object):
+    """
+    Runs a chain of cheap gates over frames before the expensive face detector and encoder.
+
+    Every gate sees the same downsampled grayscale copy of the frame, and the first gate to reject a frame drops
+    it. `counters` records how many frames reached and were dropped by each stage, including the detector itself.
+    """
+
+    detector_stage = "detector"
+
+    def __init__(self, gates: Union[Iterable[Gate], None] = None, width: int = constants.prefilter_width):
+        self.gates = list(gates) if gates is not None else [BrightnessGate(), SharpnessGate(), MotionGate()]
+        self.width = width
+        self.counters = {}
+        self._last_gray = None
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.counters = {
+            stage: {"seen": 0, "dropped": 0}
+            for stage in [gate.name for gate in self.gates] + [self.detector_stage]
+        }
+
+    def _record(self, stage: str, dropped: bool):
+        counter = self.counters.setdefault(stage, {"seen": 0, "dropped": 0})
+        counter["seen"] += 1
+        counter["dropped"] += dropped
+
+    def downsample(self, image) -> np.ndarray:
+        """Returns a small grayscale copy of an RGB image array"""
+        height, width = image.shape[:2]
+        scale = min(1.0, self.width / width)
+        small_image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small_image, cv2.COLOR_RGB2GRAY)
+
+    def accepts(self, image) -> bool:
+        """Returns False if any gate rejects the RGB image array"""
+        if not self.gates:
+            return True
+
+        gray = self.downsample(image)
+        self._last_gray = gray
+
+        for gate in self.gates:
+            accepted = gate.accepts(gray)
+            self._record(gate.name, not accepted)
+            if not accepted:
+                return False
+
+        return True
+
+    def record_detection(self, face_found: bool):
+        """Records the detector's outcome on the most recently accepted frame"""
+        self._record(self.detector_stage, not face_found)
+
+        if self._last_gray is not None:
+            for gate in self.gates:
+                gate.detection_result(self._last_gray, face_found)
+
+
+prefilter = PreFilter()
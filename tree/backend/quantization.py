@@ -0,0 +1,88 @@
+import sys
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+
+INT8 = "int8"
+KINDS = (INT8,)
+
+INT8_LEVELS = 255
+
+
+class Quantizer(object):
+    """
+    Maps float64 encodings to compact codes and back.
+
+    `INT8` codes map each dimension's range, as seen when the quantizer was fit, onto 256 evenly spaced levels with
+    a per-dimension scale and offset. Values outside the fitted range are clipped, which shows up as a larger
+    reconstruction error.
+    """
+
+    def __init__(
+            self,
+            kind: str = constants.quantization_kind,
+            scale: Union[np.ndarray, None] = None,
+            offset: Union[np.ndarray, None] = None
+        ):
+        if kind not in KINDS:
+            raise ValueError("Unknown quantization `{}`. Expected one of {}".format(kind, KINDS))
+
+        self.kind = kind
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def fit(cls, encodings: np.ndarray, kind: str = constants.quantization_kind) -> "Quantizer":
+        """Fits a quantizer to the range of each dimension of an (N x dimensions) matrix of encodings"""
+        if not len(encodings):
+            return cls(kind, np.ones(encodings.shape[1]), np.zeros(encodings.shape[1]))
+
+        return cls.from_range(encodings.min(axis=0), encodings.max(axis=0), kind)
+
+    @classmethod
+    def from_range(cls, low: np.ndarray, high: np.ndarray, kind: str = constants.quantization_kind) -> "Quantizer":
+        """Creates a quantizer covering the per-dimension range `low` to `high`, such as one found a chunk at a time"""
+        scale = (high - low) / INT8_LEVELS
+        scale[scale == 0] = 1
+        return cls(kind, scale, low)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(np.int8)
+
+    def encode(self, encodings: np.ndarray) -> np.ndarray:
+        """Returns the codes of an (N x dimensions) matrix of encodings"""
+        encodings = np.asarray(encodings, dtype=np.float64)
+        levels = np.clip(np.rint((encodings - self.offset) / self.scale), 0, INT8_LEVELS)
+        return (levels - 128).astype(np.int8)
+
+    def affine(self, dimensions: int = constants.face_encoding_dimensions) -> (np.ndarray, np.ndarray):
+        """Returns the per-dimension `(scale, shift)` that a code is decoded with, as `code * scale + shift`"""
+        return self.scale, self.offset + 128 * self.scale
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Returns the float64 encodings that an (N x dimensions) matrix of codes stands for"""
+        scale, shift = self.affine(codes.shape[-1])
+        return codes.astype(np.float64) * scale + shift
+
+    def errors(self, encodings: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """Returns the euclidean distance between each encoding and what its code decodes to"""
+        return np.linalg.norm(np.asarray(encodings, dtype=np.float64) - self.decode(codes), axis=1)
+
+    def to_dict(self) -> dict:
+        return {
+            'kind': self.kind,
+            'scale': self.scale.tolist() if self.scale is not None else None,
+            'offset': self.offset.tolist() if self.offset is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Quantizer":
+        return cls(
+            data['kind'],
+            np.array(data['scale']) if data['scale'] is not None else None,
+            np.array(data['offset']) if data['offset'] is not None else None)
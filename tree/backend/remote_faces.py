@@ -0,0 +1,253 @@
+import json
+import queue
+import socket
+import sys
+import threading
+from typing import Iterable, Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+import tree.backend.server as server
+
+
+class RemoteError(Exception):
+    """Raised when the recognition server couldn't complete a call"""
+    def __init__(self, error_type: str, message: str):
+        self.error_type = error_type
+        super().__init__("{}: {}".format(error_type, message))
+
+
+class NotSupportedRemotelyError(NotImplementedError):
+    """Raised for `faces.Faces` members that need the gallery's encodings, which only the server holds"""
+    def __init__(self, member: str):
+        super().__init__(
+            "`{}` isn't supported on remote faces. Run it against the recognition server's gallery instead".format(
+                member))
+
+
+class Connection(object):
+    """One connection to a recognition server, sending a line of JSON per request"""
+
+    def __init__(self, address, timeout: float = constants.server_timeout_seconds):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, request: dict) -> dict:
+        self.file.write(json.dumps(request).encode() + b"\n")
+        self.file.flush()
+
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The recognition server closed the connection")
+        return json.loads(line)
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+class ConnectionPool(object):
+    """
+    Keeps up to `size` connections to a recognition server open and reuses them, so concurrent callers each get
+    their own connection without paying to connect on every call
+    """
+
+    def __init__(
+            self,
+            address=(constants.server_host, constants.server_port),
+            size: int = constants.server_pool_size,
+            timeout: float = constants.server_timeout_seconds
+        ):
+        self.address = address
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._available = threading.BoundedSemaphore(size)
+
+    def request(self, request: dict) -> dict:
+        with self._available:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = Connection(self.address, self.timeout)
+
+            try:
+                response = connection.request(request)
+            except (OSError, ValueError):
+                # The connection is in an unknown state, so don't hand it out again
+                connection.close()
+                raise
+
+            self._idle.put(connection)
+            return response
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RemoteFaces(faces.Faces):
+    """
+    Stand-in for `faces.Faces` whose gallery lives in a recognition server, shared with every other kiosk.
+
+    Detection, encoding and cropping still happen in this process, so `snap_face`, `snap_faces` and
+    `add_face_from_image` work as usual, while matching and storage happen on the server. New visitors are
+    enrolled with the server's atomic `enroll`, so two kiosks seeing the same visitor record them once. Faces
+    returned are copies of the server's, and `add_message` and `consume_message` update them along with the server.
+
+    The encoding matrix, index and matcher live on the server, so members that need them, such as
+    `face_encodings` and `add_faces_from_images`, raise `NotSupportedRemotelyError`.
+    """
+
+    def __init__(
+            self,
+            address=(constants.server_host, constants.server_port),
+            pool_size: int = constants.server_pool_size,
+            timeout: float = constants.server_timeout_seconds
+        ):
+        """
+        :param address: (host, port) of a `server.RecognitionServer`, or the path of a `server.UnixRecognitionServer`
+        :param pool_size: maximum number of connections kept open to the server
+        """
+        self.pool = ConnectionPool(address, pool_size, timeout)
+        self.work_queue = None
+        self.lock = threading.RLock()
+        self.match_callbacks = []
+
+    def call_many(self, calls: Iterable[tuple]) -> list:
+        """
+        Makes a batch of calls in one round trip
+
+        :param calls: (method, params) tuples
+        :raises RemoteError: if any call failed
+        :return: the result of each call
+        """
+        response = self.pool.request({'calls': [{'method': method, 'params': params} for method, params in calls]})
+        if 'error' in response:
+            raise RemoteError(response['error']['type'], response['error']['message'])
+
+        results = []
+        for result in response['results']:
+            if 'error' in result:
+                raise RemoteError(result['error']['type'], result['error']['message'])
+            results.append(result['result'])
+        return results
+
+    def call(self, method: str, **params):
+        return self.call_many([(method, params)])[0]
+
+    @property
+    def faces(self) -> list:
+        """Every face recorded on the server"""
+        return [server.face_from_dict(face) for face in self.call('faces')]
+
+    def __iter__(self):
+        return iter(self.faces)
+
+    @property
+    def face_encodings(self):
+        raise NotSupportedRemotelyError('face_encodings')
+
+    @property
+    def encoding_index(self):
+        raise NotSupportedRemotelyError('encoding_index')
+
+    @property
+    def matcher(self):
+        raise NotSupportedRemotelyError('matcher')
+
+    def set_matcher(self, matcher):
+        raise NotSupportedRemotelyError('set_matcher')
+
+    def add_faces_from_images(self, filepaths, *args, **kwargs):
+        # Refuse before spending a process pool's worth of work on images that can't be deduplicated here
+        raise NotSupportedRemotelyError('add_faces_from_images')
+
+    def get_face(self, _id: str) -> "faces.Face":
+        return server.face_from_dict(self.call('face', id=_id))
+
+    def get_nearest_face(self, face_encoding) -> (Union["faces.Face", None], float):
+        result = self.call('nearest', encoding=np.asarray(face_encoding, dtype=np.float64).tolist())
+        face = server.face_from_dict(result['face']) if result['face'] is not None else None
+        return face, result['distance']
+
+    def match_encodings(self, face_encodings, tolerance: float = constants.face_match_tolerance) -> list:
+        encodings = np.asarray(face_encodings, dtype=np.float64).reshape(-1, constants.face_encoding_dimensions)
+        matched_faces = [
+            server.face_from_dict(face) if face is not None else None
+            for face in self.call('match', encodings=encodings.tolist(), tolerance=tolerance)
+        ]
+
+        for face in matched_faces:
+            if face is not None:
+                self._matched(face)
+
+        return matched_faces
+
+    def get_face_from_encoding(self, face_encoding, tolerance: float = constants.face_match_tolerance):
+        face = self.match_encodings([face_encoding], tolerance)[0]
+        if face is None:
+            raise faces.NoMatchingFaceFoundException
+        return face
+
+    def enroll(
+            self,
+            face_encodings,
+            ids: Union[list, None] = None,
+            tolerance: float = constants.face_match_tolerance,
+            save_backup: bool = True
+        ) -> list:
+        """
+        Matches each encoding on the server and records the ones that don't match, in one step, so two kiosks
+        can't enroll the same visitor twice. The server records every face it's given, so `save_backup` is unused.
+
+        :param ids: optional ids for the new faces, parallel to `face_encodings`
+        :return: a (face, is_new) tuple for each encoding
+        """
+        encodings = np.asarray(face_encodings, dtype=np.float64).reshape(-1, constants.face_encoding_dimensions)
+        results = [
+            (server.face_from_dict(result['face']), result['is_new'])
+            for result in self.call('enroll', encodings=encodings.tolist(), ids=ids, tolerance=tolerance)
+        ]
+
+        for face, is_new in results:
+            if not is_new:
+                self._matched(face)
+
+        return results
+
+    def add_face(self, face: "faces.Face", save_backup: bool = True):
+        # The server records every face it's given, so there's no unsaved add
+        self.call('add_face', face=server.face_to_dict(face))
+
+    def remove_faces(self, faces_to_remove: Iterable["faces.Face"], save_backup: bool = True):
+        self.call('remove_faces', ids=[face._id for face in faces_to_remove])
+
+    def add_message(self, face: "faces.Face", message: str, save_backup: bool = True):
+        face.messages = self.call('add_message', id=face._id, message=message)
+
+    def consume_message(self, face: "faces.Face", save_backup: bool = True) -> str:
+        result = self.call('consume_message', id=face._id)
+        face.messages = result['messages']
+        return result['message']
+
+    def save(self):
+        self.call('save')
+
+    def close(self):
+        # There's no local storage to close, since the server records every change
+        try:
+            if self.work_queue is not None:
+                work_queue, self.work_queue = self.work_queue, None
+                work_queue.close()
+        finally:
+            self.pool.close()
@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.image_cache as image_cache
+import tree.backend.lazy_import as lazy_import
+
+pyASCIIgenerator = lazy_import.lazy_import('pyASCIIgenerator')
+Image = lazy_import.lazy_import('PIL.Image')
+
+THUMBNAIL = "thumbnail"
+
+_ascii_art_cache = OrderedDict()
+_ascii_art_cache_lock = threading.Lock()
+
+
+def ascii_art_filepath(_id: str) -> str:
+    return os.path.join(constants.renditions_filepath, _id + constants.ascii_art_extension)
+
+
+def thumbnail_filepath(_id: str) -> str:
+    return os.path.join(constants.renditions_filepath, _id + constants.thumbnail_suffix + constants.thumbnail_extension)
+
+
+def ascii_art_from_image(image: "Image.Image", width: int = constants.ascii_art_width) -> str:
+    """Converts an image to ASCII art, exactly as `pyASCIIgenerator.asciify` prints it"""
+    characters = pyASCIIgenerator.pixels_to_ascii(pyASCIIgenerator.grayify(
+        pyASCIIgenerator.resize_image(image, new_width=width)))
+    return "\n".join(characters[index:index + width] for index in range(0, len(characters), width))
+
+
+def _cache_ascii_art(_id: str, ascii_art: str):
+    with _ascii_art_cache_lock:
+        _ascii_art_cache[_id] = ascii_art
+        _ascii_art_cache.move_to_end(_id)
+        while len(_ascii_art_cache) > constants.ascii_art_cache_size:
+            _ascii_art_cache.popitem(last=False)
+
+
+def generate_renditions(_id: str, cropped_image: "Image.Image"):
+    """
+    Derives and saves every rendition of a cropped face: its ASCII art and a small thumbnail.
+    Called once when the face is enrolled, so showing a face later never has to decode the cropped image.
+    """
+    ascii_art = ascii_art_from_image(cropped_image)
+    with open(ascii_art_filepath(_id), 'w') as ascii_art_file:
+        ascii_art_file.write(ascii_art)
+    _cache_ascii_art(_id, ascii_art)
+
+    thumbnail = cropped_image.copy()
+    thumbnail.thumbnail(constants.thumbnail_size)
+    thumbnail.save(thumbnail_filepath(_id))
+    image_cache.image_cache.put((_id, THUMBNAIL), thumbnail)
+
+
+def load_ascii_art(_id: str, cropped_image_filepath: str) -> str:
+    """
+    Returns the ASCII art of a face from memory or its saved rendition. Faces enrolled before renditions existed
+    have theirs generated from the cropped image on first use.
+    """
+    with _ascii_art_cache_lock:
+        ascii_art = _ascii_art_cache.get(_id)
+        if ascii_art is not None:
+            _ascii_art_cache.move_to_end(_id)
+            return ascii_art
+
+    try:
+        with open(ascii_art_filepath(_id), 'r') as ascii_art_file:
+            ascii_art = ascii_art_file.read()
+    except FileNotFoundError:
+        generate_renditions(_id, Image.open(cropped_image_filepath))
+        return load_ascii_art(_id, cropped_image_filepath)
+
+    _cache_ascii_art(_id, ascii_art)
+    return ascii_art
+
+
+def load_thumbnail(_id: str, cropped_image_filepath: str) -> "Image.Image":
+    """Returns the thumbnail of a face, generating its renditions first if it doesn't have any yet"""
+    def load() -> "Image.Image":
+        if not os.path.exists(thumbnail_filepath(_id)):
+            generate_renditions(_id, Image.open(cropped_image_filepath))
+        return Image.open(thumbnail_filepath(_id))
+
+    return image_cache.image_cache.get((_id, THUMBNAIL), load)
+
+
+def invalidate(_id: str):
+    """Forgets any renditions of a face held in memory"""
+    with _ascii_art_cache_lock:
+        _ascii_art_cache.pop(_id, None)
+    image_cache.image_cache.invalidate(_id, THUMBNAIL)
@@ -2,17 +2,31 @@ import sys
 
 sys.path.append('.')
 
-import tree.backend.demos.prompt_demo as prompt_demo
-import tree.backend.demos.sound_demo as sound_demo
+import tree.backend.constants as constants
+from tree.backend.metrics import metrics
 from tree.backend.storage.pickle_storage import pickle_storage
+from tree.backend.work_queue import WorkQueue
 
 
 def main():
     # Load the record of seen faces and messages
     f = pickle_storage.load()
 
+    # Crop new faces and write backups in the background, so visitors are greeted as soon as they're recognized
+    f.work_queue = WorkQueue()
+
+    # Imported only now, so loading the record doesn't wait on the demo's audio dependencies
+    import tree.backend.demos.sound_demo as sound_demo
+
     # Run the demo
-    sound_demo.run(f)
+    try:
+        sound_demo.run(f)
+    finally:
+        # Finish any queued work and flush storage before exiting
+        f.close()
+
+        if metrics.enabled:
+            metrics.dump(constants.metrics_filepath)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,218 @@
+"""
+Recognition server that owns one gallery and its storage, so several kiosks in one installation can share it.
+
+Each connection sends requests as lines of JSON, and gets one line of JSON back per request. A request batches any
+number of calls, `{"calls": [{"method": "match", "params": {...}}, ...]}`, and its response holds a result or an
+error for each call in order, `{"results": [{"result": ...}, {"error": {"type": ..., "message": ...}}]}`.
+
+Run from the repository root with `python -m tree.backend.server`, and connect kiosks with
+`remote_faces.RemoteFaces`.
+"""
+import argparse
+import json
+import os
+import socketserver
+import sys
+import uuid
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+from tree.backend.storage.pickle_storage import pickle_storage
+from tree.backend.work_queue import WorkQueue
+
+
+def face_to_dict(face: "faces.Face") -> dict:
+    return {'id': face._id, 'encoding': np.asarray(face.encoding).tolist(), 'messages': list(face.messages)}
+
+
+def face_from_dict(data: dict) -> "faces.Face":
+    face = faces.Face(data['id'], np.array(data['encoding'], dtype=np.float64))
+    face.messages = list(data['messages'])
+    return face
+
+
+class RecognitionService(object):
+    """
+    The calls a `RecognitionServer` answers, made against one `faces.Faces` object.
+
+    Every call holds the gallery's lock, so writes from different connections are serialized and a match never
+    sees a half-added face. Faces are sent as dicts of their id, encoding and messages.
+    """
+
+    def __init__(self, f: "faces.Faces"):
+        self.faces = f
+        self._faces_by_id = {face._id: face for face in f}
+        self.methods = {
+            'match': self.match,
+            'nearest': self.nearest,
+            'enroll': self.enroll,
+            'add_face': self.add_face,
+            'remove_faces': self.remove_faces,
+            'face': self.face,
+            'faces': self.list_faces,
+            'add_message': self.add_message,
+            'consume_message': self.consume_message,
+            'save': self.save,
+        }
+
+    def handle(self, request: dict) -> dict:
+        return {'results': [self.call(call) for call in request['calls']]}
+
+    def call(self, call: dict) -> dict:
+        try:
+            method = self.methods[call['method']]
+            with self.faces.lock:
+                return {'result': method(**call.get('params', {}))}
+        except Exception as e:
+            return {'error': {'type': type(e).__name__, 'message': str(e)}}
+
+    def _face(self, _id: str) -> "faces.Face":
+        try:
+            return self._faces_by_id[_id]
+        except KeyError:
+            raise KeyError("No face with id `{}`".format(_id))
+
+    def match(self, encodings: list, tolerance: float = constants.face_match_tolerance) -> list:
+        """Matches a batch of encodings, returning the matched face or None for each"""
+        return [
+            face_to_dict(face) if face is not None else None
+            for face in self.faces.match_encodings(np.array(encodings, dtype=np.float64), tolerance)
+        ]
+
+    def nearest(self, encoding: list) -> dict:
+        """Returns the nearest face to an encoding, or None if there are no faces, and its distance"""
+        face, distance = self.faces.get_nearest_face(np.array(encoding, dtype=np.float64))
+        return {'face': face_to_dict(face) if face is not None else None, 'distance': distance}
+
+    def enroll(self, encodings: list, ids: Union[list, None] = None,
+               tolerance: float = constants.face_match_tolerance) -> list:
+        """
+        Matches each encoding, recording a new face for each one that doesn't match. Matching and recording happen
+        together under the lock, so two kiosks snapping the same new visitor can't both enroll them.
+
+        :param ids: optional ids for the new faces, parallel to `encodings`
+        :return: `{"face": ..., "is_new": ...}` for each encoding
+        """
+        ids = ids or [None] * len(encodings)
+        results = []
+        for _id, encoding in zip(ids, np.array(encodings, dtype=np.float64).reshape(len(ids), -1)):
+            matched_face = self.faces.match_encodings(encoding[None, :], tolerance)[0]
+            if matched_face is not None:
+                results.append({'face': face_to_dict(matched_face), 'is_new': False})
+                continue
+
+            face = faces.Face(_id or str(uuid.uuid4()), encoding)
+            self._add(face)
+            results.append({'face': face_to_dict(face), 'is_new': True})
+
+        return results
+
+    def add_face(self, face: dict):
+        """Records a face without matching it first"""
+        self._add(face_from_dict(face))
+
+    def _add(self, face: "faces.Face"):
+        if face._id in self._faces_by_id:
+            raise ValueError("A face with id `{}` already exists".format(face._id))
+
+        self.faces.add_face(face)
+        self._faces_by_id[face._id] = face
+
+    def remove_faces(self, ids: list):
+        self.faces.remove_faces([self._face(_id) for _id in ids])
+        for _id in ids:
+            del self._faces_by_id[_id]
+
+    def face(self, id: str) -> dict:
+        return face_to_dict(self._face(id))
+
+    def list_faces(self) -> list:
+        return [face_to_dict(face) for face in self.faces]
+
+    def add_message(self, id: str, message: str) -> list:
+        """Adds a message to a face, returning the face's messages"""
+        face = self._face(id)
+        self.faces.add_message(face, message)
+        return list(face.messages)
+
+    def consume_message(self, id: str) -> dict:
+        """Consumes a face's most recent message, returning it and the face's remaining messages"""
+        face = self._face(id)
+        message = self.faces.consume_message(face)
+        return {'message': message, 'messages': list(face.messages)}
+
+    def save(self):
+        self.faces.save()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.service.handle(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                response = {'error': {'type': type(e).__name__, 'message': "Malformed request: {}".format(e)}}
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class RecognitionServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Serves a `RecognitionService` over TCP, with a thread per connection"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, f: "faces.Faces", address=(constants.server_host, constants.server_port)):
+        self.service = RecognitionService(f)
+        super().__init__(address, RequestHandler)
+
+
+class UnixRecognitionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serves a `RecognitionService` over a Unix socket, with a thread per connection"""
+
+    daemon_threads = True
+
+    def __init__(self, f: "faces.Faces", address: str = constants.server_unix_socket_filepath):
+        self.service = RecognitionService(f)
+        if os.path.exists(address):
+            os.remove(address)  # Left behind by a server that didn't shut down cleanly
+        super().__init__(address, RequestHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=constants.server_host)
+    parser.add_argument('--port', type=int, default=constants.server_port)
+    parser.add_argument('--unix', nargs='?', const=constants.server_unix_socket_filepath,
+                        help="listen on a Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    # Load the record of seen faces and messages
+    f = pickle_storage.load()
+
+    # Write backups in the background, so kiosks aren't kept waiting on the disk
+    f.work_queue = WorkQueue()
+
+    if args.unix:
+        server = UnixRecognitionServer(f, args.unix)
+    else:
+        server = RecognitionServer(f, (args.host, args.port))
+
+    print("Serving {} faces on {}".format(len(f.faces), server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        f.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -9,3 +9,26 @@ class Storage(abc.ABC):
     @abc.abstractmethod
     def load(self):
         pass
+
+    # Mutation hooks called by `Faces`. By default every mutation saves the whole object, but backends that can
+    # record a single change more cheaply should override these.
+
+    def face_added(self, data, face):
+        """Called after `face` was added to the `Faces` object `data`"""
+        self.save(data)
+
+    def faces_added(self, data, faces):
+        """Called after every face in `faces` was added to `data` together. Saves the whole object once"""
+        self.save(data)
+
+    def message_added(self, data, face, message):
+        """Called after `message` was added to `face`"""
+        self.save(data)
+
+    def message_consumed(self, data, face):
+        """Called after the most recent message of `face` was consumed"""
+        self.save(data)
+
+    def close(self):
+        """Flushes and releases any open files or connections. Backends reopen them on their next write"""
+        pass
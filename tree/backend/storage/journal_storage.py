@@ -0,0 +1,210 @@
+import os
+import pickle
+import sys
+import threading
+import time
+from typing import Union
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+import tree.backend.metrics as metrics
+import tree.backend.storage as storage
+
+FACE_ADDED = "face_added"
+MESSAGE_ADDED = "message_added"
+MESSAGE_CONSUMED = "message_consumed"
+
+
+class JournalStorage(storage.Storage):
+    """
+    Stores `Faces` as a snapshot plus an append-only journal of the changes made since it was taken.
+
+    Each mutation appends one small pickled record to the journal, so writes cost the same however large the
+    gallery grows. Records are fsynced in batches, or by a timer at most `sync_interval_seconds` after they were
+    appended if no more follow, and every `compact_every` records the whole object is written
+    to a fresh snapshot and the journal is truncated. Records are numbered and the snapshot remembers the last one
+    it includes, so a crash between writing the snapshot and truncating the journal can't replay a change twice.
+    A torn record at the end of the journal from a power loss is dropped on load.
+    """
+
+    def __init__(
+            self,
+            filename: Union[str, None] = None,
+            sync_every: int = constants.journal_sync_every,
+            sync_interval_seconds: float = constants.journal_sync_interval_seconds,
+            compact_every: int = constants.journal_compact_every
+        ):
+        self.filename = filename or constants.journal_storage_filename
+        self.snapshot_filepath = os.path.join(
+            constants.backup_filepath, self.filename + constants.journal_snapshot_extension)
+        self.journal_filepath = os.path.join(constants.backup_filepath, self.filename + constants.journal_extension)
+
+        self.sync_every = sync_every
+        self.sync_interval_seconds = sync_interval_seconds
+        self.compact_every = compact_every
+
+        self._journal_file = None
+        self._sequence = 0  # Number of the last record written
+        self._records_since_compaction = 0
+        self._unsynced_records = 0
+        self._last_sync = time.monotonic()
+        self._sync_timer = None
+        self._lock = threading.RLock()  # Held while writing, since the sync timer runs on its own thread
+
+    def save(self, data: "faces.Faces"):
+        """Writes a full snapshot of `data` and truncates the journal"""
+        with self._lock:
+            self._save(data)
+
+    def _save(self, data: "faces.Faces"):
+        temporary_filepath = self.snapshot_filepath + ".tmp"
+        with open(temporary_filepath, 'wb') as snapshot_file:
+            pickle.dump((self._sequence, data), snapshot_file)
+            metrics.metrics.increment('storage_bytes_written', snapshot_file.tell())
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temporary_filepath, self.snapshot_filepath)
+
+        self.close()
+        with open(self.journal_filepath, 'wb') as journal_file:
+            os.fsync(journal_file.fileno())
+
+        self._records_since_compaction = 0
+
+    def load(self) -> "faces.Faces":
+        try:
+            with open(self.snapshot_filepath, 'rb') as snapshot_file:
+                snapshot_sequence, data = pickle.load(snapshot_file)
+        except FileNotFoundError:
+            snapshot_sequence, data = 0, faces.Faces()
+
+        data.storage = self
+        self._sequence = snapshot_sequence
+        self._records_since_compaction = self._replay(data, snapshot_sequence)
+        return data
+
+    def _replay(self, data: "faces.Faces", snapshot_sequence: int) -> int:
+        """Applies every journal record newer than the snapshot to `data`, returning how many were applied"""
+        faces_by_id = {face._id: face for face in data}
+        replayed = 0
+
+        try:
+            journal_file = open(self.journal_filepath, 'rb')
+        except FileNotFoundError:
+            return replayed
+
+        with journal_file:
+            good_offset = 0
+            while True:
+                try:
+                    sequence, operation, payload = pickle.load(journal_file)
+                except (EOFError, pickle.UnpicklingError, ValueError, TypeError):
+                    break
+
+                good_offset = journal_file.tell()
+                self._sequence = max(self._sequence, sequence)
+                if sequence <= snapshot_sequence:
+                    continue
+
+                if operation == FACE_ADDED:
+                    data.add_face(payload, save_backup=False)
+                    faces_by_id[payload._id] = payload
+                elif operation == MESSAGE_ADDED:
+                    _id, message = payload
+                    faces_by_id[_id].add_message(message)
+                elif operation == MESSAGE_CONSUMED:
+                    faces_by_id[payload].consume_message()
+                replayed += 1
+
+            journal_size = journal_file.seek(0, os.SEEK_END)
+
+        if journal_size > good_offset:
+            # A torn final record from a crash mid-write. Drop it so new records append after the good ones
+            self._truncate_journal(good_offset)
+
+        return replayed
+
+    def _truncate_journal(self, size: int):
+        with open(self.journal_filepath, 'r+b') as journal_file:
+            journal_file.truncate(size)
+            os.fsync(journal_file.fileno())
+
+    def _append(self, data: "faces.Faces", operation: str, payload):
+        with self._lock:
+            self._append_locked(data, operation, payload)
+
+    def _append_locked(self, data: "faces.Faces", operation: str, payload):
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_filepath, 'ab')
+
+        self._sequence += 1
+        record = pickle.dumps((self._sequence, operation, payload))
+        self._journal_file.write(record)
+        self._journal_file.flush()
+        metrics.metrics.increment('storage_bytes_written', len(record))
+
+        self._unsynced_records += 1
+        self._records_since_compaction += 1
+
+        if self._records_since_compaction >= self.compact_every:
+            # Through `data` when it's backed by this journal, so any of its writes still queued behind this one,
+            # whose changes the snapshot already includes, aren't appended on top of it
+            if data.storage is self:
+                data.save()
+            else:
+                self.save(data)
+        elif (self._unsynced_records >= self.sync_every
+                or time.monotonic() - self._last_sync >= self.sync_interval_seconds):
+            self.sync()
+        elif self._sync_timer is None:
+            # Bound how long this record stays unsynced if it's the last one for a while
+            self._sync_timer = threading.Timer(self.sync_interval_seconds, self._sync_if_unsynced)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+
+    def _sync_if_unsynced(self):
+        with self._lock:
+            self._sync_timer = None
+            if self._unsynced_records:
+                self.sync()
+
+    def sync(self):
+        """Forces every appended record onto disk"""
+        with self._lock:
+            if self._journal_file is not None:
+                self._journal_file.flush()
+                os.fsync(self._journal_file.fileno())
+
+            self._unsynced_records = 0
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        """Syncs and closes the journal. It's reopened by the next append"""
+        with self._lock:
+            if self._sync_timer is not None:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+
+            self.sync()
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+
+    def face_added(self, data, face):
+        self._append(data, FACE_ADDED, face)
+
+    def faces_added(self, data, faces):
+        with self._lock:
+            for face in faces:
+                self._append_locked(data, FACE_ADDED, face)
+                if self._records_since_compaction == 0:
+                    # Compacted, and the snapshot already includes the rest of the faces
+                    break
+
+    def message_added(self, data, face, message):
+        self._append(data, MESSAGE_ADDED, (face._id, message))
+
+    def message_consumed(self, data, face):
+        self._append(data, MESSAGE_CONSUMED, face._id)
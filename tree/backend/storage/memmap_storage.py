@@ -0,0 +1,264 @@
+import json
+import os
+import sys
+import threading
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.encoding_index as encoding_index
+import tree.backend.faces as faces
+import tree.backend.matchers.quantized as quantized
+import tree.backend.metrics as metrics
+import tree.backend.quantization as quantization
+import tree.backend.storage as storage
+
+ENCODING_DTYPE = np.dtype(np.float64)
+
+
+def _write_atomically(filepath: str, data: bytes):
+    temporary_filepath = filepath + ".tmp"
+    with open(temporary_filepath, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_filepath, filepath)
+    metrics.metrics.increment('storage_bytes_written', len(data))
+
+
+class MemmapStorage(storage.Storage):
+    """
+    Stores `Faces` as separate files that can be opened without deserializing the gallery:
+
+    * `<filename>.encodings` holds every encoding as a fixed-stride row of raw float64s, and is opened with
+      `np.memmap` on load, so the OS pages encodings in as they're scanned.
+    * `<filename>.ids` holds one face id per line, parallel to the encoding rows.
+    * `<filename>.messages/` holds one small JSON file of messages per face that has any.
+    * With `quantization_kind` set, `<filename>.codes` holds a quantized code row per encoding row, and
+      `<filename>.quantizer` the JSON parameters they decode with. They're read into memory on load to build a
+      `quantized.QuantizedMatcher`, so only the codes, and the encodings of faces added since loading, stay
+      resident while the mapped encodings are paged in for the few candidates a match re-ranks.
+
+    Loading only reads the ids, and returns a `Faces` whose encoding index wraps the memory map and whose faces
+    are a `faces.LazyFaceList`. A `Face` is only created when it's accessed, usually because it was returned as a
+    match, and its messages are only read when they're accessed in turn. Adding a face appends one row and one
+    line, and each message change rewrites only that face's message file.
+    """
+
+    def __init__(
+            self,
+            filename: Union[str, None] = None,
+            quantization_kind: Union[str, None] = constants.memmap_quantization_kind
+        ):
+        """
+        :param quantization_kind: match loaded faces with a `quantized.QuantizedMatcher` of this kind, persisting its
+            codes alongside the encodings
+        """
+        self.filename = filename or constants.memmap_storage_filename
+        filepath = os.path.join(constants.backup_filepath, self.filename)
+        self.encodings_filepath = filepath + constants.memmap_encodings_extension
+        self.ids_filepath = filepath + constants.memmap_ids_extension
+        self.messages_filepath = filepath + constants.memmap_messages_extension
+        self.codes_filepath = filepath + constants.memmap_codes_extension
+        self.quantizer_filepath = filepath + constants.memmap_quantizer_extension
+        self.quantization_kind = quantization_kind
+        self._lock = threading.Lock()
+
+        # The quantizer that the codes file was written with, how many rows it holds, and the error bound saved
+        self._saved_quantizer = None
+        self._code_rows = 0
+        self._saved_max_error = None
+
+    def _messages_filepath(self, _id: str) -> str:
+        return os.path.join(self.messages_filepath, _id + ".json")
+
+    def load_messages(self, _id: str) -> list:
+        """Reads the messages of the face with the given id"""
+        try:
+            with open(self._messages_filepath(_id), 'r') as messages_file:
+                return json.load(messages_file)
+        except FileNotFoundError:
+            return []
+
+    def _save_messages(self, face: "faces.Face"):
+        if face.messages:
+            os.makedirs(self.messages_filepath, exist_ok=True)
+            _write_atomically(self._messages_filepath(face._id), json.dumps(face.messages).encode())
+        else:
+            try:
+                os.remove(self._messages_filepath(face._id))
+            except FileNotFoundError:
+                pass
+
+    def _read_ids(self) -> list:
+        try:
+            with open(self.ids_filepath, 'r') as ids_file:
+                lines = ids_file.read().split("\n")
+        except FileNotFoundError:
+            return []
+
+        # Anything after the last newline is a torn line from a crash mid-append
+        ids = lines[:-1]
+        if lines[-1]:
+            self._truncate(self.ids_filepath, sum(len(_id.encode()) + 1 for _id in ids))
+        return ids
+
+    @staticmethod
+    def _truncate(filepath: str, size: int):
+        with open(filepath, 'r+b') as f:
+            f.truncate(size)
+            os.fsync(f.fileno())
+
+    def _open_encodings(self, rows: int) -> np.ndarray:
+        if not rows:
+            return np.empty((0, constants.face_encoding_dimensions), dtype=ENCODING_DTYPE)
+
+        return np.memmap(
+            self.encodings_filepath, dtype=ENCODING_DTYPE, mode='r', shape=(rows, constants.face_encoding_dimensions))
+
+    def load(self) -> "faces.Faces":
+        with self._lock:
+            ids = self._read_ids()
+
+            # Ids are appended after encodings, so a crash can leave an extra or partial encoding row. Drop it so
+            # the next append lines up with its id again
+            stride = constants.face_encoding_dimensions * ENCODING_DTYPE.itemsize
+            try:
+                encodings_size = os.path.getsize(self.encodings_filepath)
+            except FileNotFoundError:
+                encodings_size = 0
+            rows = min(len(ids), encodings_size // stride)
+            if encodings_size > rows * stride:
+                self._truncate(self.encodings_filepath, rows * stride)
+
+            ids = ids[:rows]
+            encodings = self._open_encodings(rows)
+
+            matcher = self._load_matcher(rows) if self.quantization_kind else None
+
+        def create_face(row: int) -> "faces.Face":
+            return faces.Face(ids[row], encodings[row], message_loader=self.load_messages)
+
+        data = faces.Faces(
+            faces.LazyFaceList(rows, create_face),
+            storage=self,
+            matcher=matcher,
+            encoding_index=encoding_index.EncodingIndex.from_matrix(ids, encodings))
+
+        # Rows the codes file was missing were quantized while building the matcher, so catch the file up with them
+        with self._lock:
+            self._save_codes(data)
+        return data
+
+    def _load_matcher(self, rows: int) -> "quantized.QuantizedMatcher":
+        try:
+            with open(self.quantizer_filepath, 'r') as quantizer_file:
+                saved = json.load(quantizer_file)
+            quantizer = quantization.Quantizer.from_dict(saved['quantizer'])
+            codes = np.fromfile(self.codes_filepath, dtype=quantizer.dtype)
+        except (FileNotFoundError, ValueError, KeyError):
+            # Without both files, or if they're unreadable, the codes are refit from the encodings
+            self._saved_quantizer = None
+            return quantized.QuantizedMatcher(self.quantization_kind)
+
+        if quantizer.kind != self.quantization_kind:
+            self._saved_quantizer = None
+            return quantized.QuantizedMatcher(self.quantization_kind)
+
+        # Like the encodings, drop a torn code row or rows past the last id, so appends line up again
+        dimensions = constants.face_encoding_dimensions
+        code_rows = min(rows, len(codes) // dimensions)
+        if len(codes) > code_rows * dimensions:
+            self._truncate(self.codes_filepath, code_rows * dimensions * quantizer.dtype.itemsize)
+
+        self._saved_quantizer = quantizer
+        self._code_rows = code_rows
+        self._saved_max_error = saved['max_error']
+        return quantized.QuantizedMatcher.from_codes(
+            quantizer, codes[:code_rows * dimensions].reshape(code_rows, dimensions), saved['max_error'])
+
+    def _save_codes(self, data: "faces.Faces"):
+        """Brings the codes and quantizer files up to date with a quantized matcher"""
+        matcher = data.matcher
+        if not isinstance(matcher, quantized.QuantizedMatcher):
+            return
+
+        codes = matcher.codes
+        if matcher.quantizer is self._saved_quantizer and self._code_rows <= len(codes):
+            # Same quantizer, so only new rows need appending. Their errors can raise the bound, which is saved
+            # first so a crash in between leaves a bound that's loose rather than too tight
+            if matcher.max_error != self._saved_max_error:
+                self._save_quantizer(matcher)
+
+            if self._code_rows < len(codes):
+                new_codes = codes[self._code_rows:].tobytes()
+                with open(self.codes_filepath, 'ab') as codes_file:
+                    codes_file.write(new_codes)
+                    codes_file.flush()
+                    os.fsync(codes_file.fileno())
+                metrics.metrics.increment('storage_bytes_written', len(new_codes))
+                self._code_rows = len(codes)
+            return
+
+        # The quantizer was refit, so every code changed. Remove the old parameters first, so a crash part way
+        # through leaves codes without parameters, which are refit on load, rather than codes decoded wrongly
+        try:
+            os.remove(self.quantizer_filepath)
+        except FileNotFoundError:
+            pass
+        _write_atomically(self.codes_filepath, np.ascontiguousarray(codes).tobytes())
+        self._save_quantizer(matcher)
+        self._saved_quantizer = matcher.quantizer
+        self._code_rows = len(codes)
+
+    def _save_quantizer(self, matcher: "quantized.QuantizedMatcher"):
+        saved = {'quantizer': matcher.quantizer.to_dict(), 'max_error': matcher.max_error}
+        _write_atomically(self.quantizer_filepath, json.dumps(saved).encode())
+        self._saved_max_error = matcher.max_error
+
+    def save(self, data: "faces.Faces"):
+        """Rewrites every file from `data`"""
+        with self._lock:
+            index = data.encoding_index
+            _write_atomically(self.encodings_filepath, np.ascontiguousarray(index.encodings, ENCODING_DTYPE).tobytes())
+            self._saved_quantizer = None
+            self._save_codes(data)
+            _write_atomically(self.ids_filepath, "".join(_id + "\n" for _id in index.ids).encode())
+            for face in data:
+                self._save_messages(face)
+
+    def face_added(self, data, face):
+        self.faces_added(data, [face])
+
+    def faces_added(self, data, faces):
+        with self._lock:
+            # Append the encodings before the ids, so a crash between the two leaves ignorable extra rows
+            encodings = np.asarray([face.encoding for face in faces], dtype=ENCODING_DTYPE).tobytes()
+            with open(self.encodings_filepath, 'ab') as encodings_file:
+                encodings_file.write(encodings)
+                encodings_file.flush()
+                os.fsync(encodings_file.fileno())
+
+            ids = "".join(face._id + "\n" for face in faces)
+            with open(self.ids_filepath, 'a') as ids_file:
+                ids_file.write(ids)
+                ids_file.flush()
+                os.fsync(ids_file.fileno())
+            metrics.metrics.increment('storage_bytes_written', len(encodings) + len(ids))
+
+            self._save_codes(data)
+
+            for face in faces:
+                if face.messages:
+                    self._save_messages(face)
+
+    def message_added(self, data, face, message):
+        with self._lock:
+            self._save_messages(face)
+
+    def message_consumed(self, data, face):
+        with self._lock:
+            self._save_messages(face)
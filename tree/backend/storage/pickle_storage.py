@@ -7,6 +7,7 @@ sys.path.append('.')
 
 import tree.backend.constants as constants
 import tree.backend.faces as faces
+import tree.backend.metrics as metrics
 import tree.backend.storage as storage
 
 
@@ -19,18 +20,22 @@ class PickleStorage(storage.Storage):
     def save(self, data: "faces.Faces"):
         with open(self.backup_filepath, 'wb') as backup_file:
             pickle.dump(data, backup_file)
+            metrics.metrics.increment('storage_bytes_written', backup_file.tell())
 
     def load(self):
         try:
             with open(self.backup_filepath, 'rb') as backup_file:
                 data = pickle.load(backup_file)
-                return data
+
+            if isinstance(data, faces.Faces):
+                data.storage = self
+            return data
 
         except FileNotFoundError:
             self.save(faces.Faces())
 
         # If nothing to load, return a fresh empty faces object
-        return faces.Faces()
+        return faces.Faces(storage=self)
 
 
 pickle_storage = PickleStorage()
@@ -0,0 +1,153 @@
+import os
+import sqlite3
+import sys
+import threading
+from typing import Union
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.encoding_index as encoding_index
+import tree.backend.faces as faces
+import tree.backend.metrics as metrics
+import tree.backend.storage as storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS faces (
+    row INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    encoding BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    face_id TEXT NOT NULL REFERENCES faces (id),
+    position INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    consumed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS messages_by_face ON messages (face_id, consumed, position);
+"""
+
+ENCODING_DTYPE = np.float64
+
+
+class SQLiteStorage(storage.Storage):
+    """
+    Stores `Faces` in a SQLite database in WAL mode.
+
+    Faces are rows holding the face id and the raw bytes of its encoding, and messages are rows holding their
+    face id, position in the face's message list, payload and a consumed flag. Each mutation of `Faces` is a
+    single-row insert or update in its own transaction, so writes are crash safe and cost the same however large
+    the gallery grows. On load every encoding is read into one contiguous NumPy array, and faces and their messages
+    are only read as they're accessed.
+    """
+
+    def __init__(self, filename: Union[str, None] = None, synchronous: str = constants.sqlite_synchronous):
+        self.filename = filename or constants.sqlite_storage_filename
+        self.backup_filepath = os.path.join(constants.backup_filepath, self.filename)
+        self.synchronous = synchronous
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.backup_filepath, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous={}".format(self.synchronous))
+            self._connection.executescript(SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    @staticmethod
+    def _encoding_to_blob(encoding) -> bytes:
+        return np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes()
+
+    def _insert_face(self, _id: str, encoding, messages: list):
+        blob = self._encoding_to_blob(encoding)
+        self.connection.execute("INSERT INTO faces (id, encoding) VALUES (?, ?)", (_id, blob))
+        self.connection.executemany(
+            "INSERT INTO messages (face_id, position, payload) VALUES (?, ?, ?)",
+            [(_id, position, message) for position, message in enumerate(messages)])
+
+        # Counts the bytes of the values written, rather than of the pages SQLite writes for them
+        metrics.metrics.increment('storage_bytes_written', len(_id) + len(blob) + sum(
+            len(_id) + len(message.encode()) for message in messages))
+
+    def save(self, data: "faces.Faces"):
+        """Rewrites the whole database from `data`"""
+        # Faces from `load` read their messages from the database when first accessed, so read them all before
+        # they're deleted, and outside the lock that reading takes
+        rows = [(face._id, face.encoding, list(face.messages)) for face in data]
+
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM messages")
+            self.connection.execute("DELETE FROM faces")
+            for _id, encoding, messages in rows:
+                self._insert_face(_id, encoding, messages)
+
+    def load(self) -> "faces.Faces":
+        with self._lock:
+            face_rows = self.connection.execute("SELECT id, encoding FROM faces ORDER BY row").fetchall()
+
+        # Bulk load every encoding into a single array. Each face's encoding is a row view into it
+        encodings = np.frombuffer(
+            b"".join(encoding for _, encoding in face_rows), dtype=ENCODING_DTYPE
+        ).reshape(-1, constants.face_encoding_dimensions)
+
+        ids = [_id for _id, _ in face_rows]
+        return faces.Faces(
+            faces.LazyFaceList(len(ids), lambda row: faces.Face(ids[row], encodings[row], self.load_messages)),
+            storage=self,
+            encoding_index=encoding_index.EncodingIndex.from_matrix(ids, encodings))
+
+    def load_messages(self, _id: str) -> list:
+        """Reads the unconsumed messages of the face with the given id"""
+        with self._lock:
+            return [payload for payload, in self.connection.execute(
+                "SELECT payload FROM messages WHERE face_id = ? AND consumed = 0 ORDER BY position, id", (_id,))]
+
+    def message_counts(self) -> dict:
+        """Returns the number of unconsumed messages for each face id that has any"""
+        with self._lock:
+            return dict(self.connection.execute(
+                "SELECT face_id, COUNT(*) FROM messages WHERE consumed = 0 GROUP BY face_id").fetchall())
+
+    def face_added(self, data, face):
+        self.faces_added(data, [face])
+
+    def faces_added(self, data, faces):
+        rows = [(face._id, face.encoding, list(face.messages)) for face in faces]
+        with self._lock, self.connection:
+            for _id, encoding, messages in rows:
+                self._insert_face(_id, encoding, messages)
+
+    def message_added(self, data, face, message):
+        with self._lock, self.connection:
+            # Appended after every message the face has had, consumed or not. This doesn't read `face.messages`,
+            # which may have changed again by the time a queued write runs
+            self.connection.execute(
+                """
+                INSERT INTO messages (face_id, position, payload)
+                SELECT ?, COALESCE(MAX(position), -1) + 1, ? FROM messages WHERE face_id = ?
+                """,
+                (face._id, message, face._id))
+        metrics.metrics.increment('storage_bytes_written', len(face._id) + len(message.encode()))
+
+    def message_consumed(self, data, face):
+        # Faces consume their most recent message first
+        with self._lock, self.connection:
+            self.connection.execute(
+                """
+                UPDATE messages SET consumed = 1 WHERE id = (
+                    SELECT id FROM messages WHERE face_id = ? AND consumed = 0
+                    ORDER BY position DESC, id DESC LIMIT 1
+                )
+                """,
+                (face._id,))
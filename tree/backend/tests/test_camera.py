@@ -0,0 +1,62 @@
+import time
+from unittest import TestCase
+
+import numpy as np
+
+from tree.backend.camera import CameraException, FrameGrabber
+
+
+class FakeCamera(object):
+    """Stands in for `Camera`, returning frames filled with an increasing frame number"""
+
+    def __init__(self, frames: int = 1000):
+        self.device = 'fake'
+        self.frames_left = frames
+        self.frame_number = 0
+        self.frame = np.zeros((4, 4, 3), dtype=np.uint8)
+        self.opened = False
+
+    def open(self):
+        self.opened = True
+
+    def close(self):
+        self.opened = False
+
+    def read(self):
+        if not self.frames_left:
+            raise CameraException("Out of frames")
+
+        time.sleep(0.001)
+        self.frames_left -= 1
+        self.frame_number += 1
+        self.frame[:] = self.frame_number % 256
+        return self.frame
+
+
+class TestFrameGrabber(TestCase):
+    def test_next_frames_are_distinct_and_increasing(self):
+        with FrameGrabber(FakeCamera(), buffer_size=2) as grabber:
+            frames = list(grabber.next_frames(5))
+
+        frame_numbers = [int(frame[0, 0, 0]) for frame in frames]
+        self.assertEqual(5, len(frame_numbers))
+        self.assertEqual(sorted(set(frame_numbers)), frame_numbers)
+
+    def test_frames_are_copies(self):
+        with FrameGrabber(FakeCamera(), buffer_size=2) as grabber:
+            frame = grabber.latest_frame()
+            frame_number = int(frame[0, 0, 0])
+            list(grabber.next_frames(4))
+
+        # Wrapping around the ring buffer mustn't overwrite a frame that was already handed out
+        self.assertTrue((frame == frame_number).all())
+
+    def test_camera_errors_are_raised_to_consumers(self):
+        cam = FakeCamera(frames=0)
+        grabber = FrameGrabber(cam, timeout=1)
+
+        with self.assertRaises(CameraException):
+            grabber.latest_frame()
+
+        grabber.stop()
+        self.assertFalse(cam.opened)
@@ -0,0 +1,94 @@
+from unittest import TestCase
+
+import numpy as np
+
+from tree.backend.encoding_index import EncodingIndex, chunk_rows, first_occurrences
+
+
+class TestEncodingIndex(TestCase):
+    def setUp(self):
+        self.random = np.random.default_rng(0)
+        self.encodings = self.random.normal(scale=0.1, size=(200, 128))
+        self.ids = [str(i) for i in range(len(self.encodings))]
+
+    def test_empty_index(self):
+        index = EncodingIndex()
+
+        self.assertEqual(len(index), 0)
+        self.assertEqual((None, float('inf')), index.nearest(self.encodings[0]))
+
+    def test_add_grows_capacity(self):
+        index = EncodingIndex(capacity=1)
+        for _id, encoding in zip(self.ids, self.encodings):
+            index.add(_id, encoding)
+
+        self.assertEqual(len(index), len(self.encodings))
+        self.assertGreaterEqual(index.capacity, len(self.encodings))
+        np.testing.assert_array_equal(self.encodings, index.encodings)
+        self.assertEqual(self.ids, list(index.ids))
+
+    def test_distances_match_naive_computation(self):
+        index = EncodingIndex.from_encodings(self.ids, self.encodings)
+        query = self.random.normal(scale=0.1, size=128)
+
+        expected = np.linalg.norm(self.encodings - query, axis=1)
+        np.testing.assert_allclose(expected, index.distances(query), rtol=1e-9, atol=1e-9)
+
+    def test_nearest_returns_closest_rather_than_first(self):
+        query = self.random.normal(scale=0.1, size=128)
+        far = query + 0.05
+        near = query + 0.01
+
+        index = EncodingIndex.from_encodings(['far', 'near'], [far, near])
+        row, distance = index.nearest(query)
+
+        self.assertEqual('near', index.ids[row])
+        self.assertAlmostEqual(np.linalg.norm(near - query), distance)
+
+    def test_nearest_many_matches_nearest(self):
+        index = EncodingIndex.from_encodings(self.ids, self.encodings)
+        queries = self.encodings[:20] + self.random.normal(scale=0.01, size=(20, 128))
+
+        rows, distances = index.nearest_many(queries, chunk_size=7)
+        for query, row, distance in zip(queries, rows, distances):
+            self.assertEqual(index.nearest(query), (int(row), float(distance)))
+
+    def test_adopted_matrix_is_not_copied_by_adds(self):
+        base = self.encodings[:150].copy()
+        index = EncodingIndex.from_matrix(self.ids[:150], base)
+        self.assertIsNone(index._base_squared_norms)
+
+        for _id, encoding in zip(self.ids[150:], self.encodings[150:]):
+            index.add(_id, encoding)
+
+        self.assertIs(base, index._base)
+        self.assertTrue(np.shares_memory(base, index.rows(0, 150)))
+        self.assertTrue(np.shares_memory(base, index.encoding(0)))
+        np.testing.assert_array_equal(self.encodings, index.encodings)
+        np.testing.assert_array_equal(self.encodings[140:160], index.rows(140, 160))
+        self.assertEqual(self.ids, list(index.ids))
+
+        # Matches span the adopted matrix and the added rows alike
+        plain = EncodingIndex.from_encodings(self.ids, self.encodings)
+        queries = self.encodings[145:155] + self.random.normal(scale=0.01, size=(10, 128))
+        for query in queries:
+            self.assertEqual(plain.nearest(query), index.nearest(query))
+        np.testing.assert_array_equal(plain.nearest_many(queries)[0], index.nearest_many(queries)[0])
+
+    def test_first_occurrences(self):
+        duplicates = self.encodings[:10] + self.random.normal(scale=0.001, size=(10, 128))
+        encodings = np.concatenate([self.encodings[:50], duplicates, self.encodings[50:]])
+
+        keep = first_occurrences(encodings, tolerance=0.1, chunk_size=16)
+
+        self.assertTrue(keep[:50].all())
+        self.assertFalse(keep[50:60].any())
+        self.assertTrue(keep[60:].all())
+
+    def test_chunk_rows_fit_in_budget(self):
+        rows = chunk_rows(100000, max_bytes=256 * 1024 * 1024)
+        self.assertGreater(rows, 1)
+        self.assertLessEqual(3 * 8 * rows * 100000, 256 * 1024 * 1024)
+
+        # At least one row at a time, however large the gallery
+        self.assertEqual(1, chunk_rows(10 ** 9, max_bytes=1))
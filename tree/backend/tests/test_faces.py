@@ -1,7 +1,9 @@
 import os
+import pickle
 from unittest import TestCase
 
 import face_recognition
+import numpy as np
 
 import tree.backend.constants as constants
 import tree.backend.faces as faces
@@ -37,6 +39,14 @@ class TestFaces(TestCase):
         self.assertEqual(face.full_image_filename_from_id(face._id), face.full_image_filename)
         self.assertEqual(face.cropped_image_filename_from_id(face._id), face.cropped_image_filename)
 
+    def test_create_face_from_image_with_downscaled_detection(self):
+        full_scale_face = faces.create_face_from_image(self.test_yash_image_filepath1)
+        downscaled_face = faces.create_face_from_image(self.test_yash_image_filepath1, detection_scale=0.5)
+
+        # Detecting on a half resolution copy should still find and encode the same face
+        results = face_recognition.compare_faces([full_scale_face.encoding], downscaled_face.encoding)
+        self.assertTrue(results[0])
+
     def test_get_face_from_image(self):
         # Create the face objects from the images and add them to the Faces object
         yash_face = self.faces.add_face_from_image(self.test_yash_image_filepath1)
@@ -83,3 +93,88 @@ class TestFaces(TestCase):
         self.assertEqual(joshua_messages[0], joshua_matched_face.consume_message())
         self.assertEqual(len(joshua_matched_face.messages), 0)
 
+    def test_add_faces_from_images(self):
+        filepaths = [
+            self.test_yash_image_filepath1,
+            self.test_joshua_image_filepath1,
+            self.test_yash_image_filepath2,
+            self.test_joshua_image_filepath2,
+        ]
+
+        new_faces = self.faces.add_faces_from_images(filepaths, max_workers=2, save_backup=False)
+
+        # The second photo of each person is a duplicate of the first
+        self.assertEqual(2, len(new_faces))
+        self.assertEqual(2, len(self.faces.faces))
+        joshua_encoding = face_recognition.face_encodings(
+            face_recognition.load_image_file(self.test_joshua_image_filepath2))[0]
+        self.assertEqual(new_faces[1]._id, self.faces.get_face_from_encoding(joshua_encoding)._id)
+
+        for face in new_faces:
+            faces.remove_face_files(face._id)
+
+    def test_create_faces_from_array_with_a_group(self):
+        # Build a group photo by putting two people side by side
+        yash_image = face_recognition.load_image_file(self.test_yash_image_filepath1)
+        joshua_image = face_recognition.load_image_file(self.test_joshua_image_filepath1)
+        height = max(yash_image.shape[0], joshua_image.shape[0])
+        group_image = np.hstack([
+            np.pad(image, ((0, height - image.shape[0]), (0, 0), (0, 0)))
+            for image in (yash_image, joshua_image)
+        ])
+
+        frame_faces = faces.create_faces_from_array(group_image, self.faces, save_backup=False)
+        self.assertEqual(2, len(frame_faces))
+        self.assertTrue(all(frame_face.is_new for frame_face in frame_faces))
+        self.assertEqual(2, len(self.faces.faces))
+
+        # Everyone in the group is recognized the second time around
+        frame_faces_again = faces.create_faces_from_array(group_image, self.faces, save_backup=False)
+        self.assertFalse(any(frame_face.is_new for frame_face in frame_faces_again))
+        self.assertEqual(
+            sorted(frame_face.face._id for frame_face in frame_faces),
+            sorted(frame_face.face._id for frame_face in frame_faces_again))
+
+        for frame_face in frame_faces:
+            faces.remove_face_files(frame_face.face._id)
+
+    def test_faces_share_one_encoding_matrix(self):
+        random = np.random.default_rng(0)
+        for i in range(100):
+            self.faces.add_face(faces.Face(str(i), random.normal(scale=0.1, size=128)), save_backup=False)
+
+        # Every face's encoding is a view of its row in the index, even after the index reallocated
+        for row, face in enumerate(self.faces):
+            self.assertTrue(np.shares_memory(face.encoding, self.faces.encoding_index.encodings))
+            np.testing.assert_array_equal(self.faces.encoding_index.encodings[row], face.encoding)
+
+    def test_enroll_records_unmatched_faces(self):
+        self.faces.add_face(faces.Face('known', np.zeros(128)), save_backup=False)
+
+        results = self.faces.enroll(np.array([np.full(128, 0.01), np.ones(128)]), ['a', 'b'], save_backup=False)
+
+        self.assertEqual([('known', False), ('b', True)], [(face._id, is_new) for face, is_new in results])
+        self.assertEqual(['known', 'b'], [face._id for face in self.faces])
+
+    def test_face_messages_load_lazily(self):
+        loaded_ids = []
+
+        def load_messages(_id):
+            loaded_ids.append(_id)
+            return ["hello"]
+
+        face = faces.Face("lazy", np.zeros(128), message_loader=load_messages)
+        self.assertEqual([], loaded_ids)
+
+        self.assertEqual(["hello"], face.messages)
+        self.assertEqual(["hello"], face.messages)
+        self.assertEqual(["lazy"], loaded_ids)
+
+    def test_face_pickles(self):
+        face = faces.Face("pickled", np.arange(128.0))
+        face.add_message("hello")
+
+        unpickled_face = pickle.loads(pickle.dumps(face))
+        self.assertEqual(face._id, unpickled_face._id)
+        self.assertEqual(face.messages, unpickled_face.messages)
+        np.testing.assert_array_equal(face.encoding, unpickled_face.encoding)
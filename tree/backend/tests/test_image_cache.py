@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+from PIL import Image
+
+from tree.backend.image_cache import CROPPED_IMAGE, FULL_IMAGE, ImageCache, image_size
+
+
+class TestImageCache(TestCase):
+    def setUp(self):
+        self.loads = []
+
+    def loader(self, size: int = 10):
+        def load():
+            self.loads.append(size)
+            return Image.new("RGB", (size, size))
+        return load
+
+    def test_hits_and_misses(self):
+        cache = ImageCache()
+
+        first = cache.get(("a", CROPPED_IMAGE), self.loader())
+        second = cache.get(("a", CROPPED_IMAGE), self.loader())
+
+        self.assertIs(first, second)
+        self.assertEqual(1, len(self.loads))
+        self.assertEqual(1, cache.stats["hits"])
+        self.assertEqual(1, cache.stats["misses"])
+        self.assertEqual(image_size(first), cache.stats["bytes"])
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        image_bytes = 10 * 10 * 3
+        cache = ImageCache(max_bytes=2 * image_bytes)
+
+        cache.get(("a", CROPPED_IMAGE), self.loader())
+        cache.get(("b", CROPPED_IMAGE), self.loader())
+        cache.get(("a", CROPPED_IMAGE), self.loader())
+        cache.get(("c", CROPPED_IMAGE), self.loader())
+
+        self.assertIn(("a", CROPPED_IMAGE), cache)
+        self.assertNotIn(("b", CROPPED_IMAGE), cache)
+        self.assertEqual(1, cache.stats["evictions"])
+        self.assertEqual(2 * image_bytes, cache.current_bytes)
+
+    def test_oversized_images_are_not_cached(self):
+        cache = ImageCache(max_bytes=100)
+        cache.get(("a", FULL_IMAGE), self.loader(100))
+
+        self.assertEqual(0, len(cache))
+
+    def test_invalidate(self):
+        cache = ImageCache()
+        cache.get(("a", CROPPED_IMAGE), self.loader())
+        cache.get(("a", FULL_IMAGE), self.loader())
+        cache.get(("b", CROPPED_IMAGE), self.loader())
+
+        cache.invalidate("a", CROPPED_IMAGE)
+        self.assertNotIn(("a", CROPPED_IMAGE), cache)
+        self.assertIn(("a", FULL_IMAGE), cache)
+
+        cache.invalidate("a")
+        self.assertEqual([("b", CROPPED_IMAGE)], list(cache._images))
+        self.assertEqual(10 * 10 * 3, cache.current_bytes)
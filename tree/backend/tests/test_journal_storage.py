@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+from tree.backend.storage.journal_storage import JournalStorage
+from tree.backend.work_queue import STORAGE, WorkQueue
+
+
+class TestJournalStorage(TestCase):
+    def setUp(self):
+        self.filename = constants.test_pickle_storage_filename
+        self.storage = JournalStorage(self.filename)
+        self.random = np.random.default_rng(0)
+
+    def make_face(self, _id: str) -> "faces.Face":
+        return faces.Face(_id, self.random.normal(scale=0.1, size=128))
+
+    def test_load_without_existing_backup(self):
+        loaded_data = self.storage.load()
+
+        self.assertTrue(isinstance(loaded_data, faces.Faces))
+        self.assertEqual(0, len(loaded_data.faces))
+        self.assertIs(self.storage, loaded_data.storage)
+
+    def test_replays_journal(self):
+        data = self.storage.load()
+        face = self.make_face('a')
+        data.add_face(face)
+        data.add_face(self.make_face('b'))
+        data.add_message(face, "first")
+        data.add_message(face, "second")
+        self.assertEqual("second", data.consume_message(face))
+        self.storage.close()
+
+        loaded_data = JournalStorage(self.filename).load()
+
+        self.assertEqual(['a', 'b'], [loaded_face._id for loaded_face in loaded_data])
+        self.assertEqual(["first"], loaded_data.faces[0].messages)
+        np.testing.assert_array_equal(face.encoding, loaded_data.faces[0].encoding)
+        self.assertEqual('a', loaded_data.get_face_from_encoding(face.encoding)._id)
+
+    def test_queued_writes(self):
+        data = self.storage.load()
+        data.work_queue = WorkQueue()
+        face = self.make_face('a')
+        data.add_face(face)
+        data.add_message(face, "first")
+        data.add_message(face, "second")
+        data.consume_message(face)
+        data.close()
+        self.storage.close()
+
+        loaded_data = JournalStorage(self.filename).load()
+        self.assertEqual(["first"], loaded_data.faces[0].messages)
+
+    def test_compaction_truncates_journal(self):
+        self.storage.compact_every = 3
+        data = self.storage.load()
+        for _id in 'abcd':
+            data.add_face(self.make_face(_id))
+        self.storage.close()
+
+        # Three records were compacted into the snapshot, leaving one in the journal
+        self.assertTrue(os.path.exists(self.storage.snapshot_filepath))
+        loaded_storage = JournalStorage(self.filename)
+        loaded_data = loaded_storage.load()
+        self.assertEqual(list('abcd'), [loaded_face._id for loaded_face in loaded_data])
+        self.assertEqual(1, loaded_storage._records_since_compaction)
+
+    def test_compaction_while_adding_faces_together(self):
+        self.storage.compact_every = 2
+        data = self.storage.load()
+        new_faces = [self.make_face(_id) for _id in 'abc']
+        for face in new_faces:
+            data.add_face(face, save_backup=False)
+        self.storage.faces_added(data, new_faces)
+        self.storage.close()
+
+        # The snapshot taken after the second face includes the third, so it isn't journaled again
+        self.assertEqual(list('abc'), [loaded_face._id for loaded_face in JournalStorage(self.filename).load()])
+
+    def test_compaction_with_queued_writes(self):
+        self.storage.compact_every = 2
+        data = self.storage.load()
+        data.work_queue = WorkQueue()
+
+        # Hold back storage writes until every face has been added, so compaction sees faces still queued
+        release = threading.Event()
+        data.work_queue.submit(STORAGE, release.wait)
+        for _id in '012':
+            data.add_face(self.make_face(_id))
+        release.set()
+        data.close()
+        self.storage.close()
+
+        self.assertEqual(list('012'), [loaded_face._id for loaded_face in JournalStorage(self.filename).load()])
+
+    def test_save_with_queued_writes(self):
+        data = self.storage.load()
+        data.work_queue = WorkQueue()
+
+        release = threading.Event()
+        data.work_queue.submit(STORAGE, release.wait)
+        face = self.make_face('a')
+        data.add_face(face)
+        data.add_message(face, "hello")
+        data.save()
+        release.set()
+        data.close()
+        self.storage.close()
+
+        loaded_data = JournalStorage(self.filename).load()
+        self.assertEqual(['a'], [loaded_face._id for loaded_face in loaded_data])
+        self.assertEqual(["hello"], loaded_data.faces[0].messages)
+
+    def test_quiet_journal_is_synced_by_timer(self):
+        storage = JournalStorage(self.filename, sync_every=100, sync_interval_seconds=0.01)
+        data = storage.load()
+        data.add_face(self.make_face('a'))
+        self.assertEqual(1, storage._unsynced_records)
+
+        deadline = time.monotonic() + 5
+        while storage._unsynced_records and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(0, storage._unsynced_records)
+
+        # Closing the faces closes their storage
+        data.close()
+        self.assertIsNone(storage._journal_file)
+
+    def test_torn_record_is_dropped(self):
+        data = self.storage.load()
+        data.add_face(self.make_face('a'))
+        data.add_face(self.make_face('b'))
+        self.storage.close()
+
+        # Simulate a power loss part way through writing the last record
+        journal_size = os.path.getsize(self.storage.journal_filepath)
+        with open(self.storage.journal_filepath, 'r+b') as journal_file:
+            journal_file.truncate(journal_size - 10)
+
+        loaded_storage = JournalStorage(self.filename)
+        loaded_data = loaded_storage.load()
+        self.assertEqual(['a'], [loaded_face._id for loaded_face in loaded_data])
+
+        # Records appended after the torn one are still readable
+        loaded_data.add_face(self.make_face('c'))
+        loaded_storage.close()
+        self.assertEqual(['a', 'c'], [loaded_face._id for loaded_face in JournalStorage(self.filename).load()])
+
+    def tearDown(self):
+        self.storage.close()
+
+        # Delete backups between tests
+        for filepath in (self.storage.snapshot_filepath, self.storage.journal_filepath):
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
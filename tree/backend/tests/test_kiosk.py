@@ -0,0 +1,110 @@
+import asyncio
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.faces as faces
+from tree.backend.kiosk import AsyncKiosk, Visitor
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ScriptedFaces(object):
+    """Stands in for `faces.Faces`, returning a scripted list of frame faces from each snap"""
+
+    def __init__(self, snaps: list):
+        self.snaps = snaps
+
+    def snap_faces(self, detection_scale=None, cam=None, tracker=None) -> list:
+        if not self.snaps:
+            raise faces.FaceNotFoundException
+        frame_faces = self.snaps.pop(0)
+        if not frame_faces:
+            raise faces.FaceNotFoundException
+        return frame_faces
+
+    def wait_for(self, face):
+        pass
+
+
+class TestAsyncKiosk(TestCase):
+    def setUp(self):
+        self.alice = faces.Face('alice', np.zeros(128))
+        self.bob = faces.Face('bob', np.ones(128))
+        self.clock = FakeClock()
+
+    def kiosk(self, f, interaction) -> AsyncKiosk:
+        k = AsyncKiosk(f, cam=None, interaction=interaction, retry_seconds=0, clock=self.clock)
+        self.addCleanup(k.close)
+        return k
+
+    def test_next_visitor_is_detected_during_interaction(self):
+        f = ScriptedFaces([
+            [faces.FrameFace(self.alice, True, None)],
+            [],
+            [faces.FrameFace(self.bob, False, None)],
+        ])
+        greeted = []
+
+        async def interaction(k, visitor):
+            # Wait until detection of the next visitor has started on the recognition thread
+            while len(f.snaps) > 1:
+                await asyncio.sleep(0.001)
+            greeted.append(visitor)
+
+        asyncio.run(self.kiosk(f, interaction).run(visitors=2))
+
+        self.assertEqual([Visitor(self.alice, True), Visitor(self.bob, False)], greeted)
+
+    def test_visitor_being_greeted_is_skipped(self):
+        f = ScriptedFaces([
+            [faces.FrameFace(self.alice, True, None)],
+            [faces.FrameFace(self.alice, False, None)],
+            [faces.FrameFace(self.alice, False, None), faces.FrameFace(self.bob, False, None)],
+        ])
+        greeted = []
+
+        async def interaction(k, visitor):
+            greeted.append(visitor.face._id)
+
+        asyncio.run(self.kiosk(f, interaction).run(visitors=2))
+
+        self.assertEqual(['alice', 'bob'], greeted)
+
+    def test_visitors_in_view_together_are_each_greeted_once(self):
+        carol = faces.Face('carol', np.full(128, 2.0))
+        both = [faces.FrameFace(self.alice, False, None), faces.FrameFace(self.bob, False, None)]
+        f = ScriptedFaces([both, both, both, both, [faces.FrameFace(carol, False, None)]])
+        greeted = []
+
+        async def interaction(k, visitor):
+            greeted.append(visitor.face._id)
+
+        asyncio.run(self.kiosk(f, interaction).run(visitors=3))
+
+        self.assertEqual(['alice', 'bob', 'carol'], greeted)
+
+    def test_new_visitors_in_one_frame_are_each_greeted(self):
+        f = ScriptedFaces([[faces.FrameFace(self.alice, True, None), faces.FrameFace(self.bob, True, None)]])
+        greeted = []
+
+        async def interaction(k, visitor):
+            greeted.append(visitor)
+
+        asyncio.run(self.kiosk(f, interaction).run(visitors=2))
+
+        self.assertEqual([Visitor(self.alice, True), Visitor(self.bob, True)], greeted)
+
+    def test_visitor_is_greeted_again_after_revisit_interval(self):
+        k = self.kiosk(ScriptedFaces([]), None)
+        k._set_greeted('alice', self.clock.now + k.revisit_seconds)
+
+        self.assertTrue(k._is_greeted(self.alice))
+        self.clock.now += k.revisit_seconds
+        self.assertFalse(k._is_greeted(self.alice))
@@ -0,0 +1,32 @@
+import subprocess
+import sys
+from unittest import TestCase
+
+import tree.backend.lazy_import as lazy_import
+
+
+class TestLazyImport(TestCase):
+    def test_module_is_imported_on_first_attribute_access(self):
+        sys.modules.pop('colorsys', None)
+        colorsys = lazy_import.lazy_import('colorsys')
+
+        self.assertFalse(lazy_import.is_loaded(colorsys))
+        self.assertNotIn('colorsys', sys.modules)
+
+        self.assertEqual((0.0, 0.0, 1.0), colorsys.rgb_to_hsv(1, 1, 1))
+        self.assertTrue(lazy_import.is_loaded(colorsys))
+        self.assertIs(sys.modules['colorsys'].rgb_to_hsv, colorsys.rgb_to_hsv)
+
+    def test_imported_modules_are_returned_as_they_are(self):
+        self.assertIs(sys, lazy_import.lazy_import('sys'))
+
+    def test_loading_storage_defers_heavy_imports(self):
+        heavy_modules = ['face_recognition', 'cv2', 'PIL.Image', 'pyASCIIgenerator', 'pyaudio']
+        script = (
+            "import sys\n"
+            "import tree.backend.storage.pickle_storage, tree.backend.server, tree.backend.message_store\n"
+            "print([name for name in {} if name in sys.modules])\n".format(heavy_modules))
+
+        output = subprocess.run([sys.executable, '-c', script], check=True, stdout=subprocess.PIPE).stdout
+
+        self.assertEqual(b"[]", output.strip())
@@ -0,0 +1,97 @@
+import os
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+import tree.backend.maintenance as maintenance
+from tree.backend.storage.pickle_storage import PickleStorage
+
+
+def face_with_messages(_id: str, encoding, messages: list) -> "faces.Face":
+    face = faces.Face(_id, encoding)
+    face.messages = messages
+    return face
+
+
+class TestMaintenance(TestCase):
+    def setUp(self):
+        self.storage = PickleStorage(constants.test_pickle_storage_filename)
+        self.faces = faces.Faces(storage=self.storage)
+        self.created_filepaths = []
+
+    def tearDown(self):
+        for filepath in self.created_filepaths:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+        if os.path.exists(self.storage.backup_filepath):
+            os.remove(self.storage.backup_filepath)
+
+    def touch(self, folder: str, filename: str) -> str:
+        filepath = os.path.join(folder, filename)
+        open(filepath, 'w').close()
+        self.created_filepaths.append(filepath)
+        return filepath
+
+    def test_find_duplicate_groups_does_not_follow_chains_of_matches(self):
+        base = np.zeros(128)
+        step = np.zeros(128)
+        step[0] = 0.5
+        far = np.ones(128)
+
+        # Rows 0, 2 and 3 form a chain of matches, but rows 0 and 3 are further apart than the tolerance
+        encodings = np.array([base, far, base + step, base + 2 * step, far + step / 10])
+        groups = maintenance.find_duplicate_groups(encodings, tolerance=0.6, chunk_size=2)
+
+        self.assertEqual([[0, 2], [1, 4]], [list(group) for group in groups])
+
+    def test_merge_duplicates_keeps_oldest_face_and_messages(self):
+        encoding = np.zeros(128)
+        other_encoding = np.ones(128)
+        self.faces.add_face(face_with_messages('oldest', encoding.copy(), ['a']), save_backup=False)
+        self.faces.add_face(faces.Face('other', other_encoding), save_backup=False)
+        self.faces.add_face(face_with_messages('newest', encoding + 0.01, ['b', 'c']), save_backup=False)
+
+        merged = maintenance.merge_duplicates(self.faces)
+
+        self.assertEqual(['newest'], [face._id for face in merged])
+        self.assertEqual(['oldest', 'other'], [face._id for face in self.faces.faces])
+        self.assertEqual(['a', 'b', 'c'], self.faces.faces[0].messages)
+        self.assertEqual(['oldest', 'other'], list(self.faces.encoding_index.ids))
+        self.assertEqual('other', self.faces.get_face_from_encoding(other_encoding)._id)
+
+    def test_merge_duplicates_dry_run_changes_nothing(self):
+        self.faces.add_face(face_with_messages('a', np.zeros(128), ['a']), save_backup=False)
+        self.faces.add_face(face_with_messages('b', np.zeros(128), ['b']), save_backup=False)
+
+        merged = maintenance.merge_duplicates(self.faces, dry_run=True)
+
+        self.assertEqual(['b'], [face._id for face in merged])
+        self.assertEqual(2, len(self.faces.faces))
+        self.assertEqual(['a'], self.faces.faces[0].messages)
+
+    def test_collect_garbage_removes_only_unreferenced_files(self):
+        self.faces.add_face(faces.Face('kept', np.zeros(128)), save_backup=False)
+
+        kept = [
+            self.touch(constants.fresh_photos_filepath, 'kept' + constants.fresh_photos_extension),
+            self.touch(
+                constants.renditions_filepath, 'kept' + constants.thumbnail_suffix + constants.thumbnail_extension),
+        ]
+        orphaned = [
+            self.touch(constants.fresh_photos_filepath, 'orphan' + constants.fresh_photos_extension),
+            self.touch(constants.cropped_faces_filepath, 'orphan' + constants.cropped_face_extension),
+            self.touch(constants.renditions_filepath, 'orphan' + constants.ascii_art_extension),
+        ]
+
+        self.assertEqual(sorted(orphaned), sorted(maintenance.collect_garbage(self.faces, dry_run=True)))
+        self.assertTrue(all(os.path.exists(filepath) for filepath in orphaned))
+
+        removed = maintenance.collect_garbage(self.faces)
+
+        self.assertEqual(sorted(orphaned), sorted(removed))
+        self.assertTrue(all(os.path.exists(filepath) for filepath in kept))
+        self.assertFalse(any(os.path.exists(filepath) for filepath in orphaned))
+        self.assertTrue(os.path.exists(os.path.join(constants.renditions_filepath, '__init__.py')))
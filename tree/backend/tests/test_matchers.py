@@ -0,0 +1,137 @@
+import threading
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.benchmarks as benchmarks
+import tree.backend.faces as faces
+from tree.backend.encoding_index import EncodingIndex
+from tree.backend.matchers.brute_force import BruteForceMatcher
+from tree.backend.matchers.ivf import IVFMatcher
+from tree.backend.matchers.quantized import QuantizedMatcher
+from tree.backend.work_queue import MATCHER, WorkQueue
+
+
+class TestMatchers(TestCase):
+    def setUp(self):
+        self.random = np.random.default_rng(0)
+        self.encodings = benchmarks.synthetic_encodings(2000, self.random)
+        self.queries = benchmarks.perturbed(self.encodings[:50], self.random)
+
+    def build_incrementally(self, matcher):
+        index = EncodingIndex()
+        matcher.build(index)
+        for _id, encoding in enumerate(self.encodings):
+            matcher.add(index.add(str(_id), encoding))
+            # As `Faces` does without a work queue
+            if matcher.training_due:
+                matcher.train()
+        return index
+
+    def test_brute_force_finds_nearest(self):
+        matcher = BruteForceMatcher()
+        index = self.build_incrementally(matcher)
+
+        for expected_row, query in enumerate(self.queries):
+            row, distance = matcher.nearest(query)
+            self.assertEqual(expected_row, row)
+            self.assertAlmostEqual(np.linalg.norm(index.encodings[row] - query), distance)
+
+    def test_ivf_untrained_falls_back_to_exact_search(self):
+        matcher = IVFMatcher(min_train_size=len(self.encodings) + 1)
+        self.build_incrementally(matcher)
+
+        self.assertFalse(matcher.trained)
+        self.assertEqual(0, matcher.nearest(self.queries[0])[0])
+
+    def test_ivf_incremental_updates_are_searchable(self):
+        matcher = IVFMatcher(min_train_size=500)
+        index = self.build_incrementally(matcher)
+
+        self.assertTrue(matcher.trained)
+        # Every row lives in exactly one bucket
+        self.assertEqual(len(index), int(matcher._bucket_sizes.sum()))
+
+        # Probing every bucket makes the search exact
+        matcher.probes = len(matcher.centroids)
+        for expected_row, query in enumerate(self.queries):
+            self.assertEqual(expected_row, matcher.nearest(query)[0])
+
+    def test_ivf_empty_buckets_fall_back_to_exact_search(self):
+        matcher = IVFMatcher(min_train_size=500, probes=1)
+        self.build_incrementally(matcher)
+
+        # Simulate the query's nearest bucket having been left empty by k-means
+        query = self.queries[0]
+        matcher._bucket_sizes[np.argmin(np.linalg.norm(matcher.centroids - query, axis=1))] = 0
+        self.assertEqual(0, len(matcher.candidates(query)))
+        self.assertEqual(0, matcher.nearest(query)[0])
+
+    def test_ivf_trains_on_the_work_queue(self):
+        data = faces.Faces(matcher=IVFMatcher(min_train_size=500))
+        data.work_queue = WorkQueue()
+
+        # Hold back training until every face has been added
+        release = threading.Event()
+        data.work_queue.submit(MATCHER, release.wait)
+        for _id, encoding in enumerate(self.encodings):
+            data.add_face(faces.Face(str(_id), encoding), save_backup=False)
+
+        self.assertFalse(data.matcher.trained)
+        self.assertEqual('0', data.get_face_from_encoding(self.queries[0])._id)
+
+        release.set()
+        data.work_queue.drain()
+        self.assertTrue(data.matcher.trained)
+        # Rows added while it was fitting are in the buckets too
+        self.assertEqual(len(self.encodings), int(data.matcher._bucket_sizes.sum()))
+        data.close()
+
+    def test_ivf_recall(self):
+        matcher = IVFMatcher(min_train_size=500, probes=8)
+        self.build_incrementally(matcher)
+
+        rows = [matcher.nearest(query)[0] for query in self.queries]
+        recall = np.mean(np.array(rows) == np.arange(len(self.queries)))
+        self.assertGreaterEqual(recall, 0.9)
+
+    def test_nearest_many(self):
+        for matcher in (BruteForceMatcher(), IVFMatcher(min_train_size=500), QuantizedMatcher()):
+            self.build_incrementally(matcher)
+
+            rows, distances = matcher.nearest_many(self.queries)
+            for query, row, distance in zip(self.queries, rows, distances):
+                self.assertEqual(matcher.nearest(query), (int(row), float(distance)))
+
+    def test_quantized_matches_brute_force(self):
+        far_queries = self.random.normal(scale=0.5, size=(10, self.encodings.shape[1]))
+        matcher = QuantizedMatcher("int8")
+        index = self.build_incrementally(matcher)
+        brute_force = BruteForceMatcher()
+        brute_force.build(index)
+
+        for query in np.concatenate([self.queries, far_queries]):
+            self.assertEqual(brute_force.nearest(query), matcher.nearest(query))
+
+    def test_quantized_refits_on_outliers(self):
+        fitted = 100
+        matcher = QuantizedMatcher("int8")
+        index = EncodingIndex.from_matrix([str(_id) for _id in range(fitted)], self.encodings[:fitted])
+        matcher.build(index)
+        quantizer = matcher.quantizer
+
+        # Far outside the fitted range, so its code is clipped and the error bound loosens until the next refit
+        outlier = self.encodings[0] * 10
+        outlier_row = index.add("outlier", outlier)
+        matcher.add(outlier_row)
+        self.assertIs(quantizer, matcher.quantizer)
+        self.assertGreater(matcher.max_error, matcher.fit_error)
+        self.assertEqual(outlier_row, matcher.nearest(outlier)[0])
+
+        # Refits are a doubling of the index apart
+        for row in range(outlier_row + 1, 2 * fitted):
+            matcher.add(index.add(str(row), self.encodings[row]))
+
+        self.assertIsNot(quantizer, matcher.quantizer)
+        self.assertEqual(len(index), len(matcher.codes))
+        self.assertEqual(outlier_row, matcher.nearest(outlier)[0])
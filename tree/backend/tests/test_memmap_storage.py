@@ -0,0 +1,148 @@
+import os
+import shutil
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+from tree.backend.storage.memmap_storage import MemmapStorage
+
+
+class TestMemmapStorage(TestCase):
+    def setUp(self):
+        self.storage = MemmapStorage(constants.test_pickle_storage_filename)
+        self.random = np.random.default_rng(0)
+
+    def make_face(self, _id: str) -> "faces.Face":
+        return faces.Face(_id, self.random.normal(scale=0.1, size=128))
+
+    def test_load_without_existing_backup(self):
+        loaded_data = self.storage.load()
+
+        self.assertTrue(isinstance(loaded_data, faces.Faces))
+        self.assertEqual(0, len(loaded_data.faces))
+
+    def test_faces_are_created_lazily(self):
+        data = self.storage.load()
+        face_a, face_b = self.make_face('a'), self.make_face('b')
+        data.add_face(face_a)
+        data.add_face(face_b)
+        data.add_message(face_b, "first")
+        data.add_message(face_b, "second")
+        self.assertEqual("second", data.consume_message(face_b))
+
+        loaded_data = self.storage.load()
+        self.assertEqual(0, len(loaded_data.faces.materialized))
+
+        matched_face = loaded_data.get_face_from_encoding(face_b.encoding)
+        self.assertEqual('b', matched_face._id)
+        self.assertEqual(["first"], matched_face.messages)
+        self.assertEqual([1], list(loaded_data.faces.materialized))
+
+        np.testing.assert_array_equal(face_a.encoding, loaded_data.faces[0].encoding)
+
+    def test_faces_added_after_load_are_persisted(self):
+        data = self.storage.load()
+        data.add_face(self.make_face('a'))
+
+        loaded_data = self.storage.load()
+        loaded_data.add_face(self.make_face('b'))
+
+        self.assertEqual(['a', 'b'], [face._id for face in self.storage.load()])
+
+    def test_faces_added_after_load_leave_the_map_in_place(self):
+        data = self.storage.load()
+        for _id in 'ab':
+            data.add_face(self.make_face(_id))
+
+        loaded_data = self.storage.load()
+        loaded_data.add_face(self.make_face('c'))
+
+        self.assertIsInstance(loaded_data.encoding_index.rows(0, 2), np.memmap)
+        self.assertEqual('c', loaded_data.get_face_from_encoding(loaded_data.faces[2].encoding)._id)
+
+    def test_faces_added_together_are_appended(self):
+        data = self.storage.load()
+        data.add_face(self.make_face('a'))
+        loaded_data = self.storage.load()
+
+        new_faces = [self.make_face(_id) for _id in 'bc']
+        new_faces[1].add_message("hello")
+        for face in new_faces:
+            loaded_data.add_face(face, save_backup=False)
+        self.storage.faces_added(loaded_data, new_faces)
+
+        reloaded_data = self.storage.load()
+        self.assertEqual(['a', 'b', 'c'], [face._id for face in reloaded_data])
+        np.testing.assert_array_equal(new_faces[0].encoding, reloaded_data.faces[1].encoding)
+        self.assertEqual(["hello"], reloaded_data.faces[2].messages)
+
+    def test_torn_append_is_dropped(self):
+        data = self.storage.load()
+        data.add_face(self.make_face('a'))
+
+        # Simulate a crash after the encoding was appended but before its id was
+        with open(self.storage.encodings_filepath, 'ab') as encodings_file:
+            encodings_file.write(b"\0" * 100)
+
+        loaded_data = self.storage.load()
+        loaded_data.add_face(self.make_face('b'))
+
+        reloaded_data = self.storage.load()
+        self.assertEqual(['a', 'b'], [face._id for face in reloaded_data])
+        np.testing.assert_array_equal(loaded_data.faces[1].encoding, reloaded_data.faces[1].encoding)
+
+    def test_save_rewrites_everything(self):
+        face = self.make_face('a')
+        face.add_message("hello")
+        self.storage.save(faces.Faces([face]))
+
+        loaded_data = self.storage.load()
+        self.assertEqual(['a'], [loaded_face._id for loaded_face in loaded_data])
+        self.assertEqual(["hello"], loaded_data.faces[0].messages)
+
+    def test_quantized_codes_are_persisted(self):
+        quantized_storage = MemmapStorage(constants.test_pickle_storage_filename, quantization_kind="int8")
+        data = quantized_storage.load()
+        added_faces = [self.make_face(str(i)) for i in range(20)]
+        for face in added_faces:
+            data.add_face(face)
+
+        loaded_data = MemmapStorage(constants.test_pickle_storage_filename, quantization_kind="int8").load()
+        np.testing.assert_array_equal(data.matcher.codes, loaded_data.matcher.codes)
+        self.assertEqual(data.matcher.max_error, loaded_data.matcher.max_error)
+        self.assertEqual(
+            len(added_faces) * constants.face_encoding_dimensions, os.path.getsize(quantized_storage.codes_filepath))
+
+        for face in added_faces:
+            self.assertEqual(face._id, loaded_data.get_face_from_encoding(face.encoding)._id)
+
+        # Matching and adding only read the candidates from the map, rather than scanning it
+        loaded_data.add_face(self.make_face('new'))
+        self.assertEqual('new', loaded_data.get_face_from_encoding(loaded_data.faces[-1].encoding)._id)
+        self.assertIsInstance(loaded_data.encoding_index.rows(0, len(added_faces)), np.memmap)
+        self.assertIsNone(loaded_data.encoding_index._base_squared_norms)
+
+    def test_missing_codes_are_refit(self):
+        data = self.storage.load()
+        face = self.make_face('a')
+        data.add_face(face)
+
+        loaded_data = MemmapStorage(constants.test_pickle_storage_filename, quantization_kind="int8").load()
+        self.assertEqual(1, len(loaded_data.matcher.codes))
+        self.assertTrue(os.path.exists(self.storage.quantizer_filepath))
+        self.assertEqual('a', loaded_data.get_face_from_encoding(face.encoding)._id)
+
+    def tearDown(self):
+        # Delete backups between tests
+        for filepath in (
+                self.storage.encodings_filepath,
+                self.storage.ids_filepath,
+                self.storage.codes_filepath,
+                self.storage.quantizer_filepath):
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+        shutil.rmtree(self.storage.messages_filepath, ignore_errors=True)
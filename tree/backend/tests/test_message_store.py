@@ -0,0 +1,114 @@
+import io
+import os
+import uuid
+import wave
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+from tree.backend.message_store import MessageStore
+
+
+def recording(frames: int = 16000, noise: bool = False) -> bytes:
+    """Returns a mono 16 bit wave file of a quiet tone, or of full scale noise, which `lzma` can't shrink at all"""
+    if noise:
+        samples = np.random.default_rng(0).integers(-2 ** 15, 2 ** 15, size=frames, dtype=np.int16)
+    else:
+        samples = (np.sin(np.arange(frames) / 10) * 1000).astype(np.int16)
+    data = io.BytesIO()
+    with wave.open(data, 'wb') as wave_file:
+        wave_file.setnchannels(1)
+        wave_file.setsampwidth(2)
+        wave_file.setframerate(16000)
+        wave_file.writeframes(samples.tobytes())
+    return data.getvalue()
+
+
+class TestMessageStore(TestCase):
+    def setUp(self):
+        self.store = MessageStore()
+        self.filenames = []
+
+    def tearDown(self):
+        self.store.close()
+        for filename in self.filenames:
+            for filepath in (self.store.recording_filepath(filename), self.store.compressed_filepath(filename)):
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+
+    def record(self, data: bytes) -> str:
+        filename = str(uuid.uuid4()) + constants.saved_audio_recording_extension
+        with open(self.store.recording_filepath(filename), 'wb') as recording_file:
+            recording_file.write(data)
+        self.filenames.append(filename)
+        return filename
+
+    def test_compress_replaces_recording(self):
+        data = recording()
+        filename = self.record(data)
+
+        self.store.compress(filename).result()
+
+        self.assertFalse(os.path.exists(self.store.recording_filepath(filename)))
+        self.assertEqual(data, self.store.load(filename))
+
+    def test_incompressible_recording_is_kept(self):
+        data = recording(noise=True)
+        filename = self.record(data)
+
+        self.store.compress(filename).result()
+
+        self.assertTrue(os.path.exists(self.store.recording_filepath(filename)))
+        self.assertFalse(os.path.exists(self.store.compressed_filepath(filename)))
+        self.assertEqual(data, self.store.load(filename))
+
+    def test_load_reads_uncompressed_recordings(self):
+        data = recording()
+        filename = self.record(data)
+
+        self.assertEqual(data, self.store.load(filename))
+
+    def test_prefetched_messages_load_from_memory(self):
+        data = recording()
+        filename = self.record(data)
+        self.store.compress(filename).result()
+
+        self.store.prefetch([filename])
+        self.store.close()
+        os.remove(self.store.compressed_filepath(filename))
+
+        self.assertEqual(data, self.store.load(filename))
+        self.assertEqual(1, self.store.hits)
+
+        self.store.release(filename)
+        self.assertEqual(0, self.store.current_bytes)
+
+    def test_prefetch_evicts_least_recently_used(self):
+        data = recording()
+        first, second, third = [self.record(data) for _ in range(3)]
+
+        # One worker decodes messages in the order they're prefetched
+        self.store.close()
+        self.store = MessageStore(prefetch_max_bytes=2 * len(data), max_workers=1)
+        self.store.prefetch([first, second, third])
+        self.store.close()
+
+        self.assertEqual([second, third], list(self.store._buffer))
+        self.assertEqual(2 * len(data), self.store.current_bytes)
+        self.assertEqual(1, self.store.evictions)
+
+    def test_matched_faces_are_prefetched(self):
+        data = recording()
+        filename = self.record(data)
+        f = faces.Faces()
+        face = faces.Face('a', np.zeros(128))
+        f.add_face(face, save_backup=False)
+        f.add_message(face, filename, save_backup=False)
+
+        self.store.watch(f)
+        f.get_face_from_encoding(np.zeros(128))
+        self.store.close()
+
+        self.assertEqual([filename], list(self.store._buffer))
@@ -0,0 +1,90 @@
+import json
+import os
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+import tree.backend.metrics as metrics
+from tree.backend.storage.pickle_storage import PickleStorage
+
+
+class TestMetrics(TestCase):
+    def setUp(self):
+        self.metrics = metrics.Metrics(enabled=True)
+
+    def test_disabled_metrics_record_nothing(self):
+        disabled = metrics.Metrics(enabled=False)
+
+        self.assertIs(metrics.NULL_TIMER, disabled.time('stage'))
+        with disabled.time('stage'):
+            pass
+        disabled.increment('counter')
+        disabled.observe('stage', 1.0)
+
+        self.assertEqual({'counters': {}, 'histograms': {}}, disabled.snapshot())
+
+    def test_timer_observes_duration(self):
+        with self.metrics.time('stage'):
+            pass
+        with self.metrics.time('stage'):
+            pass
+
+        histogram = self.metrics.histograms['stage']
+        self.assertEqual(2, histogram.count)
+        self.assertGreaterEqual(histogram.sum, 0)
+
+    def test_percentiles(self):
+        for value in range(1, 101):
+            self.metrics.observe('stage', value)
+
+        percentiles = self.metrics.snapshot()['histograms']['stage']['percentiles']
+
+        self.assertAlmostEqual(np.percentile(np.arange(1, 101), 50), percentiles['p50'])
+        self.assertAlmostEqual(np.percentile(np.arange(1, 101), 95), percentiles['p95'])
+        self.assertAlmostEqual(np.percentile(np.arange(1, 101), 99), percentiles['p99'])
+
+    def test_histograms_keep_recent_samples_and_total_count(self):
+        bounded = metrics.Metrics(enabled=True, max_samples=10)
+        for value in range(100):
+            bounded.observe('stage', value)
+
+        histogram = bounded.histograms['stage']
+        self.assertEqual(100, histogram.count)
+        self.assertEqual(sum(range(100)), histogram.sum)
+        self.assertEqual(list(range(90, 100)), list(histogram.samples))
+
+    def test_exports(self):
+        self.metrics.increment('faces_not_found')
+        self.metrics.increment('faces_not_found', 2)
+        self.metrics.observe('face_locations', 0.25)
+
+        snapshot = json.loads(self.metrics.to_json())
+        self.assertEqual({'faces_not_found': 3}, snapshot['counters'])
+        self.assertEqual(1, snapshot['histograms']['face_locations']['count'])
+
+        prometheus = self.metrics.to_prometheus(prefix='tree').splitlines()
+        self.assertIn('# TYPE tree_faces_not_found_total counter', prometheus)
+        self.assertIn('tree_faces_not_found_total 3', prometheus)
+        self.assertIn('tree_face_locations_seconds{quantile="0.99"} 0.25', prometheus)
+        self.assertIn('tree_face_locations_seconds_count 1', prometheus)
+
+    def test_storage_bytes_written(self):
+        storage = PickleStorage(constants.test_pickle_storage_filename)
+        f = faces.Faces(storage=storage)
+        f.add_face(faces.Face('a', np.zeros(128)), save_backup=False)
+
+        enabled = metrics.metrics.enabled
+        metrics.metrics.enabled = True
+        metrics.metrics.reset()
+        try:
+            f.save()
+            snapshot = metrics.metrics.snapshot()
+        finally:
+            metrics.metrics.enabled = enabled
+            metrics.metrics.reset()
+            os.remove(storage.backup_filepath)
+
+        self.assertGreater(snapshot['counters']['storage_bytes_written'], 128 * 8)
+        self.assertEqual(1, snapshot['histograms']['save']['count'])
@@ -0,0 +1,49 @@
+from unittest import TestCase
+
+import numpy as np
+
+from tree.backend.prefilter import BrightnessGate, MotionGate, PreFilter, SharpnessGate
+
+
+class TestPreFilter(TestCase):
+    def setUp(self):
+        self.random = np.random.default_rng(0)
+        self.textured = self.random.integers(40, 200, size=(240, 320, 3), dtype=np.uint8)
+        self.dark = np.zeros((240, 320, 3), dtype=np.uint8)
+        self.flat = np.full((240, 320, 3), 128, dtype=np.uint8)
+
+    def test_brightness_gate_drops_dark_frames(self):
+        pre_filter = PreFilter([BrightnessGate()])
+
+        self.assertFalse(pre_filter.accepts(self.dark))
+        self.assertTrue(pre_filter.accepts(self.textured))
+        self.assertEqual({"seen": 2, "dropped": 1}, pre_filter.counters["brightness"])
+
+    def test_sharpness_gate_drops_featureless_frames(self):
+        pre_filter = PreFilter([SharpnessGate()])
+
+        self.assertFalse(pre_filter.accepts(self.flat))
+        self.assertTrue(pre_filter.accepts(self.textured))
+
+    def test_motion_gate_only_drops_frames_matching_an_empty_scene(self):
+        pre_filter = PreFilter([MotionGate()])
+
+        # The detector found a face, so an identical frame is still worth detecting on
+        self.assertTrue(pre_filter.accepts(self.textured))
+        pre_filter.record_detection(True)
+        self.assertTrue(pre_filter.accepts(self.textured))
+
+        # Once the detector finds the scene empty, identical frames are dropped until something changes
+        pre_filter.record_detection(False)
+        self.assertFalse(pre_filter.accepts(self.textured))
+        self.assertTrue(pre_filter.accepts(self.random.integers(40, 200, size=(240, 320, 3), dtype=np.uint8)))
+
+        self.assertEqual({"seen": 2, "dropped": 1}, pre_filter.counters["detector"])
+        self.assertEqual({"seen": 4, "dropped": 1}, pre_filter.counters["motion"])
+
+    def test_first_rejecting_gate_stops_the_chain(self):
+        pre_filter = PreFilter()
+
+        self.assertFalse(pre_filter.accepts(self.dark))
+        self.assertEqual(1, pre_filter.counters["brightness"]["dropped"])
+        self.assertEqual(0, pre_filter.counters["sharpness"]["seen"])
@@ -0,0 +1,61 @@
+import contextlib
+import io
+import os
+from unittest import TestCase
+
+import numpy as np
+import pyASCIIgenerator
+from PIL import Image
+
+import tree.backend.constants as constants
+import tree.backend.renditions as renditions
+
+TEST_ID = "unit_test_rendition"
+
+
+class TestRenditions(TestCase):
+    def setUp(self):
+        pixels = np.random.default_rng(0).integers(0, 256, size=(80, 60, 3), dtype=np.uint8)
+        self.image = Image.fromarray(pixels)
+        self.cropped_image_filepath = os.path.join(constants.cropped_faces_filepath, TEST_ID + ".png")
+        self.image.save(self.cropped_image_filepath)
+
+    def test_ascii_art_matches_asciify(self):
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            pyASCIIgenerator.asciify(self.cropped_image_filepath)
+
+        self.assertEqual(printed.getvalue().rstrip("\n"), renditions.ascii_art_from_image(self.image))
+
+    def test_renditions_are_generated_once(self):
+        renditions.generate_renditions(TEST_ID, self.image)
+        self.assertTrue(os.path.exists(renditions.ascii_art_filepath(TEST_ID)))
+        self.assertTrue(os.path.exists(renditions.thumbnail_filepath(TEST_ID)))
+
+        # Remove the source image. Renditions must come from what was saved at enrollment
+        os.remove(self.cropped_image_filepath)
+        renditions.invalidate(TEST_ID)
+
+        self.assertEqual(
+            renditions.ascii_art_from_image(self.image),
+            renditions.load_ascii_art(TEST_ID, self.cropped_image_filepath))
+        thumbnail = renditions.load_thumbnail(TEST_ID, self.cropped_image_filepath)
+        self.assertLessEqual(thumbnail.size[0], constants.thumbnail_size[0])
+        self.assertLessEqual(thumbnail.size[1], constants.thumbnail_size[1])
+
+    def test_missing_renditions_are_generated_on_demand(self):
+        ascii_art = renditions.load_ascii_art(TEST_ID, self.cropped_image_filepath)
+
+        self.assertEqual(renditions.ascii_art_from_image(self.image), ascii_art)
+        self.assertTrue(os.path.exists(renditions.ascii_art_filepath(TEST_ID)))
+
+    def tearDown(self):
+        renditions.invalidate(TEST_ID)
+        for filepath in (
+                self.cropped_image_filepath,
+                renditions.ascii_art_filepath(TEST_ID),
+                renditions.thumbnail_filepath(TEST_ID)):
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,97 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+from tree.backend.remote_faces import NotSupportedRemotelyError, RemoteError, RemoteFaces
+from tree.backend.server import RecognitionServer
+from tree.backend.storage.pickle_storage import PickleStorage
+
+
+class TestRecognitionServer(TestCase):
+    def setUp(self):
+        self.storage = PickleStorage(constants.test_pickle_storage_filename)
+        self.faces = faces.Faces(storage=self.storage)
+        self.faces.add_face(faces.Face('known', np.zeros(128)), save_backup=False)
+
+        # Port 0 picks any free port on localhost
+        self.server = RecognitionServer(self.faces, ('127.0.0.1', 0))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.remote = RemoteFaces(self.server.server_address)
+
+    def tearDown(self):
+        self.remote.close()
+        self.server.shutdown()
+        self.server.server_close()
+        if os.path.exists(self.storage.backup_filepath):
+            os.remove(self.storage.backup_filepath)
+
+    def test_match(self):
+        self.assertEqual('known', self.remote.get_face_from_encoding(np.full(128, 0.01))._id)
+
+        with self.assertRaises(faces.NoMatchingFaceFoundException):
+            self.remote.get_face_from_encoding(np.ones(128))
+
+        matched = self.remote.match_encodings(np.array([np.ones(128), np.zeros(128)]))
+        self.assertIsNone(matched[0])
+        self.assertEqual('known', matched[1]._id)
+
+    def test_add_face_is_recorded_on_the_server(self):
+        self.remote.add_face(faces.Face('new', np.ones(128)))
+
+        self.assertEqual(['known', 'new'], [face._id for face in self.faces])
+        self.assertEqual('new', self.remote.get_face_from_encoding(np.ones(128))._id)
+        self.assertTrue(os.path.exists(self.storage.backup_filepath))
+
+    def test_messages(self):
+        face = self.remote.get_face('known')
+
+        self.remote.add_message(face, 'first')
+        self.remote.add_message(face, 'second')
+        self.assertEqual(['first', 'second'], face.messages)
+        self.assertEqual(['first', 'second'], self.faces.faces[0].messages)
+
+        self.assertEqual('second', self.remote.consume_message(face))
+        self.assertEqual(['first'], face.messages)
+        self.assertEqual(['first'], self.remote.get_face('known').messages)
+
+    def test_batched_calls(self):
+        results = self.remote.call_many([
+            ('match', {'encodings': [np.zeros(128).tolist()]}),
+            ('add_message', {'id': 'known', 'message': 'hello'}),
+            ('face', {'id': 'known'}),
+        ])
+
+        self.assertEqual('known', results[0][0]['id'])
+        self.assertEqual(['hello'], results[2]['messages'])
+
+        with self.assertRaises(RemoteError):
+            self.remote.call_many([('face', {'id': 'missing'})])
+
+    def test_concurrent_enrollments_of_one_visitor_record_one_face(self):
+        encoding = np.full(128, 0.1)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: self.remote.enroll([encoding])[0], range(16)))
+
+        self.assertEqual(1, sum(is_new for _, is_new in results))
+        self.assertEqual(1, len({face._id for face, _ in results}))
+        self.assertEqual(2, len(self.faces.faces))
+
+    def test_enroll_matches_known_faces(self):
+        (known, known_is_new), (new, new_is_new) = self.remote.enroll([np.zeros(128), np.ones(128)], [None, 'new'])
+
+        self.assertEqual(('known', False), (known._id, known_is_new))
+        self.assertEqual(('new', True), (new._id, new_is_new))
+        self.assertEqual(['known', 'new'], [face._id for face in self.faces])
+
+    def test_members_needing_encodings_are_not_supported(self):
+        with self.assertRaises(NotSupportedRemotelyError):
+            self.remote.face_encodings
+        with self.assertRaises(NotSupportedRemotelyError):
+            self.remote.add_faces_from_images([])
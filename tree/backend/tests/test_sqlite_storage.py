@@ -0,0 +1,75 @@
+import os
+from unittest import TestCase
+
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+from tree.backend.storage.sqlite_storage import SQLiteStorage
+
+
+class TestSQLiteStorage(TestCase):
+    def setUp(self):
+        self.storage = SQLiteStorage(constants.test_sqlite_storage_filename)
+        self.random = np.random.default_rng(0)
+
+    def make_face(self, _id: str) -> "faces.Face":
+        return faces.Face(_id, self.random.normal(scale=0.1, size=128))
+
+    def test_load_without_existing_backup(self):
+        loaded_data = self.storage.load()
+
+        self.assertTrue(isinstance(loaded_data, faces.Faces))
+        self.assertEqual(0, len(loaded_data.faces))
+
+    def test_mutations_are_persisted(self):
+        data = self.storage.load()
+        face_a, face_b = self.make_face('a'), self.make_face('b')
+        data.add_face(face_a)
+        data.add_face(face_b)
+        data.add_message(face_a, "first")
+        data.add_message(face_a, "second")
+        data.add_message(face_b, "hello")
+        self.assertEqual("second", data.consume_message(face_a))
+        data.add_message(face_a, "third")
+        self.storage.close()
+
+        loaded_storage = SQLiteStorage(constants.test_sqlite_storage_filename)
+        loaded_data = loaded_storage.load()
+
+        self.assertEqual(['a', 'b'], [face._id for face in loaded_data])
+        self.assertEqual(["first", "third"], loaded_data.faces[0].messages)
+        self.assertEqual(["hello"], loaded_data.faces[1].messages)
+        np.testing.assert_array_equal(face_b.encoding, loaded_data.faces[1].encoding)
+        self.assertEqual({'a': 2, 'b': 1}, loaded_storage.message_counts())
+        loaded_storage.close()
+
+    def test_save_rewrites_everything(self):
+        face = self.make_face('a')
+        face.add_message("hello")
+        self.storage.save(faces.Faces([face]))
+
+        loaded_data = self.storage.load()
+        self.assertEqual(['a'], [loaded_face._id for loaded_face in loaded_data])
+        self.assertEqual(["hello"], loaded_data.faces[0].messages)
+
+    def test_save_after_load_keeps_messages(self):
+        face = self.make_face('a')
+        face.add_message("hello")
+        self.storage.save(faces.Faces([face]))
+
+        # The loaded face hasn't read its messages yet, so saving it has to read them before rewriting
+        self.storage.save(self.storage.load())
+
+        loaded_data = self.storage.load()
+        self.assertEqual(["hello"], loaded_data.faces[0].messages)
+
+    def tearDown(self):
+        self.storage.close()
+
+        # Delete backups between tests
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.storage.backup_filepath + suffix)
+            except FileNotFoundError:
+                pass
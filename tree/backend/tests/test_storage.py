@@ -1,8 +1,12 @@
 import os
+import pickle
 from unittest import TestCase
 
+import numpy as np
+
 import tree.backend.constants as constants
 import tree.backend.faces as faces
+from tree.backend.matchers.quantized import QuantizedMatcher
 from tree.backend.storage.pickle_storage import PickleStorage
 
 
@@ -25,6 +29,29 @@ class TestStorage(TestCase):
 
         self.assertTrue(original_data == loaded_data)
 
+    def test_encodings_are_pickled_once(self):
+        random = np.random.default_rng(0)
+        data = faces.Faces([faces.Face(str(i), random.normal(scale=0.1, size=128)) for i in range(1000)])
+
+        # Faces pickle their own encodings, so the index built on them isn't pickled too
+        pickled = pickle.dumps(data)
+        self.assertLess(len(pickled), 1.2 * data.face_encodings.nbytes)
+
+        loaded_data = pickle.loads(pickled)
+        self.assertEqual('500', loaded_data.get_face_from_encoding(data.faces[500].encoding)._id)
+        self.assertTrue(np.shares_memory(loaded_data.faces[0].encoding, loaded_data.encoding_index.encodings))
+
+    def test_matcher_kind_is_pickled(self):
+        random = np.random.default_rng(0)
+        data = faces.Faces([faces.Face(str(i), random.normal(scale=0.1, size=128)) for i in range(100)])
+        data.set_matcher(QuantizedMatcher("int8", chunk_size=10))
+
+        loaded_data = pickle.loads(pickle.dumps(data))
+        self.assertIsInstance(loaded_data.matcher, QuantizedMatcher)
+        self.assertEqual(10, loaded_data.matcher.chunk_size)
+        self.assertEqual(len(data.faces), len(loaded_data.matcher.codes))
+        self.assertEqual('50', loaded_data.get_face_from_encoding(data.faces[50].encoding)._id)
+
     def tearDown(self):
         # Delete backups between tests
         try:
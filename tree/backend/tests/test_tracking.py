@@ -0,0 +1,69 @@
+import os
+from unittest import TestCase
+
+import face_recognition
+import numpy as np
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+from tree.backend.storage.pickle_storage import PickleStorage
+from tree.backend.tracking import FaceTracker, Track, box_ious
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestFaceTracker(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tracker = FaceTracker(clock=self.clock)
+        self.faces = faces.Faces(storage=PickleStorage(constants.test_pickle_storage_filename))
+
+    def test_box_ious(self):
+        box = (0, 10, 10, 0)
+        ious = box_ious([box], [box, (0, 15, 10, 5), (20, 30, 30, 20)])
+
+        np.testing.assert_allclose([[1.0, 50 / 150, 0.0]], ious)
+
+    def test_associate_pairs_most_overlapping_first(self):
+        face_a, face_b = faces.Face('a', np.zeros(128)), faces.Face('b', np.zeros(128))
+        self.tracker.tracks = [Track(face_a, (0, 10, 10, 0), 0), Track(face_b, (0, 22, 10, 12), 0)]
+
+        pairs = self.tracker.associate([(0, 23, 10, 13), (0, 11, 10, 1), (50, 60, 60, 50)])
+
+        self.assertIs(face_b, pairs[0].face)
+        self.assertIs(face_a, pairs[1].face)
+        self.assertNotIn(2, pairs)
+
+    def test_tracked_faces_are_not_encoded_again(self):
+        image = face_recognition.load_image_file(os.path.join(constants.test_images_filepath, 'yash1.jpg'))
+
+        first = self.tracker.update(image, self.faces, save_backup=False)
+        second = self.tracker.update(image, self.faces, save_backup=False)
+
+        self.assertTrue(first[0].is_new)
+        self.assertFalse(second[0].is_new)
+        self.assertIs(first[0].face, second[0].face)
+        self.assertEqual((1, 1), (self.tracker.encoded, self.tracker.reused))
+
+        # Once the refresh interval passes the face is encoded and matched again
+        self.clock.now += constants.tracker_refresh_seconds
+        third = self.tracker.update(image, self.faces, save_backup=False)
+        self.assertEqual(first[0].face._id, third[0].face._id)
+        self.assertEqual(2, self.tracker.encoded)
+
+        faces.remove_face_files(first[0].face._id)
+
+    def test_tracks_expire(self):
+        face = faces.Face('a', np.zeros(128))
+        self.tracker.tracks = [Track(face, (0, 10, 10, 0), 0)]
+
+        self.clock.now = constants.tracker_timeout_seconds + 1
+        self.tracker._age_tracks({}, [], self.clock.now)
+
+        self.assertEqual([], self.tracker.tracks)
@@ -0,0 +1,74 @@
+import threading
+import time
+from unittest import TestCase
+
+from tree.backend.work_queue import WorkQueue
+
+
+class TestWorkQueue(TestCase):
+    def setUp(self):
+        self.queue = WorkQueue(max_workers=4)
+
+    def test_tasks_under_one_key_run_in_order(self):
+        completed = []
+
+        def task(i):
+            time.sleep(0.001 * (i % 3))
+            completed.append(i)
+
+        for i in range(20):
+            self.queue.submit("face", task, i)
+        self.queue.wait("face")
+
+        self.assertEqual(list(range(20)), completed)
+
+    def test_keys_run_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        # Each task waits for the other, so this only finishes if both run at once
+        first = self.queue.submit("a", barrier.wait)
+        second = self.queue.submit("b", barrier.wait)
+        first.result(5)
+        second.result(5)
+
+    def test_drain_waits_for_everything(self):
+        completed = []
+        for key in "abc":
+            for i in range(5):
+                self.queue.submit(key, lambda k=key, n=i: completed.append((k, n)))
+
+        self.assertTrue(self.queue.drain(timeout=5))
+        self.assertEqual(15, len(completed))
+
+    def test_errors_are_kept(self):
+        def fail():
+            raise ValueError("broken")
+
+        self.queue.submit("face", fail)
+        self.queue.submit("face", lambda: None)
+        self.queue.wait("face")
+
+        self.assertEqual(1, len(self.queue.errors))
+        self.assertTrue(isinstance(self.queue.errors[0], ValueError))
+        with self.assertLogs('tree.backend.work_queue', 'ERROR'), self.assertRaises(ValueError):
+            self.queue.drain()
+
+    def test_drain_raises_the_first_error(self):
+        def fail(message):
+            raise ValueError(message)
+
+        self.queue.submit("a", fail, "first")
+        self.queue.wait("a")
+        self.queue.submit("b", fail, "second")
+
+        with self.assertLogs('tree.backend.work_queue', 'ERROR') as logs:
+            with self.assertRaisesRegex(ValueError, "first"):
+                self.queue.drain()
+        self.assertEqual(2, len(logs.records))
+
+        # Each failure is only raised once
+        self.assertEqual([], self.queue.errors)
+        self.assertTrue(self.queue.drain())
+
+    def tearDown(self):
+        self.queue.close()
@@ -0,0 +1,164 @@
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+import tree.backend.faces as faces
+
+
+def box_ious(boxes_a, boxes_b) -> np.ndarray:
+    """Returns the intersection over union of every pair of (top, right, bottom, left) boxes in `a` and `b`"""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)[:, None, :]
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)[None, :, :]
+
+    height = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    width = np.clip(np.minimum(a[..., 1], b[..., 1]) - np.maximum(a[..., 3], b[..., 3]), 0, None)
+    intersection = height * width
+
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 1] - a[..., 3])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 1] - b[..., 3])
+    return intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+
+
+class Track(object):
+    """A face followed across frames, along with the result of the last time it was encoded and matched"""
+
+    __slots__ = ('face', 'location', 'last_seen', 'last_refreshed', 'missed_frames')
+
+    def __init__(self, face: "faces.Face", location, now: float):
+        self.face = face
+        self.location = location
+        self.last_seen = now
+        self.last_refreshed = now
+        self.missed_frames = 0
+
+
+class FaceTracker(object):
+    """
+    Associates detected face boxes across consecutive frames by overlap, so a person who stays in view is only
+    encoded and matched once rather than on every frame.
+
+    Detection still runs on every frame. A box that overlaps a live track reuses that track's matched face until
+    `refresh_seconds` pass, after which it's encoded and matched again in case someone else stepped into the same
+    spot. Tracks are dropped once their face goes unseen for `max_missed_frames` frames or `timeout_seconds`.
+    """
+
+    def __init__(
+            self,
+            min_iou: float = constants.tracker_min_iou,
+            max_missed_frames: int = constants.tracker_max_missed_frames,
+            timeout_seconds: float = constants.tracker_timeout_seconds,
+            refresh_seconds: float = constants.tracker_refresh_seconds,
+            clock: Callable[[], float] = time.monotonic
+        ):
+        self.min_iou = min_iou
+        self.max_missed_frames = max_missed_frames
+        self.timeout_seconds = timeout_seconds
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self.tracks = []
+        self.reused = 0  # Faces whose encoding was skipped thanks to a track
+        self.encoded = 0  # Faces that had to be encoded and matched
+
+    def associate(self, face_locations: list) -> dict:
+        """
+        Greedily pairs face boxes with tracks, most overlapping pairs first
+
+        :return: a mapping of face location index to the track it continues
+        """
+        if not self.tracks or not face_locations:
+            return {}
+
+        ious = box_ious([track.location for track in self.tracks], face_locations)
+        pairs = {}
+        used_tracks = set()
+        for flat_index in np.argsort(ious, axis=None)[::-1]:
+            track_index, location_index = np.unravel_index(flat_index, ious.shape)
+            if ious[track_index, location_index] < self.min_iou:
+                break
+            if track_index in used_tracks or location_index in pairs:
+                continue
+
+            pairs[int(location_index)] = self.tracks[track_index]
+            used_tracks.add(track_index)
+
+        return pairs
+
+    def update(
+            self,
+            image,
+            f: "faces.Faces",
+            detection_scale: float = constants.face_detection_scale,
+            save_image: bool = False,
+            save_backup: bool = True
+        ) -> list:
+        """
+        Detects the faces in a frame, reusing tracked match results and only encoding faces that aren't tracked or
+        are due for a refresh
+
+        :param image: RGB image array of the next frame
+        :param f: Faces object to match against and add new faces to
+
+        :raises faces.FaceNotFoundException: if there are no faces in the frame
+        :return: a `faces.FrameFace` for each face found, in detection order
+        """
+        now = self.clock()
+        face_locations = faces.detect_face_locations(image, detection_scale)
+        pairs = self.associate(face_locations)
+
+        frame_faces = [None] * len(face_locations)
+        stale = []
+        for location_index, face_location in enumerate(face_locations):
+            track = pairs.get(location_index)
+            if track is not None and now - track.last_refreshed < self.refresh_seconds:
+                frame_faces[location_index] = faces.FrameFace(track.face, False, face_location)
+            else:
+                stale.append(location_index)
+
+        if stale:
+            refreshed = faces.create_faces_from_array(
+                image, f, save_backup, detection_scale, save_image,
+                face_locations=[face_locations[location_index] for location_index in stale])
+            for location_index, frame_face in zip(stale, refreshed):
+                frame_faces[location_index] = frame_face
+
+                track = pairs.get(location_index)
+                if track is None:
+                    track = Track(frame_face.face, frame_face.location, now)
+                    self.tracks.append(track)
+                    pairs[location_index] = track
+                track.face = frame_face.face
+                track.last_refreshed = now
+
+        self.reused += len(face_locations) - len(stale)
+        self.encoded += len(stale)
+        self._age_tracks(pairs, face_locations, now)
+
+        if not face_locations:
+            raise faces.FaceNotFoundException
+
+        return frame_faces
+
+    def _age_tracks(self, pairs: dict, face_locations: list, now: float):
+        seen = set()
+        for location_index, track in pairs.items():
+            track.location = face_locations[location_index]
+            track.last_seen = now
+            track.missed_frames = 0
+            seen.add(id(track))
+
+        for track in self.tracks:
+            if id(track) not in seen:
+                track.missed_frames += 1
+
+        self.tracks = [
+            track for track in self.tracks
+            if track.missed_frames <= self.max_missed_frames and now - track.last_seen <= self.timeout_seconds
+        ]
+
+    def reset(self):
+        self.tracks = []
@@ -0,0 +1,102 @@
+import logging
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Hashable, Union
+
+sys.path.append('.')
+
+import tree.backend.constants as constants
+
+logger = logging.getLogger(__name__)
+
+# Key shared by every storage write, so they reach storage in the order they were made
+STORAGE = "storage"
+# Key for retraining the matcher, so only one retrain runs at a time
+MATCHER = "matcher"
+
+
+class WorkQueue(object):
+    """
+    Thread pool that runs background work in submission order per key.
+
+    Tasks submitted under the same key never overlap and complete in the order they were submitted, while tasks
+    under different keys run in parallel. Threads suit this work since cropping, JPEG encoding and file writes all
+    release the GIL. Exceptions raised by tasks are kept in `errors` until `drain` or `close` logs them and raises
+    the first, so they aren't lost.
+    """
+
+    def __init__(self, max_workers: int = constants.work_queue_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="WorkQueue")
+        self._tails = {}  # Key to the future of the last task submitted under it
+        self._outstanding = 0
+        self._condition = threading.Condition()
+        self.errors = []
+
+    def submit(self, key: Hashable, function: Callable, *args, **kwargs) -> Future:
+        """Queues `function(*args, **kwargs)` to run after every task previously submitted under `key`"""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                self._finish(key, future)
+                return
+
+            try:
+                future.set_result(function(*args, **kwargs))
+            except BaseException as e:
+                self.errors.append(e)
+                future.set_exception(e)
+            finally:
+                self._finish(key, future)
+
+        with self._condition:
+            previous = self._tails.get(key)
+            self._tails[key] = future
+            self._outstanding += 1
+
+        if previous is None:
+            self._executor.submit(run)
+        else:
+            # Runs immediately if the previous task is already done
+            previous.add_done_callback(lambda _: self._executor.submit(run))
+
+        return future
+
+    def _finish(self, key: Hashable, future: Future):
+        with self._condition:
+            if self._tails.get(key) is future:
+                del self._tails[key]
+            self._outstanding -= 1
+            self._condition.notify_all()
+
+    def wait(self, key: Hashable, timeout: Union[float, None] = None):
+        """Waits for every task submitted under `key` so far, raising the last one's exception if it failed"""
+        with self._condition:
+            future = self._tails.get(key)
+
+        if future is not None:
+            future.result(timeout)
+
+    def drain(self, timeout: Union[float, None] = None) -> bool:
+        """
+        Waits for every submitted task to finish, returning False if `timeout` passed first. If any task failed
+        since the last drain, every failure is logged and the first is raised.
+        """
+        with self._condition:
+            drained = self._condition.wait_for(lambda: self._outstanding == 0, timeout)
+            errors, self.errors = self.errors, []
+
+        for error in errors:
+            logger.error("Background task failed", exc_info=error)
+        if errors:
+            raise errors[0]
+
+        return drained
+
+    def close(self):
+        """Drains the queue and stops its threads, raising the first failure like `drain`"""
+        try:
+            self.drain()
+        finally:
+            self._executor.shutdown()